@@ -0,0 +1,14 @@
+"""
+Set APP_CONFIG to point to this file when PROMETHEUS_MULTIPROC_DIR is set, so
+the metrics written by the workers of a previous run are cleared on startup.
+"""
+import glob
+import os
+
+
+def on_starting(server):
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            os.remove(path)
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/1.11/ref/settings/
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -78,19 +80,23 @@ INSTALLED_APPS = [
     'swift_browser',
 ]
 
+# WhiteNoise answers static file requests before any session or auth work
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'swift_browser.tracing.TracingMiddleware',
+    'swift_browser.metrics.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
 FILE_UPLOAD_HANDLERS = [
+    'swift_browser.uploadhandler.SwiftStreamingUploadHandler',
     'django.core.files.uploadhandler.MemoryFileUploadHandler',
     'django.core.files.uploadhandler.TemporaryFileUploadHandler',
 ]
@@ -99,9 +105,8 @@ ROOT_URLCONF = 'project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'swift_browser.tracing.TracedTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -109,10 +114,20 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ],
         },
     },
 ]
 
+# Templates are compiled once per process unless DEBUG is on
+if not DEBUG:
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', TEMPLATES[0]['OPTIONS']['loaders']),
+    ]
+
 WSGI_APPLICATION = 'wsgi.application'
 
 # swiftbrowser setup
@@ -122,6 +137,121 @@ SWIFT_SSL_INSECURE = os.getenv('SWIFT_SSL_INSECURE',False)
 SWIFT_AUTH_USER = os.getenv('SWIFT_AUTH_USER','')
 SWIFT_AUTH_KEY = os.getenv('SWIFT_AUTH_KEY','')
 
+# Keep-alive connections to the Swift proxy, per storage URL and process
+SWIFT_POOL_SIZE = int(os.getenv('SWIFT_POOL_SIZE', 10))
+SWIFT_POOL_IDLE_TIMEOUT = int(os.getenv('SWIFT_POOL_IDLE_TIMEOUT', 60))
+SWIFT_POOL_WAIT_TIMEOUT = int(os.getenv('SWIFT_POOL_WAIT_TIMEOUT', 30))
+# Streamed downloads hold a connection as long as the browser takes to read
+# the object, so they get their own pool
+SWIFT_DOWNLOAD_POOL_SIZE = int(os.getenv('SWIFT_DOWNLOAD_POOL_SIZE', 10))
+
+# Auth tokens are cached per process and refreshed before they expire, as
+# reported by the auth service but after SWIFT_TOKEN_TTL seconds at most.
+# Set SWIFT_TOKEN_CACHE to a cache alias to share them between workers.
+SWIFT_TOKEN_TTL = int(os.getenv('SWIFT_TOKEN_TTL', 3600))
+SWIFT_TOKEN_REFRESH_MARGIN = int(os.getenv('SWIFT_TOKEN_REFRESH_MARGIN', 300))
+SWIFT_TOKEN_CACHE = os.getenv('SWIFT_TOKEN_CACHE', None)
+
+# Number of entries shown per page of a container listing. The maximum
+# should not exceed the cluster's container_listing_limit.
+SWIFT_LISTING_PAGE_SIZE = int(os.getenv('SWIFT_LISTING_PAGE_SIZE', 1000))
+SWIFT_LISTING_MAX_PAGE_SIZE = int(os.getenv('SWIFT_LISTING_MAX_PAGE_SIZE', 10000))
+
+# Cache alias used for account and container listings; empty disables it.
+# Writes bump a generation kept in the database, which every worker reads
+# at most once every SWIFT_LISTING_GENERATION_TTL seconds: a write made
+# through one worker shows in the listings of the others within that time.
+SWIFT_LISTING_CACHE = os.getenv('SWIFT_LISTING_CACHE', 'listings')
+SWIFT_LISTING_CACHE_TTL = int(os.getenv('SWIFT_LISTING_CACHE_TTL', 30))
+SWIFT_LISTING_GENERATION_TTL = float(os.getenv('SWIFT_LISTING_GENERATION_TTL', 1))
+
+# Concurrent DELETEs used to empty a container when the cluster has no
+# bulk-delete middleware, and how often failed names are retried.
+SWIFT_DELETE_CONCURRENCY = int(os.getenv('SWIFT_DELETE_CONCURRENCY', 8))
+SWIFT_DELETE_RETRIES = int(os.getenv('SWIFT_DELETE_RETRIES', 2))
+
+# Moves copy and delete SWIFT_MOVE_CONCURRENCY objects at a time, issuing at
+# most SWIFT_MOVE_RATE Swift requests per second (0 for no limit).
+SWIFT_MOVE_CONCURRENCY = int(os.getenv('SWIFT_MOVE_CONCURRENCY', 8))
+SWIFT_MOVE_RETRIES = int(os.getenv('SWIFT_MOVE_RETRIES', 2))
+SWIFT_MOVE_RATE = float(os.getenv('SWIFT_MOVE_RATE', 50))
+
+# Views fan out independent Swift calls over SWIFT_FANOUT_CONCURRENCY threads.
+# The account page HEADs each container when it lists at most
+# SWIFT_CONTAINER_DETAILS_LIMIT of them.
+SWIFT_FANOUT_CONCURRENCY = int(os.getenv('SWIFT_FANOUT_CONCURRENCY', 16))
+SWIFT_CONTAINER_DETAILS_LIMIT = int(os.getenv('SWIFT_CONTAINER_DETAILS_LIMIT', 100))
+
+# Bulk uploads PUT SWIFT_BULK_CONCURRENCY objects at a time. Files and
+# archive members up to SWIFT_BULK_BUFFER_SIZE bytes are read into memory
+# to be sent in the background, larger ones are streamed one at a time.
+SWIFT_BULK_CONCURRENCY = int(os.getenv('SWIFT_BULK_CONCURRENCY', 16))
+SWIFT_BULK_BUFFER_SIZE = int(os.getenv('SWIFT_BULK_BUFFER_SIZE', 4 * 1024 * 1024))
+
+# Container deletes, folder deletes and uploads larger than
+# SWIFT_JOB_UPLOAD_THRESHOLD bytes are queued for `manage.py run_jobs`.
+# Off unless set to 1, true or yes, since the views then rely on a worker.
+# A worker that stops sending heartbeats for SWIFT_JOB_STALE_AFTER seconds
+# has its jobs queued again, up to SWIFT_JOB_MAX_ATTEMPTS runs in all.
+SWIFT_BACKGROUND_JOBS = os.getenv('SWIFT_BACKGROUND_JOBS', '').lower() in ('1', 'true', 'yes')
+SWIFT_JOBS_PER_USER = int(os.getenv('SWIFT_JOBS_PER_USER', 2))
+SWIFT_JOB_HEARTBEAT = int(os.getenv('SWIFT_JOB_HEARTBEAT', 30))
+SWIFT_JOB_STALE_AFTER = int(os.getenv('SWIFT_JOB_STALE_AFTER', 300))
+SWIFT_JOB_MAX_ATTEMPTS = int(os.getenv('SWIFT_JOB_MAX_ATTEMPTS', 3))
+SWIFT_JOB_UPLOAD_THRESHOLD = int(os.getenv('SWIFT_JOB_UPLOAD_THRESHOLD', 100 * 1024 * 1024))
+SWIFT_JOB_SPOOL_DIR = os.getenv('SWIFT_JOB_SPOOL_DIR', os.path.join(BASE_DIR, 'spool'))
+
+# Streaming uploads buffer at most this many 256 KB chunks per upload and
+# give up when the browser stops sending for SWIFT_UPLOAD_STALL_TIMEOUT seconds.
+SWIFT_UPLOAD_QUEUE_CHUNKS = int(os.getenv('SWIFT_UPLOAD_QUEUE_CHUNKS', 4))
+SWIFT_UPLOAD_STALL_TIMEOUT = int(os.getenv('SWIFT_UPLOAD_STALL_TIMEOUT', 60))
+
+# Files larger than SWIFT_SEGMENT_THRESHOLD are stored as Static Large
+# Objects, uploading SWIFT_SEGMENT_CONCURRENCY segments at a time.
+SWIFT_SEGMENT_THRESHOLD = int(os.getenv('SWIFT_SEGMENT_THRESHOLD', 1024 * 1024 * 1024))
+SWIFT_SEGMENT_SIZE = int(os.getenv('SWIFT_SEGMENT_SIZE', 256 * 1024 * 1024))
+SWIFT_SEGMENT_CONCURRENCY = int(os.getenv('SWIFT_SEGMENT_CONCURRENCY', 4))
+SWIFT_SEGMENT_RETRIES = int(os.getenv('SWIFT_SEGMENT_RETRIES', 3))
+
+# Browsers upload files larger than SWIFT_RESUMABLE_THRESHOLD through the
+# chunked upload API, SWIFT_RESUMABLE_PARALLEL chunks at a time. An
+# unfinished upload can be resumed for SWIFT_RESUMABLE_MAX_AGE seconds.
+SWIFT_RESUMABLE_THRESHOLD = int(os.getenv('SWIFT_RESUMABLE_THRESHOLD', 64 * 1024 * 1024))
+SWIFT_RESUMABLE_CHUNK_SIZE = int(os.getenv('SWIFT_RESUMABLE_CHUNK_SIZE', 16 * 1024 * 1024))
+SWIFT_RESUMABLE_PARALLEL = int(os.getenv('SWIFT_RESUMABLE_PARALLEL', 4))
+SWIFT_RESUMABLE_MAX_AGE = int(os.getenv('SWIFT_RESUMABLE_MAX_AGE', 7 * 24 * 3600))
+
+# The cluster's /info is fetched again after SWIFT_CAPABILITIES_TTL seconds.
+SWIFT_CAPABILITIES_TTL = int(os.getenv('SWIFT_CAPABILITIES_TTL', 3600))
+
+# /metrics answers only clients in SWIFT_METRICS_ALLOWED_IPS, a comma
+# separated list that defaults to localhost; '*' lets anyone scrape.
+SWIFT_METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('SWIFT_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()]
+
+# SWIFT_TRACE_SAMPLE_RATE of requests record how long their Swift calls,
+# session access and templates take.  Staff users get the breakdown in a
+# Server-Timing header, everyone does when DEBUG is on.  Traced requests
+# slower than SWIFT_TRACE_SLOW_MS are logged as JSON.
+SWIFT_TRACE_SAMPLE_RATE = float(os.getenv('SWIFT_TRACE_SAMPLE_RATE', 0.01))
+SWIFT_TRACE_SLOW_MS = int(os.getenv('SWIFT_TRACE_SLOW_MS', 1000))
+
+# When SWIFT_PROFILE_DIR is set, SWIFT_PROFILE_SAMPLE_RATE of traced requests
+# run under cProfile and the profiles of slow ones are saved there.
+SWIFT_PROFILE_DIR = os.getenv('SWIFT_PROFILE_DIR', '')
+SWIFT_PROFILE_SAMPLE_RATE = float(os.getenv('SWIFT_PROFILE_SAMPLE_RATE', 0.01))
+
+# Downloads are streamed from Swift in chunks of SWIFT_DOWNLOAD_CHUNK_SIZE bytes.
+SWIFT_DOWNLOAD_CHUNK_SIZE = int(os.getenv('SWIFT_DOWNLOAD_CHUNK_SIZE', 64 * 1024))
+
+# SWIFT_DATA_PATH = 'tempurl' lets browsers GET and PUT object data directly
+# against the Swift proxy using TempURLs valid for SWIFT_TEMPURL_LIFETIME
+# seconds; 'proxy' streams it through Django. The proxy must allow the
+# browser's origin through CORS (X-Container-Meta-Access-Control-Allow-Origin).
+SWIFT_DATA_PATH = os.getenv('SWIFT_DATA_PATH', 'proxy')
+SWIFT_TEMPURL_LIFETIME = int(os.getenv('SWIFT_TEMPURL_LIFETIME', 3600))
+SWIFT_TEMPURL_DIGEST = os.getenv('SWIFT_TEMPURL_DIGEST', 'sha256')
+SWIFT_TEMPURL_KEY_TTL = int(os.getenv('SWIFT_TEMPURL_KEY_TTL', 600))
+
 # Database
 # https://docs.djangoproject.com/en/1.11/ref/settings/#databases
 
@@ -132,6 +262,52 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+
+# A directory shared by all workers, for the 'sessions' cache
+SWIFT_SESSION_CACHE_DIR = os.getenv('SWIFT_SESSION_CACHE_DIR', '')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'listings': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'swift-listings',
+        'TIMEOUT': SWIFT_LISTING_CACHE_TTL,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('SWIFT_LISTING_CACHE_ENTRIES', 1000)),
+        },
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': SWIFT_SESSION_CACHE_DIR,
+    } if SWIFT_SESSION_CACHE_DIR else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'swift-sessions',
+    },
+}
+
+
+# Sessions
+# https://docs.djangoproject.com/en/1.11/topics/http/sessions/
+
+# SWIFT_SESSION_ENGINE is 'db', 'cached_db' (saved to the database, read
+# through the 'sessions' cache), 'cache' (no database at all) or
+# 'signed_cookies' (kept in the browser).  The cached engines need
+# SWIFT_SESSION_CACHE_DIR: without it the cache lives in each process, and a
+# worker would keep serving a session another worker has logged out or
+# changed.  So the default is 'cached_db' when that directory is set and
+# 'db' otherwise.
+SWIFT_SESSION_ENGINE = os.getenv('SWIFT_SESSION_ENGINE', 'cached_db' if SWIFT_SESSION_CACHE_DIR else 'db')
+if SWIFT_SESSION_ENGINE in ('cache', 'cached_db') and not SWIFT_SESSION_CACHE_DIR:
+    raise ImproperlyConfigured("SWIFT_SESSION_ENGINE=%s needs SWIFT_SESSION_CACHE_DIR, a directory "
+                               "all workers share" % SWIFT_SESSION_ENGINE)
+SESSION_ENGINE = 'swift_browser.sessions.' + SWIFT_SESSION_ENGINE
+SESSION_CACHE_ALIAS = 'sessions'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 
@@ -171,14 +347,23 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# collectstatic adds a content hash to every file name and writes gzip and
+# Brotli variants next to it.  WhiteNoise serves hashed names with
+# "Cache-Control: max-age=315360000, public, immutable" and other static
+# files for WHITENOISE_MAX_AGE seconds.
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+WHITENOISE_MAX_AGE = int(os.getenv('WHITENOISE_MAX_AGE', 0 if DEBUG else 3600))
+
+# Load the static manifest, URLconf and templates when a worker starts
+# rather than on its first requests; set to 0, false or no to skip it.
+SWIFT_WARMUP = os.getenv('SWIFT_WARMUP', 'true').lower() not in ('', '0', 'false', 'no')
 
 INTERNAL_IPS = ['127.0.0.1']
 
 LOGIN_REDIRECT_URL = 'containers'
 
 AUTHENTICATION_BACKENDS = [
-    'django_python3_ldap.auth.LDAPBackend',
+    'swift_browser.ldapauth.CachingLDAPBackend',
     'django.contrib.auth.backends.ModelBackend',
 ]
 
@@ -258,3 +443,10 @@ LDAP_AUTH_RECEIVE_TIMEOUT = os.environ.get('LDAP_AUTH_RECEIVE_TIMEOUT',
 LDAP_GROUP_MEMBER = os.environ.get('LDAP_GROUP_MEMBER',
         None)
 
+# User attributes and group membership looked up at login are cached in
+# SWIFT_LDAP_CACHE for SWIFT_LDAP_CACHE_TTL seconds.  While the directory
+# cannot be searched, results up to SWIFT_LDAP_STALE_TTL seconds old are used.
+SWIFT_LDAP_CACHE = os.getenv('SWIFT_LDAP_CACHE', 'default')
+SWIFT_LDAP_CACHE_TTL = int(os.getenv('SWIFT_LDAP_CACHE_TTL', 300))
+SWIFT_LDAP_STALE_TTL = int(os.getenv('SWIFT_LDAP_STALE_TTL', 3600))
+
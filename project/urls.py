@@ -3,7 +3,7 @@ from django.conf.urls import include, url
 from django.contrib import admin
 from django.contrib.auth import views as auth_views
 
-from swift_browser.views import container, containers, create_container, delete_container, upload, delete_object, create_folder
+from swift_browser.views import container, containers, create_container, delete_container, upload, bulk_upload, delete_object, download, create_folder, delete_folder, move, scan_usage, job, job_progress, upload_init, upload_chunk, upload_complete, upload_abort, upload_url, api_containers, api_objects, prometheus_metrics
 
 urlpatterns = [
     url(r'^$', containers, name='containers'),
@@ -14,8 +14,23 @@ urlpatterns = [
     url(r'^delete_container/$', delete_container, name='delete_container'),
     url(r'^view_container/$', container, name='container'),
     url(r'^upload/$', upload, name='upload'),
+    url(r'^bulk_upload/$', bulk_upload, name='bulk_upload'),
     url(r'^delete_object/$', delete_object, name='delete_object'),
+    url(r'^download/$', download, name='download'),
     url(r'^create_folder/$', create_folder, name='create_folder'),
+    url(r'^delete_folder/$', delete_folder, name='delete_folder'),
+    url(r'^move/$', move, name='move'),
+    url(r'^scan_usage/$', scan_usage, name='scan_usage'),
+    url(r'^job/$', job, name='job'),
+    url(r'^job_progress/$', job_progress, name='job_progress'),
+    url(r'^upload_url/$', upload_url, name='upload_url'),
+    url(r'^upload_api/init/$', upload_init, name='upload_init'),
+    url(r'^upload_api/chunk/$', upload_chunk, name='upload_chunk'),
+    url(r'^upload_api/complete/$', upload_complete, name='upload_complete'),
+    url(r'^upload_api/abort/$', upload_abort, name='upload_abort'),
+    url(r'^api/containers/$', api_containers, name='api_containers'),
+    url(r'^api/objects/$', api_objects, name='api_objects'),
+    url(r'^metrics$', prometheus_metrics, name='metrics'),
 ]
 
 if settings.DEBUG:
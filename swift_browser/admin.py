@@ -1,3 +1,14 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import IndexedContainer, Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'arguments', 'user', 'status', 'done', 'total', 'created', 'finished')
+    list_filter = ('kind', 'status')
+
+
+@admin.register(IndexedContainer)
+class IndexedContainerAdmin(admin.ModelAdmin):
+    list_display = ('name', 'complete', 'marker', 'updated')
@@ -0,0 +1,214 @@
+"""
+Process-wide cache of Swift auth tokens.
+
+All users of the browser share the service account configured through
+SWIFT_AUTH_URL / SWIFT_AUTH_USER, so one token per process is enough.  Tokens
+are refreshed shortly before they expire, concurrent refreshes are coalesced
+into a single call to the auth endpoint and, when SWIFT_TOKEN_CACHE names a
+Django cache, the token is shared with the other worker processes.
+
+A token is kept until the expiry the auth service reports (X-Auth-Token-Expires
+for v1 auth, expires_at for keystone v3), but never longer than SWIFT_TOKEN_TTL.
+"""
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from swiftclient import client
+
+from . import metrics, pool, tracing
+
+logger = logging.getLogger(__name__)
+
+
+def _authenticate_v1(auth_url, user, key):
+    """ swiftclient's v1 auth, also returning how many seconds the token is valid for. """
+    parsed, conn = client.http_connection(auth_url, insecure=settings.SWIFT_SSL_INSECURE)
+    conn.request('GET', parsed.path, '', {'X-Auth-User': user, 'X-Auth-Key': key})
+    resp = conn.getresponse()
+    body = resp.read()
+    storage_url = resp.getheader('x-storage-url')
+    if resp.status < 200 or resp.status >= 300 or not storage_url:
+        raise client.ClientException.from_response(resp, 'Auth GET failed', body)
+    expires = resp.getheader('x-auth-token-expires')
+    return (storage_url, resp.getheader('x-storage-token', resp.getheader('x-auth-token')),
+            float(expires) if expires else None)
+
+
+def _keystone_lifetime(auth_url, auth_token):
+    """ Seconds until a keystone v3 token expires, None if keystone does not tell. """
+    try:
+        parsed, conn = client.http_connection(auth_url.rstrip('/') + '/auth/tokens',
+                                              insecure=settings.SWIFT_SSL_INSECURE)
+        conn.request('GET', parsed.path, '', {'X-Auth-Token': auth_token,
+                                              'X-Subject-Token': auth_token})
+        resp = conn.getresponse()
+        body = resp.read()
+        if resp.status != 200:
+            raise client.ClientException.from_response(resp, 'Token GET failed', body)
+        expires_at = parse_datetime(json.loads(body.decode('utf-8'))['token']['expires_at'])
+        return (expires_at - timezone.now()).total_seconds()
+    except Exception as exc:
+        logger.warning('Could not read the token expiry from %s: %s' % (auth_url, exc))
+        return None
+
+
+class TokenCache(object):
+    """ Cache of (storage_url, auth_token) pairs keyed by auth URL and user. """
+
+    def __init__(self, ttl=3600, refresh_margin=300, shared_cache=None):
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.shared_cache = shared_cache
+        self._tokens = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _key(self, auth_url, user):
+        return 'swift_token:%s:%s' % (auth_url, user)
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _fresh(self, entry):
+        return entry is not None and entry.get('refresh', entry['expires'] - self.refresh_margin) > time.time()
+
+    def _lookup(self, key):
+        entry = self._tokens.get(key)
+        if not self._fresh(entry) and self.shared_cache is not None:
+            entry = caches[self.shared_cache].get(key)
+            if self._fresh(entry):
+                self._tokens[key] = entry
+        return entry if self._fresh(entry) else None
+
+    def _authenticate(self, auth_url, user, key):
+        """ Return (storage_url, auth_token, lifetime), lifetime None if unknown. """
+        auth_version = str(settings.SWIFT_AUTH_VERSION or 1)
+        with tracing.span('swift.auth'):
+            if auth_version in ('1', '1.0'):
+                return _authenticate_v1(auth_url, user, key)
+            conn = client.Connection(authurl=auth_url,
+                    user=user,
+                    key=key,
+                    auth_version=auth_version,
+                    insecure=settings.SWIFT_SSL_INSECURE)
+            storage_url, auth_token = conn.get_auth()
+            lifetime = None
+            if auth_version in ('3', '3.0'):
+                lifetime = _keystone_lifetime(auth_url, auth_token)
+            return storage_url, auth_token, lifetime
+
+    def get(self, auth_url=None, user=None, key=None, stale_token=None):
+        """ Return (storage_url, auth_token), authenticating if needed.
+
+        Passing the token Swift just rejected as stale_token forces a refresh
+        unless another thread has already replaced it. """
+        auth_url = auth_url or settings.SWIFT_AUTH_URL
+        user = user or settings.SWIFT_AUTH_USER
+        key = key or settings.SWIFT_AUTH_KEY
+        cache_key = self._key(auth_url, user)
+
+        entry = self._lookup(cache_key)
+        if entry is not None and entry['token'] != stale_token:
+            return entry['storage_url'], entry['token']
+
+        with self._key_lock(cache_key):
+            # Another thread may have refreshed while we waited for the lock
+            entry = self._lookup(cache_key)
+            if entry is not None and entry['token'] != stale_token:
+                return entry['storage_url'], entry['token']
+
+            logger.info('Authenticating to %s as %s' % (auth_url, user))
+            storage_url, auth_token, lifetime = self._authenticate(auth_url, user, key)
+            ttl = self.ttl if lifetime is None else max(0, min(self.ttl, lifetime))
+            now = time.time()
+            entry = {
+                'storage_url': storage_url,
+                'token': auth_token,
+                'expires': now + ttl,
+                # Short-lived tokens are refreshed halfway through instead
+                'refresh': now + ttl - min(self.refresh_margin, ttl / 2.0),
+            }
+            self._tokens[cache_key] = entry
+            if self.shared_cache is not None:
+                caches[self.shared_cache].set(cache_key, entry, ttl)
+            return storage_url, auth_token
+
+    def invalidate(self, auth_url=None, user=None):
+        cache_key = self._key(auth_url or settings.SWIFT_AUTH_URL,
+                              user or settings.SWIFT_AUTH_USER)
+        self._tokens.pop(cache_key, None)
+        if self.shared_cache is not None:
+            caches[self.shared_cache].delete(cache_key)
+
+
+token_cache = TokenCache(ttl=settings.SWIFT_TOKEN_TTL,
+                         refresh_margin=settings.SWIFT_TOKEN_REFRESH_MARGIN,
+                         shared_cache=settings.SWIFT_TOKEN_CACHE)
+
+
+def credentials(request, stale_token=None):
+    """ Return (storage_url, auth_token) for this request, keeping the session in sync.
+
+    The session is only written when the cached token has changed. """
+    storage_url, auth_token = token_cache.get(stale_token=stale_token)
+    if request.session.get('auth_token') != auth_token:
+        request.session['storage_url'] = storage_url
+        request.session['auth_token'] = auth_token
+    return storage_url, auth_token
+
+
+def _rewind_position(contents):
+    """ Where to seek contents back to before sending it again, None if it cannot be. """
+    try:
+        if contents.seekable():
+            return contents.tell()
+    except (AttributeError, OSError, ValueError):
+        pass
+    return None
+
+
+def _call_with_retry(storage_url, auth_token, reauthenticate, func, args, kwargs):
+    contents = kwargs.get('contents')
+    # Streams such as the request body of upload_chunk cannot be sent twice
+    replayable = contents is None or isinstance(contents, (bytes, str))
+    position = None if replayable else _rewind_position(contents)
+    try:
+        with pool.connection(storage_url) as http_conn:
+            return metrics.timed(func, storage_url, auth_token, *args, http_conn=http_conn, **kwargs)
+    except client.ClientException as exc:
+        if exc.http_status != 401:
+            raise
+        logger.info('Swift rejected auth token, re-authenticating')
+        storage_url, auth_token = reauthenticate(auth_token)
+        if not replayable and position is None:
+            # The next call gets the new token; this body is gone
+            raise
+
+    if position is not None:
+        contents.seek(position)
+    with pool.connection(storage_url) as http_conn:
+        return metrics.timed(func, storage_url, auth_token, *args, http_conn=http_conn, **kwargs)
+
+
+def swift_call(request, func, *args, **kwargs):
+    """ Call func(storage_url, auth_token, *args, http_conn=..., **kwargs) with a
+    pooled connection, re-authenticating and retrying once if Swift answers 401. """
+    storage_url, auth_token = credentials(request)
+    return _call_with_retry(storage_url, auth_token,
+                            lambda stale: credentials(request, stale_token=stale),
+                            func, args, kwargs)
+
+
+def call(func, *args, **kwargs):
+    """ Same as swift_call() for code running outside of a request. """
+    storage_url, auth_token = token_cache.get()
+    return _call_with_retry(storage_url, auth_token,
+                            lambda stale: token_cache.get(stale_token=stale),
+                            func, args, kwargs)
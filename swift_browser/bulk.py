@@ -0,0 +1,242 @@
+"""
+Uploading many files at once.
+
+Plain files are PUT concurrently, SWIFT_BULK_CONCURRENCY at a time.  A tar,
+tar.gz or tar.bz2 archive is sent in one request to Swift's extract-archive
+bulk middleware when /info advertises bulk_upload, and Swift creates one
+object per member.  Clusters without it get the members streamed out of the
+archive instead: members up to SWIFT_BULK_BUFFER_SIZE bytes are read into
+memory and PUT concurrently, larger ones are streamed to Swift as they are
+read.  Nothing is extracted to disk either way.
+"""
+import json
+import logging
+import mimetypes
+import tarfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import unquote
+
+from django.conf import settings
+from swiftclient import client
+
+from . import capabilities, search, usage
+from .auth import call
+from .models import IndexedContainer
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMATS = (
+    ('.tar.gz', 'tar.gz'),
+    ('.tgz', 'tar.gz'),
+    ('.tar.bz2', 'tar.bz2'),
+    ('.tbz2', 'tar.bz2'),
+    ('.tar', 'tar'),
+)
+
+
+def archive_format(filename):
+    """ Return the extract-archive format of a file name, or None if it is not an archive. """
+    lower = filename.lower()
+    for extension, fmt in ARCHIVE_FORMATS:
+        if lower.endswith(extension):
+            return fmt
+    return None
+
+
+def put_archive(url, token, container, prefix, contents, fmt, content_length=None, http_conn=None):
+    """ PUT an archive with ?extract-archive and return Swift's JSON report.
+    Follows the calling convention of the swiftclient.client functions. """
+    parsed, conn = http_conn
+    path = '%s/%s' % (parsed.path, client.quote(container))
+    if prefix:
+        path += '/' + client.quote(prefix.rstrip('/'))
+    path += '?extract-archive=' + fmt
+    headers = {
+        'X-Auth-Token': token,
+        'Accept': 'application/json',
+    }
+    if content_length is not None:
+        headers['Content-Length'] = str(content_length)
+    conn.request('PUT', path, contents, headers)
+    resp = conn.getresponse()
+    body = resp.read()
+    if resp.status < 200 or resp.status >= 300:
+        raise client.ClientException.from_response(resp, 'Archive PUT failed', body)
+    # The middleware sends whitespace while it works, then the report
+    return json.loads(body.decode('utf-8'))
+
+
+def member_name(member):
+    """ Object name of a tar member, or None for members that are not regular files. """
+    if not member.isfile():
+        return None
+    name = member.name
+    while name.startswith('./'):
+        name = name[2:]
+    return name.lstrip('/') or None
+
+
+def iter_members(contents, fmt):
+    """ Yield (name, size, fileobj) for the regular files of an archive read as a stream. """
+    mode = 'r|' + {'tar': '', 'tar.gz': 'gz', 'tar.bz2': 'bz2'}[fmt]
+    with tarfile.open(fileobj=contents, mode=mode) as archive:
+        for member in archive:
+            name = member_name(member)
+            if name is not None:
+                yield name, member.size, archive.extractfile(member)
+
+
+class BulkReport(object):
+
+    def __init__(self):
+        self.uploaded = 0
+        self.bytes = 0
+        self.failed = []
+
+    def __str__(self):
+        return '%d uploaded, %d failed' % (self.uploaded, len(self.failed))
+
+
+class BulkUpload(object):
+    """ Uploads files and archive members under prefix in a container.
+
+    Use it as a context manager: leaving the block waits for the uploads that
+    are still running.  failed in the report lists (name, reason) pairs.
+    progress, if given, is called with the report from the calling thread. """
+
+    def __init__(self, container, prefix='', concurrency=None, progress=None):
+        self.container = container
+        self.prefix = prefix
+        self.concurrency = concurrency or settings.SWIFT_BULK_CONCURRENCY
+        self.progress = progress
+        self.report = BulkReport()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = set()
+        # Recording is only worth it for containers the browser keeps track of
+        self._record = (IndexedContainer.objects.filter(name=container).exists()
+                        or usage.scanned(container))
+        self._created = []
+
+    def __enter__(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._executor.shutdown(wait=True)
+        self._pending = set()
+        self._flush()
+        if self.progress:
+            self.progress(self.report)
+
+    def _done(self, name, size, content_type, error):
+        with self._lock:
+            if error is None:
+                self.report.uploaded += 1
+                self.report.bytes += size
+                if self._record:
+                    self._created.append((name, size, content_type))
+            else:
+                self.report.failed.append((name, error))
+
+    def _put(self, name, contents, size, content_type):
+        try:
+            call(client.put_object, self.container, name=name, contents=contents,
+                 content_length=size, content_type=content_type)
+        except client.ClientException as exc:
+            logger.warning('Uploading %s/%s failed: %s' % (self.container, name, exc))
+            self._done(name, size, content_type, 'upload failed: %s' % exc)
+        else:
+            self._done(name, size, content_type, None)
+
+    def _submit(self, name, contents, size, content_type):
+        # Bound what is held in memory to a couple of objects per thread
+        while len(self._pending) >= 2 * self.concurrency:
+            _done, self._pending = wait(self._pending, return_when=FIRST_COMPLETED)
+            if self.progress:
+                self.progress(self.report)
+        self._pending.add(self._executor.submit(self._put, name, contents, size, content_type))
+
+    def add_file(self, name, contents, size, content_type=None):
+        """ Upload one file.  Small files are read and sent in the background,
+        so contents may be closed as soon as this returns. """
+        name = self.prefix + name
+        content_type = content_type or mimetypes.guess_type(name)[0]
+        if size <= settings.SWIFT_BULK_BUFFER_SIZE:
+            self._submit(name, contents.read(), size, content_type)
+        else:
+            self._put(name, contents, size, content_type)
+
+    def add_archive(self, filename, contents, fmt, size=None):
+        """ Upload the members of an archive under prefix. """
+        if capabilities.bulk_upload():
+            self._extract(filename, contents, fmt, size)
+            return
+        try:
+            for name, member_size, member in iter_members(contents, fmt):
+                # The stream cannot move past a member still being read
+                self.add_file(name, member, member_size)
+        except (tarfile.TarError, EOFError, OSError) as exc:
+            logger.warning('Reading archive %s failed: %s' % (filename, exc))
+            self.report.failed.append((filename, 'invalid archive: %s' % exc))
+
+    def _extract(self, filename, contents, fmt, size):
+        logger.info('Extracting %s into /%s/%s' % (filename, self.container, self.prefix))
+        try:
+            result = call(put_archive, self.container, self.prefix, contents=contents,
+                          fmt=fmt, content_length=size)
+        except client.ClientException as exc:
+            logger.warning('Extracting %s failed: %s' % (filename, exc))
+            self.report.failed.append((filename, 'extraction failed: %s' % exc))
+            return
+        errors = result.get('Errors') or []
+        created = result.get('Number Files Created', 0)
+        status = result.get('Response Status', '')
+        if not errors and not status.startswith('2'):
+            reason = '%s %s' % (status, result.get('Response Body', ''))
+            errors = [[filename, reason.strip()]]
+        errors = [(self._error_name(name), reason) for name, reason in errors]
+        with self._lock:
+            self.report.uploaded += created
+            self.report.failed.extend((name, 'extraction failed: %s' % reason) for name, reason in errors)
+        if self.progress:
+            self.progress(self.report)
+        if self._record and created:
+            # Swift does not say what it created: read the member headers back
+            failed = set(name for name, _reason in errors)
+            contents.seek(0)
+            try:
+                for name, member_size, _member in iter_members(contents, fmt):
+                    name = self.prefix + name
+                    if name not in failed:
+                        self._created.append((name, member_size, mimetypes.guess_type(name)[0]))
+                        self.report.bytes += member_size
+            except (tarfile.TarError, EOFError, OSError) as exc:
+                logger.warning('Reading archive %s failed: %s' % (filename, exc))
+
+    def _error_name(self, path):
+        """ Object name from the quoted '/container/object' paths of extract-archive errors. """
+        name = unquote(path).lstrip('/')
+        if name.startswith(self.container + '/'):
+            name = name[len(self.container) + 1:]
+        return name
+
+    def _flush(self):
+        for name, size, content_type in self._created:
+            search.record_put(self.container, name, size, content_type)
+            usage.record_put(self.container, name, size)
+        self._created = []
+
+
+def upload(container, prefix, files, extract=True, progress=None):
+    """ Upload (filename, fileobj, size) tuples under prefix, unpacking archives
+    when extract is set, and return a BulkReport. """
+    with BulkUpload(container, prefix, progress=progress) as uploader:
+        for filename, contents, size in files:
+            fmt = archive_format(filename) if extract else None
+            if fmt:
+                uploader.add_archive(filename, contents, fmt, size)
+            else:
+                uploader.add_file(filename, contents, size)
+    return uploader.report
@@ -0,0 +1,94 @@
+"""
+Swift cluster capabilities as advertised by the proxy's /info endpoint.
+
+/info is fetched at most once every SWIFT_CAPABILITIES_TTL seconds per
+process.  The accessors below return plain values with Swift's defaults
+filled in, so callers can pick bulk or parallel strategies without digging
+through the raw document.
+"""
+import logging
+import threading
+import time
+from urllib.parse import urljoin
+
+from django.conf import settings
+from swiftclient import client
+
+from . import metrics, pool
+from .auth import token_cache
+
+logger = logging.getLogger(__name__)
+
+# Swift's own defaults, for clusters that do not say
+DEFAULT_LISTING_LIMIT = 10000
+DEFAULT_MAX_FILE_SIZE = 5368709122
+DEFAULT_MAX_MANIFEST_SEGMENTS = 1000
+
+# A failed fetch is retried sooner than a successful one is refreshed
+RETRY_AFTER = 60
+
+_capabilities = None
+_expires = 0
+_lock = threading.Lock()
+
+
+def _fetch():
+    storage_url, _token = token_cache.get()
+    info_url = urljoin(storage_url, '/info')
+    try:
+        with pool.connection(info_url) as http_conn:
+            return metrics.timed(client.get_capabilities, http_conn), settings.SWIFT_CAPABILITIES_TTL
+    except client.ClientException as exc:
+        logger.warning('Could not fetch Swift capabilities: %s' % exc)
+        return {}, min(RETRY_AFTER, settings.SWIFT_CAPABILITIES_TTL)
+
+
+def get_capabilities():
+    """ Return the /info document. Clusters with /info disabled report no capabilities. """
+    global _capabilities, _expires
+    if _capabilities is None or _expires <= time.time():
+        with _lock:
+            if _capabilities is None or _expires <= time.time():
+                _capabilities, ttl = _fetch()
+                _expires = time.time() + ttl
+    return _capabilities
+
+
+def invalidate():
+    global _expires
+    _expires = 0
+
+
+def container_listing_limit():
+    """ The most entries Swift returns in one listing page. """
+    return get_capabilities().get('swift', {}).get('container_listing_limit', DEFAULT_LISTING_LIMIT)
+
+
+def max_file_size():
+    """ The largest object Swift accepts in a single PUT. """
+    return get_capabilities().get('swift', {}).get('max_file_size', DEFAULT_MAX_FILE_SIZE)
+
+
+def bulk_delete_size():
+    """ How many objects one bulk-delete request may name, 0 without bulk delete. """
+    bulk = get_capabilities().get('bulk_delete')
+    return bulk.get('max_deletes_per_request', 10000) if bulk is not None else 0
+
+
+def bulk_upload():
+    """ Whether archives can be PUT with ?extract-archive. """
+    return 'bulk_upload' in get_capabilities()
+
+
+def slo():
+    """ Whether Static Large Objects are supported. """
+    return 'slo' in get_capabilities()
+
+
+def max_manifest_segments():
+    return get_capabilities().get('slo', {}).get('max_manifest_segments', DEFAULT_MAX_MANIFEST_SEGMENTS)
+
+
+def tempurl_methods():
+    """ The methods TempURLs may be signed for, empty without the tempurl middleware. """
+    return get_capabilities().get('tempurl', {}).get('methods', [])
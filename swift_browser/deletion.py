@@ -0,0 +1,153 @@
+"""
+Deletion of every object in a container (or under a prefix).
+
+The listing is paged with markers so containers of any size are emptied.
+When the cluster advertises the bulk middleware in /info, names are sent in
+batches to ?bulk-delete; otherwise objects are deleted by a bounded pool of
+threads issuing concurrent DELETEs.  Failed names are retried before giving up.
+"""
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from django.conf import settings
+from swiftclient import client
+
+from . import capabilities
+from .auth import call
+from .listing import iter_pages
+
+logger = logging.getLogger(__name__)
+
+
+def bulk_delete(url, token, names, http_conn=None):
+    """ Delete up to max_deletes_per_request '/container/object' names in one request.
+
+    Follows the calling convention of the swiftclient.client functions.
+    Returns the decoded bulk middleware response. """
+    parsed, conn = http_conn
+    body = '\n'.join(client.quote(name) for name in names).encode('utf-8')
+    headers = {
+        'X-Auth-Token': token,
+        'Accept': 'application/json',
+        'Content-Type': 'text/plain',
+    }
+    conn.request('POST', '%s?bulk-delete' % parsed.path, body, headers)
+    resp = conn.getresponse()
+    body = resp.read()
+    if resp.status < 200 or resp.status >= 300:
+        raise client.ClientException.from_response(resp, 'Bulk delete failed', body)
+    return json.loads(body.decode('utf-8'))
+
+
+class DeletionReport(object):
+
+    def __init__(self):
+        self.deleted = 0
+        self.not_found = 0
+        self.failed = []
+        self.container_deleted = False
+
+    def __str__(self):
+        return '%d deleted, %d not found, %d failed' % (
+            self.deleted, self.not_found, len(self.failed))
+
+
+class Deleter(object):
+    """ Deletes the objects of a container, optionally limited to a prefix.
+
+    progress, if given, is called with the report after every batch. """
+
+    def __init__(self, container, prefix=None, concurrency=None, retries=None, progress=None):
+        self.container = container
+        self.prefix = prefix
+        self.concurrency = concurrency or settings.SWIFT_DELETE_CONCURRENCY
+        self.retries = settings.SWIFT_DELETE_RETRIES if retries is None else retries
+        self.progress = progress
+        self.report = DeletionReport()
+        self.bulk_size = capabilities.bulk_delete_size()
+
+    def _bulk(self, names):
+        """ Returns the names that could not be deleted. """
+        paths = ['/%s/%s' % (self.container, name) for name in names]
+        try:
+            result = call(bulk_delete, paths)
+        except client.ClientException as exc:
+            logger.warning('Bulk delete of %d objects failed: %s' % (len(names), exc))
+            return names
+        self.report.deleted += result.get('Number Deleted', 0)
+        self.report.not_found += result.get('Number Not Found', 0)
+        if not result.get('Errors') and not result.get('Response Status', '200').startswith('2'):
+            logger.warning('Bulk delete of %d objects failed: %s'
+                           % (len(names), result['Response Status']))
+            return names
+        prefix = '/%s/' % self.container
+        return [unquote(path)[len(prefix):]
+                for path, _status in result.get('Errors', [])]
+
+    def _delete_one(self, name):
+        try:
+            call(client.delete_object, self.container, name)
+            return 'deleted'
+        except client.ClientException as exc:
+            if exc.http_status == 404:
+                return 'not_found'
+            logger.warning('Deleting %s/%s failed: %s' % (self.container, name, exc))
+            return 'failed'
+
+    def _concurrent(self, executor, names):
+        failed = []
+        for name, outcome in zip(names, executor.map(self._delete_one, names)):
+            if outcome == 'deleted':
+                self.report.deleted += 1
+            elif outcome == 'not_found':
+                self.report.not_found += 1
+            else:
+                failed.append(name)
+        return failed
+
+    def _delete(self, executor, names):
+        """ Delete names, retrying failures; returns the names still failing. """
+        for attempt in range(self.retries + 1):
+            if not names:
+                break
+            if attempt:
+                time.sleep(min(2 ** attempt, 30))
+                logger.info('Retrying deletion of %d objects in %s' % (len(names), self.container))
+            if self.bulk_size:
+                failed = []
+                for start in range(0, len(names), self.bulk_size):
+                    failed.extend(self._bulk(names[start:start + self.bulk_size]))
+                names = failed
+            else:
+                names = self._concurrent(executor, names)
+        return names
+
+    def delete_objects(self):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for page in iter_pages(self.container, prefix=self.prefix):
+                names = [entry['name'] for entry in page]
+                self.report.failed.extend(self._delete(executor, names))
+                if self.progress:
+                    self.progress(self.report)
+        return self.report
+
+    def delete_container(self):
+        """ Empty the container, then delete it. """
+        self.delete_objects()
+        if self.report.failed:
+            return self.report
+        for attempt in range(self.retries + 1):
+            try:
+                call(client.delete_container, self.container)
+                self.report.container_deleted = True
+                break
+            except client.ClientException as exc:
+                # Listings are eventually consistent: Swift may still believe
+                # the container holds objects for a moment after deleting them.
+                if exc.http_status != 409 or attempt == self.retries:
+                    raise
+                time.sleep(min(2 ** attempt, 30))
+        return self.report
@@ -0,0 +1,483 @@
+"""
+In-memory stand-in for a Swift proxy, for development and benchmarks.
+
+FakeSwift is a WSGI application speaking the parts of the Swift API the
+browser uses: v1 auth, /info, account, container and object requests,
+listings with prefix, delimiter, marker, end_marker, limit and reverse,
+Range and If-None-Match, COPY, Static Large Objects, bulk delete,
+extract-archive, and TempURLs.  Names are kept sorted, so a listing page
+costs a binary search plus the page itself, and containers of several
+hundred thousand objects stay fast.
+
+Point SWIFT_AUTH_URL at `manage.py fakeswift` to run the browser without a
+cluster; `manage.py bench` starts one in-process.
+"""
+import bisect
+import hashlib
+import hmac
+import io
+import json
+import tarfile
+import threading
+import time
+from email.utils import formatdate
+from urllib.parse import parse_qs, quote, unquote
+
+ARCHIVE_MODES = {'tar': 'r|', 'tar.gz': 'r|gz', 'tar.bz2': 'r|bz2'}
+
+
+def _after(prefix):
+    """ The smallest string greater than every string starting with prefix. """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class SortedNames(object):
+    """ Sorted list of names with the prefix/marker walks listings need. """
+
+    def __init__(self):
+        self.names = []
+
+    def add(self, name):
+        index = bisect.bisect_left(self.names, name)
+        if index == len(self.names) or self.names[index] != name:
+            self.names.insert(index, name)
+
+    def remove(self, name):
+        index = bisect.bisect_left(self.names, name)
+        if index < len(self.names) and self.names[index] == name:
+            del self.names[index]
+
+    def listing(self, prefix='', delimiter=None, marker='', end_marker='', limit=10000, reverse=False):
+        """ Return up to limit names and 'subdir/' entries, as Swift would list them. """
+        names = self.names
+        out = []
+        if not reverse:
+            index = bisect.bisect_left(names, prefix)
+            if marker:
+                index = max(index, bisect.bisect_right(names, marker))
+            while index < len(names) and len(out) < limit:
+                name = names[index]
+                if not name.startswith(prefix) or (end_marker and name >= end_marker):
+                    break
+                cut = name.find(delimiter, len(prefix)) if delimiter else -1
+                if cut < 0:
+                    out.append(name)
+                    index += 1
+                    continue
+                subdir = name[:cut + len(delimiter)]
+                if not marker or subdir > marker:
+                    out.append(subdir)
+                index = bisect.bisect_left(names, _after(subdir), index)
+        else:
+            index = bisect.bisect_left(names, _after(prefix)) if prefix else len(names)
+            if marker:
+                index = min(index, bisect.bisect_left(names, marker))
+            index -= 1
+            while index >= 0 and len(out) < limit:
+                name = names[index]
+                if not name.startswith(prefix) or (end_marker and name <= end_marker):
+                    break
+                cut = name.find(delimiter, len(prefix)) if delimiter else -1
+                if cut < 0:
+                    out.append(name)
+                    index -= 1
+                    continue
+                subdir = name[:cut + len(delimiter)]
+                out.append(subdir)
+                index = bisect.bisect_left(names, subdir, 0, index) - 1
+        return out
+
+
+class Container(object):
+
+    def __init__(self):
+        self.objects = {}
+        self.names = SortedNames()
+        self.meta = {}
+        self.bytes = 0
+
+    def put(self, name, obj):
+        old = self.objects.get(name)
+        if old is not None:
+            self.bytes -= old['bytes']
+        self.objects[name] = obj
+        self.names.add(name)
+        self.bytes += obj['bytes']
+
+    def delete(self, name):
+        obj = self.objects.pop(name)
+        self.names.remove(name)
+        self.bytes -= obj['bytes']
+        return obj
+
+
+def make_object(data, content_type=None, manifest=None, size=None):
+    now = time.time()
+    return {
+        'data': data,
+        'etag': hashlib.md5(data).hexdigest(),
+        'bytes': len(data) if size is None else size,
+        'content_type': content_type or 'application/octet-stream',
+        'last_modified': time.strftime('%Y-%m-%dT%H:%M:%S.000000', time.gmtime(now)),
+        'timestamp': now,
+        'manifest': manifest,
+    }
+
+
+class FakeSwift(object):
+
+    def __init__(self, account='AUTH_test', user='test:tester', key='testing',
+                 bulk=True, listing_limit=10000):
+        self.account = account
+        self.user = user
+        self.key = key
+        self.bulk = bulk
+        self.listing_limit = listing_limit
+        self.token = 'AUTH_tk%s' % hashlib.md5(str(time.time()).encode('utf-8')).hexdigest()
+        self.token_lifetime = 86400
+        self.containers = {}
+        self.container_names = SortedNames()
+        self.meta = {}
+        self.lock = threading.Lock()
+
+    def info(self):
+        info = {
+            'swift': {'container_listing_limit': self.listing_limit, 'max_file_size': 5368709122},
+            'slo': {'max_manifest_segments': 1000, 'min_segment_size': 1},
+            'tempurl': {'methods': ['GET', 'HEAD', 'PUT', 'POST', 'DELETE']},
+        }
+        if self.bulk:
+            info['bulk_delete'] = {'max_deletes_per_request': 10000, 'max_failed_deletes': 1000}
+            info['bulk_upload'] = {'max_containers_per_extraction': 10000, 'max_failed_extractions': 1000}
+        return info
+
+    # Direct access, for filling a container without going through HTTP
+
+    def put_container(self, container):
+        with self.lock:
+            if container not in self.containers:
+                self.containers[container] = Container()
+                self.container_names.add(container)
+
+    def put_object(self, container, name, data, content_type=None):
+        with self.lock:
+            self.containers[container].put(name, make_object(data, content_type))
+
+    # WSGI
+
+    def __call__(self, environ, start_response):
+        method = environ['REQUEST_METHOD']
+        # PATH_INFO is already unquoted, and WSGI servers decode it as latin-1
+        path = environ.get('PATH_INFO', '').encode('latin-1').decode('utf-8')
+        q = dict((key, values[0]) for key, values in
+                 parse_qs(environ.get('QUERY_STRING', ''), keep_blank_values=True).items())
+        headers = dict((key[5:].replace('_', '-').lower(), value)
+                       for key, value in environ.items() if key.startswith('HTTP_'))
+        if 'CONTENT_TYPE' in environ:
+            headers['content-type'] = environ['CONTENT_TYPE']
+
+        def respond(status, body=b'', extra=None):
+            if isinstance(body, str):
+                body = body.encode('utf-8')
+            response_headers = [('Content-Length', str(len(body)))]
+            response_headers.extend((extra or {}).items())
+            start_response(status, response_headers)
+            return [body] if method != 'HEAD' else []
+
+        body = b''
+        if method in ('PUT', 'POST'):
+            # Read before answering, even with a 401, so that the client is
+            # not cut off while it still sends
+            body = self.read_body(environ)
+
+        if path == '/info':
+            return respond('200 OK', json.dumps(self.info()), {'Content-Type': 'application/json'})
+        if path.startswith('/auth/'):
+            if headers.get('x-auth-user') == self.user and headers.get('x-auth-key') == self.key:
+                host = environ.get('HTTP_HOST', 'localhost')
+                return respond('200 OK', extra={
+                    'X-Storage-Url': 'http://%s/v1/%s' % (host, self.account),
+                    'X-Auth-Token': self.token,
+                    'X-Auth-Token-Expires': str(self.token_lifetime),
+                })
+            return respond('401 Unauthorized')
+        if 'temp_url_sig' in q:
+            if not self.valid_temp_url(method, path, q):
+                return respond('401 Unauthorized')
+        elif headers.get('x-auth-token') != self.token:
+            return respond('401 Unauthorized')
+
+        parts = path.split('/', 4)[1:]
+        if len(parts) < 2 or parts[0] != 'v1' or parts[1] != self.account:
+            return respond('404 Not Found')
+        if len(parts) == 2 or parts[2] == '':
+            return self.account_request(method, q, headers, body, respond)
+        container = parts[2]
+        name = parts[3] if len(parts) > 3 else ''
+        if method == 'PUT' and 'extract-archive' in q and self.bulk:
+            return self.extract_archive(container, name, q['extract-archive'], body, respond)
+        if not name:
+            return self.container_request(method, container, q, headers, respond)
+        return self.object_request(method, container, name, q, headers, body, respond)
+
+    def read_body(self, environ):
+        stream = environ['wsgi.input']
+        if environ.get('HTTP_TRANSFER_ENCODING', '').lower() != 'chunked':
+            return stream.read(int(environ.get('CONTENT_LENGTH') or 0))
+        chunks = []
+        while True:
+            size = int(stream.readline().split(b';')[0].strip(), 16)
+            if not size:
+                stream.readline()
+                return b''.join(chunks)
+            chunks.append(stream.read(size))
+            stream.readline()
+
+    def valid_temp_url(self, method, path, q):
+        key = self.meta.get('temp-url-key')
+        if not key or int(q.get('temp_url_expires', 0)) < time.time():
+            return False
+        signature = q['temp_url_sig']
+        digest = hashlib.sha1 if len(signature) == 40 else hashlib.sha256
+        # Swift signs the unquoted path
+        message = '%s\n%s\n%s' % ('GET' if method == 'HEAD' else method,
+                                  q['temp_url_expires'], path)
+        expected = hmac.new(key.encode('utf-8'), message.encode('utf-8'), digest).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
+    def listing_args(self, q):
+        return {
+            'prefix': q.get('prefix', ''),
+            'delimiter': q.get('delimiter') or None,
+            'marker': q.get('marker', ''),
+            'end_marker': q.get('end_marker', ''),
+            'limit': min(int(q.get('limit') or self.listing_limit), self.listing_limit),
+            'reverse': q.get('reverse', '').lower() in ('on', 'true', '1', 'yes'),
+        }
+
+    def account_request(self, method, q, headers, body, respond):
+        with self.lock:
+            if method == 'POST' and 'bulk-delete' in q:
+                return self.bulk_delete(body, respond)
+            if method == 'POST':
+                self.meta.update((key[len('x-account-meta-'):], value) for key, value in headers.items()
+                                 if key.startswith('x-account-meta-'))
+                return respond('204 No Content')
+            if method not in ('GET', 'HEAD'):
+                return respond('405 Method Not Allowed')
+            account_headers = {
+                'X-Account-Container-Count': str(len(self.containers)),
+                'X-Account-Object-Count': str(sum(len(c.objects) for c in self.containers.values())),
+                'X-Account-Bytes-Used': str(sum(c.bytes for c in self.containers.values())),
+            }
+            account_headers.update(('X-Account-Meta-%s' % key, value) for key, value in self.meta.items())
+            if method == 'HEAD':
+                return respond('204 No Content', extra=account_headers)
+            listing = []
+            for name in self.container_names.listing(**self.listing_args(q)):
+                c = self.containers.get(name)
+                if c is None:
+                    listing.append({'subdir': name})
+                else:
+                    listing.append({'name': name, 'count': len(c.objects), 'bytes': c.bytes})
+        if not listing:
+            return respond('204 No Content', extra=account_headers)
+        account_headers['Content-Type'] = 'application/json; charset=utf-8'
+        return respond('200 OK', json.dumps(listing), account_headers)
+
+    def bulk_delete(self, body, respond):
+        deleted = not_found = 0
+        errors = []
+        for line in body.decode('utf-8').splitlines():
+            path = unquote(line.strip()).lstrip('/')
+            if not path:
+                continue
+            container, _, name = path.partition('/')
+            c = self.containers.get(container)
+            if c is None or (name and name not in c.objects):
+                not_found += 1
+            elif name:
+                c.delete(name)
+                deleted += 1
+            elif c.objects:
+                errors.append([quote('/' + path), '409 Conflict'])
+            else:
+                del self.containers[container]
+                self.container_names.remove(container)
+                deleted += 1
+        result = {
+            'Number Deleted': deleted,
+            'Number Not Found': not_found,
+            'Errors': errors,
+            'Response Status': '400 Bad Request' if errors else '200 OK',
+            'Response Body': '',
+        }
+        return respond('200 OK', json.dumps(result), {'Content-Type': 'application/json'})
+
+    def extract_archive(self, container, prefix, fmt, body, respond):
+        created = 0
+        status = '201 Created'
+        if prefix:
+            prefix = prefix.rstrip('/') + '/'
+        try:
+            with tarfile.open(fileobj=io.BytesIO(body), mode=ARCHIVE_MODES[fmt]) as archive:
+                with self.lock:
+                    if container not in self.containers:
+                        self.containers[container] = Container()
+                        self.container_names.add(container)
+                    for member in archive:
+                        if not member.isfile():
+                            continue
+                        name = member.name
+                        while name.startswith('./'):
+                            name = name[2:]
+                        data = archive.extractfile(member).read()
+                        self.containers[container].put(prefix + name.lstrip('/'), make_object(data))
+                        created += 1
+        except (KeyError, tarfile.TarError, EOFError, OSError):
+            status = '400 Bad Request'
+        result = {
+            'Number Files Created': created,
+            'Errors': [],
+            'Response Status': status,
+            'Response Body': '' if status.startswith('2') else 'Invalid Tar File',
+        }
+        # Like Swift, pad the report with the whitespace sent while working
+        return respond('200 OK', ' ' + json.dumps(result), {'Content-Type': 'application/json'})
+
+    def container_request(self, method, container, q, headers, respond):
+        with self.lock:
+            c = self.containers.get(container)
+            if method in ('PUT', 'POST'):
+                if c is None and method == 'POST':
+                    return respond('404 Not Found')
+                created = c is None
+                if created:
+                    c = self.containers[container] = Container()
+                    self.container_names.add(container)
+                c.meta.update((key, value) for key, value in headers.items()
+                              if key.startswith('x-container-'))
+                return respond('201 Created' if created else '204 No Content')
+            if c is None:
+                return respond('404 Not Found')
+            if method == 'DELETE':
+                if c.objects:
+                    return respond('409 Conflict')
+                del self.containers[container]
+                self.container_names.remove(container)
+                return respond('204 No Content')
+            if method not in ('GET', 'HEAD'):
+                return respond('405 Method Not Allowed')
+            container_headers = {
+                'X-Container-Object-Count': str(len(c.objects)),
+                'X-Container-Bytes-Used': str(c.bytes),
+            }
+            container_headers.update(c.meta)
+            if method == 'HEAD':
+                return respond('204 No Content', extra=container_headers)
+            listing = []
+            for name in c.names.listing(**self.listing_args(q)):
+                obj = c.objects.get(name)
+                if obj is None:
+                    listing.append({'subdir': name})
+                    continue
+                entry = {'name': name, 'bytes': obj['bytes'], 'hash': obj['etag'],
+                         'content_type': obj['content_type'], 'last_modified': obj['last_modified']}
+                if obj['manifest'] is not None:
+                    entry['slo_etag'] = '"%s"' % obj['etag']
+                listing.append(entry)
+        if not listing:
+            return respond('204 No Content', extra=container_headers)
+        container_headers['Content-Type'] = 'application/json; charset=utf-8'
+        return respond('200 OK', json.dumps(listing), container_headers)
+
+    def segment_data(self, manifest):
+        data = []
+        for segment in manifest:
+            container, _, name = segment['path'].lstrip('/').partition('/')
+            data.append(self.containers[container].objects[name]['data'])
+        return b''.join(data)
+
+    def object_request(self, method, container, name, q, headers, body, respond):
+        with self.lock:
+            c = self.containers.get(container)
+            if c is None:
+                return respond('404 Not Found')
+            multipart = q.get('multipart-manifest')
+            if method == 'PUT':
+                if multipart == 'put':
+                    manifest = json.loads(body.decode('utf-8'))
+                    obj = make_object(json.dumps(manifest).encode('utf-8'), headers.get('content-type'),
+                                      manifest=manifest, size=sum(s['size_bytes'] for s in manifest))
+                else:
+                    obj = make_object(body, headers.get('content-type'))
+                c.put(name, obj)
+                return respond('201 Created', extra={'Etag': obj['etag']})
+            obj = c.objects.get(name)
+            if obj is None:
+                return respond('404 Not Found')
+            if method == 'DELETE':
+                c.delete(name)
+                if multipart == 'delete' and obj['manifest'] is not None:
+                    for segment in obj['manifest']:
+                        segment_container, _, segment_name = segment['path'].lstrip('/').partition('/')
+                        if segment_name in self.containers.get(segment_container, Container()).objects:
+                            self.containers[segment_container].delete(segment_name)
+                return respond('204 No Content')
+            if method == 'COPY':
+                destination = unquote(headers.get('destination', '')).lstrip('/')
+                dest_container, _, dest_name = destination.partition('/')
+                if dest_container not in self.containers or not dest_name:
+                    return respond('412 Precondition Failed')
+                copy = dict(obj, timestamp=time.time())
+                if obj['manifest'] is not None and multipart != 'get':
+                    copy = make_object(self.segment_data(obj['manifest']), obj['content_type'])
+                self.containers[dest_container].put(dest_name, copy)
+                return respond('201 Created')
+            if method not in ('GET', 'HEAD'):
+                return respond('405 Method Not Allowed')
+            object_headers = {
+                'Etag': obj['etag'],
+                'Content-Type': obj['content_type'],
+                'Last-Modified': formatdate(obj['timestamp'], usegmt=True),
+                'Accept-Ranges': 'bytes',
+            }
+            data = obj['data']
+            if obj['manifest'] is not None and multipart != 'get':
+                object_headers['X-Static-Large-Object'] = 'True'
+                data = self.segment_data(obj['manifest'])
+        if headers.get('if-none-match', '').strip('"') == obj['etag']:
+            return respond('304 Not Modified', extra=object_headers)
+        byte_range = headers.get('range', '')
+        if not byte_range.startswith('bytes='):
+            return respond('200 OK', data, object_headers)
+        first, _, last = byte_range[len('bytes='):].partition('-')
+        if first:
+            first, last = int(first), int(last) if last else len(data) - 1
+        else:
+            first, last = max(0, len(data) - int(last)), len(data) - 1
+        last = min(last, len(data) - 1)
+        if first >= len(data) or first > last:
+            object_headers['Content-Range'] = 'bytes */%d' % len(data)
+            return respond('416 Requested Range Not Satisfiable', extra=object_headers)
+        object_headers['Content-Range'] = 'bytes %d-%d/%d' % (first, last, len(data))
+        return respond('206 Partial Content', data[first:last + 1], object_headers)
+
+
+def serve(host='127.0.0.1', port=8080, **kwargs):
+    """ Return (app, server) for a FakeSwift on host:port; call server.serve_forever(). """
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+    class Server(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+
+    class Handler(WSGIRequestHandler):
+        # Keep-alive, so the connection pool is exercised as with a real proxy
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+    app = FakeSwift(**kwargs)
+    return app, make_server(host, port, app, server_class=Server, handler_class=Handler)
@@ -0,0 +1,54 @@
+"""
+Concurrent Swift calls for views that need many small requests.
+
+fan_out() runs one call per item on a process-wide thread pool, each on its
+own pooled connection, and waits for all of them, so a page needing N HEADs
+costs about one round trip instead of N.  A call that fails yields its
+ClientException instead of failing the whole batch.
+
+Calls run outside the request thread, so they go through auth.call() and
+must not touch the request or session.  They should not need the database
+either; any connection one opens anyway is closed when it returns.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from swiftclient import client
+
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.SWIFT_FANOUT_CONCURRENCY)
+    return _executor
+
+
+def _guarded(trace, func, item):
+    try:
+        with tracing.activate(trace):
+            return func(item)
+    except client.ClientException as exc:
+        logger.warning('Swift call for %s failed: %s' % (item, exc))
+        return exc
+    finally:
+        # Pool threads outlive requests, so nothing else would close them
+        connections.close_all()
+
+
+def fan_out(func, items):
+    """ Return [func(item) for item in items], running the calls concurrently. """
+    trace = tracing.current()
+    futures = [get_executor().submit(_guarded, trace, func, item) for item in items]
+    return [future.result() for future in futures]
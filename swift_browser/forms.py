@@ -1,4 +1,5 @@
 from django import forms
+from django.forms import ValidationError
 
 class ContainerNameField(forms.CharField):
     """
@@ -51,8 +52,49 @@ class UploadFileForm(forms.Form):
     subdir = ObjectNameField(label='Subdirectory', required=False)
     object_name = ObjectNameField(label='Object Name')
 
+class BulkUploadForm(forms.Form):
+    """ Form to upload several files at once, unpacking tar archives """
+    files = forms.FileField(label='Files', widget=forms.ClearableFileInput(attrs={'multiple': True}))
+    container = ContainerNameField(label='Container')
+    subdir = ObjectNameField(label='Subdirectory', required=False)
+    extract = forms.BooleanField(label='Unpack .tar, .tar.gz and .tar.bz2 archives',
+                                 required=False, initial=True)
+
+class UploadTargetForm(forms.Form):
+    """ Upload destination passed in the query string for streaming uploads """
+    container = ContainerNameField(label='Container')
+    subdir = ObjectNameField(label='Subdirectory', required=False)
+    object_name = ObjectNameField(label='Object Name')
+
+class ResumableUploadForm(forms.Form):
+    """ Starts a chunked upload through the JSON API """
+    container = ContainerNameField(label='Container')
+    subdir = ObjectNameField(label='Subdirectory', required=False)
+    object_name = ObjectNameField(label='Object Name')
+    size = forms.IntegerField(min_value=1)
+    content_type = forms.CharField(max_length=256, required=False)
+
 class CreateFolderForm(forms.Form):
     container = ContainerNameField(label='Container Name')
     subdir = ObjectNameField(label='Subdirectory', required=False)
     folder_name = forms.CharField(label='Folder Name', max_length=256)
 
+
+class MoveForm(forms.Form):
+    """ Move or rename an object, or a pseudofolder when source ends with '/' """
+    container = ContainerNameField(widget=forms.HiddenInput())
+    subdir = ObjectNameField(widget=forms.HiddenInput(), required=False)
+    source = ObjectNameField(widget=forms.HiddenInput())
+    dest_container = ContainerNameField(label='Destination container')
+    destination = ObjectNameField(label='New name')
+
+class SearchForm(forms.Form):
+    """ Filters for searching the name index of a container """
+    q = forms.CharField(label='Name', max_length=1024, required=False)
+    min_size = forms.IntegerField(label='Min size', min_value=0, required=False)
+    max_size = forms.IntegerField(label='Max size', min_value=0, required=False)
+    modified_after = forms.DateField(label='Modified after', required=False)
+    modified_before = forms.DateField(label='Modified before', required=False)
+
+    def has_filters(self):
+        return any(value not in (None, '') for value in self.cleaned_data.values())
@@ -0,0 +1,228 @@
+"""
+Queue of long-running Swift operations.
+
+Views call enqueue() and return immediately; the run_jobs management command
+claims queued jobs, at most SWIFT_JOBS_PER_USER at a time for any one user,
+and runs the handler registered for the job's kind.  While a job runs its
+worker updates the job's heartbeat; a job whose heartbeat is older than
+SWIFT_JOB_STALE_AFTER seconds lost its worker and is queued again, up to
+SWIFT_JOB_MAX_ATTEMPTS runs in all.  Uploads are spooled to the local disk,
+so only a worker on the same host can run them.
+"""
+import json
+import logging
+import os
+import socket
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from swiftclient import client
+
+from . import bulk, search, usage
+from .auth import call, token_cache
+from .deletion import Deleter
+from .listing_cache import listing_cache
+from .models import Job
+from .move import Mover
+from .segments import SegmentedUpload, segment_threshold, upload_id
+
+logger = logging.getLogger(__name__)
+
+NODE = socket.gethostname()
+
+# Kinds whose arguments name files in SWIFT_JOB_SPOOL_DIR
+SPOOLED = (Job.UPLOAD, Job.BULK_UPLOAD)
+
+
+def enqueue(user, kind, **arguments):
+    job = Job.objects.create(user=user, kind=kind, arguments=json.dumps(arguments),
+                             node=NODE if kind in SPOOLED else '')
+    logger.info("Queued job %s: %s %s" % (job.pk, kind, arguments))
+    return job
+
+
+def spool(upload_file):
+    """ Copy an uploaded file to SWIFT_JOB_SPOOL_DIR for the worker to pick up. """
+    os.makedirs(settings.SWIFT_JOB_SPOOL_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=settings.SWIFT_JOB_SPOOL_DIR)
+    with os.fdopen(fd, 'wb') as spooled:
+        for chunk in upload_file.chunks():
+            spooled.write(chunk)
+    return path
+
+
+def requeue_stale():
+    """
+    Queue again the jobs whose worker stopped.  Fail them instead after
+    SWIFT_JOB_MAX_ATTEMPTS runs, or when their spooled files are on another host.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.SWIFT_JOB_STALE_AFTER)
+    stale = Job.objects.filter(Q(heartbeat__lt=cutoff) | Q(heartbeat__isnull=True, started__lt=cutoff),
+                               status=Job.RUNNING)
+    failed = stale.filter(attempts__gte=settings.SWIFT_JOB_MAX_ATTEMPTS).update(
+        status=Job.FAILED, finished=now, message='The worker running this job stopped')
+    failed += stale.exclude(Q(node='') | Q(node=NODE)).update(
+        status=Job.FAILED, finished=now, message='The worker running this job stopped on another host')
+    requeued = stale.update(status=Job.QUEUED, message='Queued again after its worker stopped')
+    if failed or requeued:
+        logger.warning("%d stale jobs queued again, %d failed" % (requeued, failed))
+
+
+def heartbeat(job_ids):
+    Job.objects.filter(pk__in=job_ids, status=Job.RUNNING).update(heartbeat=timezone.now())
+
+
+def claim_next():
+    """ Atomically move the oldest eligible queued job to running and return it. """
+    requeue_stale()
+    busy_users = (Job.objects.filter(status=Job.RUNNING)
+                  .values('user')
+                  .annotate(running=Count('id'))
+                  .filter(running__gte=settings.SWIFT_JOBS_PER_USER)
+                  .values('user'))
+    candidates = (Job.objects.filter(Q(node='') | Q(node=NODE), status=Job.QUEUED)
+                  .exclude(user__in=list(busy_users.values_list('user', flat=True)))
+                  .order_by('created'))[:10]
+    for job in candidates:
+        with transaction.atomic():
+            # Two workers claiming jobs of the same user wait for each other
+            # here, so the count below sees the other's claim.  SQLite has no
+            # row locks but runs the UPDATE with its subquery as one write.
+            list(get_user_model().objects.select_for_update().filter(pk=job.user_id).values('pk'))
+            now = timezone.now()
+            claimed = (Job.objects.filter(pk=job.pk, status=Job.QUEUED)
+                       .exclude(user__in=busy_users)
+                       .update(status=Job.RUNNING, started=now, heartbeat=now,
+                               attempts=F('attempts') + 1))
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def report_progress(job, done, total=None):
+    job.done = done
+    fields = ['done']
+    if total is not None:
+        job.total = total
+        fields.append('total')
+    job.save(update_fields=fields)
+
+
+def delete_container(job, container):
+    deleter = Deleter(container, progress=lambda report: report_progress(
+        job, report.deleted + report.not_found))
+    report = deleter.delete_container()
+    if not report.container_deleted:
+        raise RuntimeError('%d objects could not be deleted' % len(report.failed))
+    search.record_delete(container)
+    usage.record_delete(container)
+    return str(report)
+
+
+def delete_folder(job, container, prefix):
+    deleter = Deleter(container, prefix=prefix, progress=lambda report: report_progress(
+        job, report.deleted + report.not_found))
+    report = deleter.delete_objects()
+    search.record_delete(container, prefix=prefix)
+    usage.record_delete(container, prefix=prefix)
+    if report.failed:
+        raise RuntimeError('%d objects could not be deleted' % len(report.failed))
+    return str(report)
+
+
+def upload(job, container, name, path):
+    """ Upload a file spooled by the upload view, then remove it. """
+    try:
+        size = os.path.getsize(path)
+        report_progress(job, 0, size)
+        if size > segment_threshold():
+            SegmentedUpload(container, name, path, upload_id=upload_id(container, name, size),
+                            progress=lambda done, total: report_progress(job, done)).run()
+        else:
+            with open(path, 'rb') as contents:
+                call(client.put_object, container, name=name,
+                     contents=contents, content_length=size)
+        report_progress(job, size)
+        search.record_put(container, name, size)
+        usage.record_put(container, name, size)
+    finally:
+        os.remove(path)
+    return 'Uploaded %d bytes' % size
+
+
+def _spooled(files):
+    for path, filename in files:
+        with open(path, 'rb') as contents:
+            yield filename, contents, os.path.getsize(path)
+
+
+def bulk_upload(job, container, prefix, files, extract):
+    """ Upload files spooled by the bulk upload view, then remove them. """
+    try:
+        report_progress(job, 0)
+        report = bulk.upload(container, prefix, _spooled(files), extract=extract,
+                             progress=lambda report: report_progress(job, report.uploaded))
+    finally:
+        for path, _filename in files:
+            os.remove(path)
+    if report.failed:
+        raise RuntimeError('%d files could not be uploaded, e.g. %s: %s'
+                           % ((len(report.failed),) + report.failed[0]))
+    return str(report)
+
+
+def move(job, container, source, dest_container, destination):
+    mover = Mover(container, source, dest_container, destination,
+                  progress=lambda report: report_progress(job, report.moved + len(report.failed)))
+    report = mover.move()
+    failed = [name for name, _error in report.failed]
+    search.record_move(container, source, dest_container, mover.destination, failed=failed)
+    usage.record_move(container, source, dest_container, mover.destination,
+                      size=report.bytes, failed=failed)
+    listing_cache.invalidate(token_cache.get()[0], dest_container)
+    if report.failed:
+        raise RuntimeError('%d objects could not be moved, e.g. %s: %s'
+                           % ((len(report.failed),) + report.failed[0]))
+    return str(report)
+
+
+def scan_usage(job, container):
+    count = usage.scan(container, progress=lambda count: report_progress(job, count))
+    return 'Scanned %d objects' % count
+
+
+HANDLERS = {
+    Job.DELETE_CONTAINER: delete_container,
+    Job.DELETE_FOLDER: delete_folder,
+    Job.UPLOAD: upload,
+    Job.BULK_UPLOAD: bulk_upload,
+    Job.MOVE: move,
+    Job.SCAN_USAGE: scan_usage,
+}
+
+
+def run(job):
+    arguments = job.get_arguments()
+    logger.info("Running job %s: %s %s" % (job.pk, job.kind, arguments))
+    try:
+        job.message = HANDLERS[job.kind](job, **arguments) or ''
+        job.status = Job.DONE
+    except Exception as exc:
+        logger.exception("Job %s failed" % job.pk)
+        job.message = str(exc)
+        job.status = Job.FAILED
+    job.finished = timezone.now()
+    job.save(update_fields=['status', 'message', 'finished'])
+    try:
+        storage_url, _token = token_cache.get()
+        listing_cache.invalidate(storage_url, arguments['container'])
+    except client.ClientException:
+        pass
+    return job
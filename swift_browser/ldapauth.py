@@ -0,0 +1,176 @@
+"""
+LDAP logins with cached directory lookups.
+
+CachingLDAPBackend checks every password with a bind as the user, like
+django_python3_ldap's LDAPBackend, but caches the user's attributes and
+LDAP_GROUP_MEMBER membership for SWIFT_LDAP_CACHE_TTL seconds.  Lookups go
+through one persistent connection per process when a service account is
+configured in LDAP_AUTH_CONNECTION_USERNAME, and the local user is only
+written when its attributes were fetched again.  If a lookup fails, results
+up to SWIFT_LDAP_STALE_TTL seconds old are used instead, so that a brief
+directory outage does not lock out users whose bind still succeeds.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import ldap3
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django_python3_ldap import ldap
+from django_python3_ldap.conf import settings as ldap_settings
+from django_python3_ldap.utils import format_search_filter, import_func
+from ldap3.core.exceptions import LDAPException
+from ldap3.utils.conv import escape_filter_chars
+
+logger = logging.getLogger(__name__)
+
+_server = None
+_service = None
+_lock = threading.Lock()
+
+
+def get_server():
+    global _server
+    if _server is None:
+        _server = ldap3.Server(ldap_settings.LDAP_AUTH_URL,
+                               allowed_referral_hosts=[('*', True)],
+                               get_info=ldap3.NONE,
+                               connect_timeout=ldap_settings.LDAP_AUTH_CONNECT_TIMEOUT)
+    return _server
+
+
+def bind(user, password, **kwargs):
+    if ldap_settings.LDAP_AUTH_USE_TLS:
+        auto_bind = ldap3.AUTO_BIND_TLS_BEFORE_BIND
+    else:
+        auto_bind = ldap3.AUTO_BIND_NO_TLS
+    return ldap3.Connection(get_server(),
+                            user=user,
+                            password=password,
+                            auto_bind=auto_bind,
+                            raise_exceptions=True,
+                            receive_timeout=ldap_settings.LDAP_AUTH_RECEIVE_TIMEOUT,
+                            **kwargs)
+
+
+def format_username(lookup):
+    return import_func(ldap_settings.LDAP_AUTH_FORMAT_USERNAME)(lookup)
+
+
+@contextmanager
+def search_connection(user_conn):
+    """ The service account's connection, or user_conn when there is no service account. """
+    global _service
+    if not (ldap_settings.LDAP_AUTH_CONNECTION_USERNAME or ldap_settings.LDAP_AUTH_CONNECTION_PASSWORD):
+        yield user_conn
+        return
+    with _lock:
+        try:
+            if _service is None:
+                username = format_username({
+                    get_user_model().USERNAME_FIELD: ldap_settings.LDAP_AUTH_CONNECTION_USERNAME,
+                })
+                _service = bind(username, ldap_settings.LDAP_AUTH_CONNECTION_PASSWORD,
+                                client_strategy=ldap3.RESTARTABLE)
+            yield _service
+        except LDAPException:
+            # Connect again on the next lookup
+            _service = None
+            raise
+
+
+def cached(key, fetch):
+    """ Return (value, fresh), calling fetch() unless the cache holds a recent value. """
+    cache = caches[settings.SWIFT_LDAP_CACHE]
+    entry = cache.get(key)
+    if entry is not None and time.time() - entry['fetched'] < settings.SWIFT_LDAP_CACHE_TTL:
+        return entry['value'], False
+    try:
+        value = fetch()
+    except LDAPException as exc:
+        if entry is None:
+            raise
+        logger.warning('LDAP lookup failed, using the result from %d seconds ago: %s'
+                       % (time.time() - entry['fetched'], exc))
+        return entry['value'], False
+    cache.set(key, {'value': value, 'fetched': time.time()}, settings.SWIFT_LDAP_STALE_TTL)
+    return value, True
+
+
+def search_user(conn, lookup):
+    """ Return the user's entry as {'dn': ..., 'attributes': ...}, None if there is none. """
+    if conn.search(search_base=ldap_settings.LDAP_AUTH_SEARCH_BASE,
+                   search_filter=format_search_filter(lookup),
+                   search_scope=ldap3.SUBTREE,
+                   attributes=ldap3.ALL_ATTRIBUTES,
+                   get_operational_attributes=True,
+                   size_limit=1):
+        entry = conn.response[0]
+        return {'dn': entry['dn'], 'attributes': dict(entry['attributes'])}
+    return None
+
+
+def is_member(conn, group, user):
+    uid = user['attributes'].get(ldap_settings.LDAP_AUTH_USER_FIELDS['username'], '')
+    if isinstance(uid, (list, tuple)):
+        uid = uid[0] if uid else ''
+    dn = escape_filter_chars(user['dn'])
+    return conn.search(search_base=group,
+                       search_filter='(|(member=%s)(uniqueMember=%s)(memberUid=%s))'
+                                     % (dn, dn, escape_filter_chars(uid)),
+                       search_scope=ldap3.BASE,
+                       attributes=[])
+
+
+class CachingLDAPBackend(ModelBackend):
+    """ An LDAPBackend that caches directory lookups and enforces LDAP_GROUP_MEMBER. """
+
+    supports_inactive_user = False
+
+    def authenticate(self, *args, **kwargs):
+        password = kwargs.pop('password', None)
+        if not password or frozenset(kwargs) != frozenset(ldap_settings.LDAP_AUTH_USER_LOOKUP_FIELDS):
+            return None
+        try:
+            user_conn = bind(format_username(kwargs), password)
+        except LDAPException as exc:
+            logger.warning('LDAP bind failed: %s' % exc)
+            return None
+        try:
+            return self.get_ldap_user(user_conn, kwargs)
+        except LDAPException as exc:
+            logger.warning('LDAP lookup failed: %s' % exc)
+            return None
+        finally:
+            user_conn.unbind()
+
+    def get_ldap_user(self, user_conn, lookup):
+        key = ':'.join('%s=%s' % (field, lookup[field]) for field in sorted(lookup))
+
+        def fetch_user():
+            with search_connection(user_conn) as conn:
+                return search_user(conn, lookup)
+        entry, fresh = cached('ldap-user:' + key, fetch_user)
+        if entry is None:
+            logger.warning('LDAP user lookup found no %s' % key)
+            return None
+
+        group = settings.LDAP_GROUP_MEMBER
+        if group:
+            def fetch_membership():
+                with search_connection(user_conn) as conn:
+                    return is_member(conn, group, entry)
+            member, _fresh = cached('ldap-member:%s:%s' % (group, key), fetch_membership)
+            if not member:
+                logger.warning('%s is not a member of %s' % (entry['dn'], group))
+                return None
+
+        if not fresh:
+            user = get_user_model().objects.filter(**lookup).first()
+            if user is not None:
+                return user
+        return ldap.Connection(None)._get_or_create_user(entry)
@@ -0,0 +1,49 @@
+"""
+Helpers to walk Swift listings one page at a time.
+"""
+import json
+import logging
+
+from swiftclient import client
+
+from .auth import call
+
+logger = logging.getLogger(__name__)
+
+
+def iter_pages(container=None, prefix=None, delimiter=None, marker=None, limit=None):
+    """ Yield successive pages of a container listing (or of the account
+    listing when container is None), following markers until Swift returns
+    an empty page. """
+    while True:
+        if container is None:
+            _headers, page = call(client.get_account, marker=marker,
+                                  limit=limit, prefix=prefix)
+        else:
+            _headers, page = call(client.get_container, container,
+                                  marker=marker, limit=limit, prefix=prefix,
+                                  delimiter=delimiter)
+        if not page:
+            return
+        yield page
+        marker = page[-1].get('name', page[-1].get('subdir'))
+
+
+def iter_listing(container=None, prefix=None, delimiter=None, marker=None):
+    """ Yield the entries of a listing without holding more than one page in memory. """
+    for page in iter_pages(container, prefix=prefix, delimiter=delimiter, marker=marker):
+        for entry in page:
+            yield entry
+
+
+def ndjson(pages):
+    """ Serialize pages of a listing as newline-delimited JSON, one chunk per page.
+
+    A Swift error after the response has started cannot change its status, so
+    it ends the stream with an {"error": ...} line instead. """
+    try:
+        for page in pages:
+            yield ''.join(json.dumps(entry) + '\n' for entry in page)
+    except client.ClientException as exc:
+        logger.error('Listing failed while streaming: %s' % exc)
+        yield json.dumps({'error': 'Swift request failed'}) + '\n'
@@ -0,0 +1,152 @@
+"""
+Cache of account and container listings.
+
+Listings are stored in the Django cache named by SWIFT_LISTING_CACHE for
+SWIFT_LISTING_CACHE_TTL seconds.  Every key embeds a generation number per
+account and per container; writes made through the browser bump the
+generation, which makes every cached page of that listing unreachable at once
+without having to enumerate the keys.
+
+The generations are kept in the database, so that a write handled by one
+worker, or by the job worker, also hides the listings cached by the others,
+whatever cache backend holds them.  Each process reads the generations of an
+account at most once every SWIFT_LISTING_GENERATION_TTL seconds.  Code running
+off the request thread, such as fanout calls, gets them from generations()
+beforehand so that it never opens a database connection of its own.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from . import metrics
+from .models import ListingGeneration
+
+logger = logging.getLogger(__name__)
+
+
+class ListingCache(object):
+
+    def __init__(self, alias, ttl, generation_ttl):
+        self.alias = alias
+        self.ttl = ttl
+        self.generation_ttl = generation_ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # {account: (read at, {container: generation})}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _account_key(self, account):
+        return hashlib.md5(account.encode('utf-8')).hexdigest()
+
+    def generations(self, account):
+        """ Return {container: generation} for an account, to pass to get_or_fetch(). """
+        account = self._account_key(account)
+        now = time.time()
+        with self._lock:
+            read, generations = self._generations.get(account, (0, None))
+        if generations is None or now - read >= self.generation_ttl:
+            generations = dict(ListingGeneration.objects.filter(account=account)
+                               .values_list('container', 'generation'))
+            with self._lock:
+                self._generations[account] = (now, generations)
+        return generations
+
+    def _key(self, account, container, params, generations=None):
+        if generations is None:
+            generations = self.generations(account)
+        generation = generations.get(container, 0)
+        raw = '%s/%s?%s' % (account, container, '&'.join(
+            '%s=%s' % (k, params[k]) for k in sorted(params)))
+        return 'listing:%s:%s' % (generation, hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_or_fetch(self, account, container, params, fetch, generations=None):
+        """ Return the cached listing for (account, container, params) or call
+        fetch() and cache its result. container is '' for account listings.
+
+        generations, from generations(), saves the database lookup. """
+        key = self._key(account, container, params, generations)
+        listing = self.cache.get(key)
+        if listing is not None:
+            self._count(True)
+            return listing
+        self._count(False)
+        listing = fetch()
+        self.cache.set(key, listing, self.ttl)
+        return listing
+
+    def invalidate(self, account, container=''):
+        """ Forget cached listings of a container and of the account that holds it. """
+        with self._lock:
+            self.invalidations += 1
+        account = self._account_key(account)
+        for name in set(['', container]):
+            generations = ListingGeneration.objects.filter(account=account, container=name)
+            if generations.update(generation=F('generation') + 1):
+                continue
+            try:
+                with transaction.atomic():
+                    # Start from the clock rather than 0, which is what
+                    # listings cached before the first write were cached under.
+                    ListingGeneration.objects.create(account=account, container=name,
+                                                     generation=int(time.time() * 1000))
+            except IntegrityError:
+                generations.update(generation=F('generation') + 1)
+        with self._lock:
+            self._generations.pop(account, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_ratio': float(self.hits) / lookups if lookups else 0.0,
+                # Only local memory caches can report how much they hold
+                'entries': len(getattr(self.cache, '_cache', {})),
+            }
+
+
+class NullListingCache(object):
+    """ Used when SWIFT_LISTING_CACHE is unset: always fetches. """
+
+    def generations(self, account):
+        return {}
+
+    def get_or_fetch(self, account, container, params, fetch, generations=None):
+        return fetch()
+
+    def invalidate(self, account, container=''):
+        pass
+
+    def stats(self):
+        return {}
+
+
+if settings.SWIFT_LISTING_CACHE:
+    listing_cache = ListingCache(settings.SWIFT_LISTING_CACHE,
+                                 settings.SWIFT_LISTING_CACHE_TTL,
+                                 settings.SWIFT_LISTING_GENERATION_TTL)
+else:
+    listing_cache = NullListingCache()
+
+metrics.register_stats('swift_listing_cache', 'Listing cache of this process', listing_cache.stats)
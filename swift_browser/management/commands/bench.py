@@ -0,0 +1,235 @@
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from swiftclient import client
+
+from swift_browser import fakeswift
+from swift_browser.auth import call
+from swift_browser.deletion import Deleter
+
+SCENARIOS = ('containers', 'container', 'upload', 'delete_container')
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ('Drive the containers, container, upload and delete_container views with '
+            'concurrent clients and report latency percentiles and requests per second. '
+            'Runs against an in-process fake Swift unless --external is given.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--objects', type=int, default=100000,
+                            help='Objects in the container that is listed.')
+        parser.add_argument('--folders', type=int, default=100,
+                            help='Pseudofolders the objects are spread over.')
+        parser.add_argument('--containers', type=int, default=100,
+                            help='Containers in the account listing.')
+        parser.add_argument('--object-size', type=int, default=1024)
+        parser.add_argument('--delete-objects', type=int, default=100,
+                            help='Objects in each container that is deleted.')
+        parser.add_argument('--clients', type=int, default=8,
+                            help='Concurrent clients.')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per scenario.')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+        parser.add_argument('--session-engine', choices=('db', 'cached_db', 'cache', 'signed_cookies'),
+                            help='Override SWIFT_SESSION_ENGINE.')
+        parser.add_argument('--external', action='store_true',
+                            help='Use the cluster configured in SWIFT_AUTH_URL instead of a fake.')
+        parser.add_argument('--save', metavar='FILE',
+                            help='Write the results to FILE as JSON.')
+        parser.add_argument('--compare', metavar='FILE',
+                            help='Fail if p99 or requests/sec are worse than in FILE.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed regression against --compare, as a fraction.')
+
+    def handle(self, *args, **options):
+        scenarios = [name for name in options['scenarios'].split(',') if name]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError('Unknown scenarios: %s' % ', '.join(sorted(unknown)))
+        if settings.DEBUG:
+            self.stderr.write('DEBUG is on: timings include the debug toolbar.')
+
+        overrides = {
+            'ALLOWED_HOSTS': list(settings.ALLOWED_HOSTS) + ['testserver'],
+            # Time the work itself rather than queueing it
+            'SWIFT_BACKGROUND_JOBS': False,
+        }
+        if options['session_engine']:
+            overrides['SESSION_ENGINE'] = 'swift_browser.sessions.' + options['session_engine']
+        self.app = None
+        if not options['external']:
+            self.app, server = fakeswift.serve(port=0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            overrides.update({
+                'SWIFT_AUTH_URL': 'http://127.0.0.1:%d/auth/v1.0' % server.server_address[1],
+                'SWIFT_AUTH_USER': self.app.user,
+                'SWIFT_AUTH_KEY': self.app.key,
+                'SWIFT_AUTH_VERSION': '1',
+            })
+
+        with override_settings(**overrides):
+            self.options = options
+            self.populate(scenarios)
+            user, _created = User.objects.get_or_create(username='swift-bench')
+            if options['verbosity'] < 2:
+                logging.getLogger('swift_browser').setLevel(logging.WARNING)
+            try:
+                clients = self.clients(user)
+                results = dict((name, self.run(name, clients)) for name in scenarios)
+            finally:
+                user.delete()
+                if options['external']:
+                    self.clean_up(scenarios)
+
+        self.report(results)
+        if options['save']:
+            with open(options['save'], 'w') as saved:
+                json.dump(results, saved, indent=2, sort_keys=True)
+        if options['compare']:
+            self.compare(results, options['compare'], options['tolerance'])
+
+    # Test data
+
+    def put_objects(self, container, names):
+        data = b'x' * self.options['object_size']
+        if self.app is not None:
+            self.app.put_container(container)
+            for name in names:
+                self.app.put_object(container, name, data)
+            return
+        call(client.put_container, container)
+        with ThreadPoolExecutor(max_workers=settings.SWIFT_BULK_CONCURRENCY) as executor:
+            list(executor.map(lambda name: call(client.put_object, container, name, data), names))
+
+    def populate(self, scenarios):
+        options = self.options
+        folders = max(1, options['folders'])
+        self.names = ['folder%04d/object%08d' % (i % folders, i) for i in range(options['objects'])]
+        self.stdout.write('Creating %d objects...' % len(self.names))
+        self.put_objects('bench', self.names)
+        for index in range(options['containers']):
+            self.put_objects('bench-%04d' % index, [])
+        if 'delete_container' in scenarios:
+            for index in range(options['requests']):
+                self.put_objects('bench-delete-%04d' % index,
+                                 ['object%06d' % i for i in range(options['delete_objects'])])
+
+    def clean_up(self, scenarios):
+        containers = ['bench'] + ['bench-%04d' % i for i in range(self.options['containers'])]
+        for container in containers:
+            Deleter(container).delete_container()
+
+    # Scenarios
+
+    def request(self, name, index):
+        """ Return (method, path, data) for request number index of a scenario. """
+        if name == 'containers':
+            return 'get', '/', None
+        if name == 'container':
+            if index % 4 == 0:
+                return 'get', '/view_container/?container=bench', None
+            marker = random.choice(self.names)
+            return 'get', '/view_container/', {
+                'container': 'bench',
+                'subdir': marker.split('/')[0] + '/',
+                'marker': marker,
+            }
+        if name == 'upload':
+            object_name = 'upload%06d.bin' % index
+            data = {
+                'container': 'bench',
+                'subdir': 'uploads/',
+                'object_name': object_name,
+                'file': SimpleUploadedFile(object_name, b'x' * self.options['object_size']),
+            }
+            # The streaming upload handler takes the target from the query string
+            return 'post', '/upload/?container=bench&subdir=uploads/&object_name=%s' % object_name, data
+        return 'get', '/delete_container/?container=bench-delete-%04d' % index, None
+
+    def clients(self, user):
+        """ Logged in clients, warmed up so authentication and /info are not timed. """
+        clients = []
+        for _ in range(self.options['clients']):
+            browser = Client()
+            browser.force_login(user)
+            browser.get('/')
+            clients.append(browser)
+        return clients
+
+    def run(self, name, clients):
+        requests = self.options['requests']
+        timings = []
+        errors = []
+        queries = []
+
+        def worker(browser, indexes):
+            try:
+                for index in indexes:
+                    method, path, data = self.request(name, index)
+                    with CaptureQueriesContext(connections['default']) as captured:
+                        start = time.perf_counter()
+                        response = getattr(browser, method)(path, data)
+                        timings.append(time.perf_counter() - start)
+                    queries.append(len(captured))
+                    if response.status_code >= 400:
+                        errors.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        self.stdout.write('Running %s...' % name)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+            list(executor.map(worker, clients,
+                              [range(i, requests, len(clients)) for i in range(len(clients))]))
+        wall = time.perf_counter() - start
+
+        timings.sort()
+        return {
+            'requests': len(timings),
+            'errors': len(errors),
+            'p50_ms': percentile(timings, 0.50) * 1000,
+            'p99_ms': percentile(timings, 0.99) * 1000,
+            'rps': len(timings) / wall,
+            'db_queries': sum(queries) / len(queries),
+        }
+
+    # Results
+
+    def report(self, results):
+        self.stdout.write('%-18s %8s %7s %10s %10s %10s %10s' % (
+            'scenario', 'requests', 'errors', 'p50 ms', 'p99 ms', 'req/s', 'queries'))
+        for name, result in results.items():
+            self.stdout.write('%-18s %8d %7d %10.1f %10.1f %10.1f %10.1f' % (
+                name, result['requests'], result['errors'],
+                result['p50_ms'], result['p99_ms'], result['rps'], result['db_queries']))
+
+    def compare(self, results, path, tolerance):
+        with open(path) as saved:
+            baseline = json.load(saved)
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if result['p99_ms'] > before['p99_ms'] * (1 + tolerance):
+                regressions.append('%s: p99 %.1f ms, was %.1f ms' % (name, result['p99_ms'], before['p99_ms']))
+            if result['rps'] < before['rps'] * (1 - tolerance):
+                regressions.append('%s: %.1f req/s, was %.1f req/s' % (name, result['rps'], before['rps']))
+        if regressions:
+            raise CommandError('Slower than %s:\n  %s' % (path, '\n  '.join(regressions)))
+        self.stdout.write('No regressions against %s' % path)
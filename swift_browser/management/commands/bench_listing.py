@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.template.loader import get_template
+from django.test import RequestFactory
+
+from swift_browser.transform import rows
+
+
+class Command(BaseCommand):
+    help = 'Measure the cost per row of turning a listing page into the container page.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000,
+                            help='Entries in the simulated listing page.')
+        parser.add_argument('--folders', type=int, default=100,
+                            help='How many of the entries are pseudofolders.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Runs to take the best time of.')
+
+    def listing(self, count, folders):
+        entries = [{'subdir': 'photos/%05d/' % i} for i in range(folders)]
+        entries.extend({
+            'name': 'photos/IMG_%08d.jpg' % i,
+            'bytes': 1024 * i,
+            'hash': 'd41d8cd98f00b204e9800998ecf8427e',
+            'content_type': 'image/jpeg',
+            'last_modified': '2017-06-01T12:00:00.000000',
+        } for i in range(count - folders))
+        return entries
+
+    def best(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def handle(self, *args, **options):
+        count = options['rows']
+        entries = self.listing(count, options['folders'])
+        url = lambda row: '/download/?container=photos&object_name=' + row.quoted
+
+        transform = self.best(options['repeat'], lambda: rows([dict(entry) for entry in entries],
+                                                              'photos/', url=url))
+        subdirs, folder_objects = rows([dict(entry) for entry in entries], 'photos/', url=url)
+        template = get_template('container.html')
+        context = {
+            'container': 'photos',
+            'quoted_container': 'photos',
+            'query': 'container=photos&subdir=photos%2F',
+            'subdirs': subdirs,
+            'upload_subdir': 'photos/',
+            'folder_objects': folder_objects,
+            'path': [],
+            'limit': count,
+            'usage_scanned': True,
+        }
+        request = RequestFactory().get('/view_container/')
+        render = self.best(options['repeat'], lambda: template.render(context, request))
+
+        for label, seconds in (('transform', transform), ('render', render)):
+            self.stdout.write('%-10s %8.1f ms  %6.2f us/row' % (
+                label, seconds * 1000, seconds * 1e6 / count))
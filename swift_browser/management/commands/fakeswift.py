@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from swift_browser import fakeswift
+
+
+class Command(BaseCommand):
+    help = 'Serve an in-memory fake Swift cluster for development.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8080)
+        parser.add_argument('--no-bulk', action='store_true',
+                            help='Do not offer bulk delete and extract-archive.')
+        parser.add_argument('--listing-limit', type=int, default=10000,
+                            help='Most entries returned in one listing page.')
+
+    def handle(self, *args, **options):
+        app, server = fakeswift.serve(options['host'], options['port'],
+                                      bulk=not options['no_bulk'],
+                                      listing_limit=options['listing_limit'])
+        self.stdout.write('Fake Swift listening on http://%s:%d, use\n'
+                          '  SWIFT_AUTH_URL=http://%s:%d/auth/v1.0 SWIFT_AUTH_USER=%s SWIFT_AUTH_KEY=%s'
+                          % (options['host'], options['port'], options['host'], options['port'],
+                             app.user, app.key))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from swift_browser import search
+from swift_browser.listing import iter_listing
+from swift_browser.models import IndexedContainer
+
+
+class Command(BaseCommand):
+    help = 'Build the search index of object names for the given containers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('containers', nargs='*',
+                            help='Containers to index.')
+        parser.add_argument('--all', action='store_true',
+                            help='Index every container in the account.')
+        parser.add_argument('--reindex', action='store_true',
+                            help='Rebuild the containers that are already indexed.')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue interrupted runs instead of starting over.')
+
+    def handle(self, *args, **options):
+        containers = list(options['containers'])
+        if options['all']:
+            containers.extend(entry['name'] for entry in iter_listing())
+        if options['reindex']:
+            containers.extend(IndexedContainer.objects.values_list('name', flat=True))
+        if not containers:
+            raise CommandError('Name containers to index, or use --all or --reindex.')
+
+        for container in sorted(set(containers)):
+            count = search.build(container, resume=options['resume'],
+                                 progress=lambda count: self.stdout.write(
+                                     '%s: %d objects' % (container, count), ending='\r'))
+            self.stdout.write('%s: indexed %d objects' % (container, count))
@@ -0,0 +1,63 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from swift_browser import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued Swift jobs (container deletes, folder deletes, large uploads).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Number of jobs run at the same time.')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty.')
+
+    def work(self, poll_interval, once):
+        try:
+            while True:
+                job = jobs.claim_next()
+                if job is None:
+                    if once:
+                        return
+                    time.sleep(poll_interval)
+                    continue
+                with self.lock:
+                    self.running.add(job.pk)
+                try:
+                    jobs.run(job)
+                finally:
+                    with self.lock:
+                        self.running.discard(job.pk)
+                self.stdout.write('Job %s %s: %s' % (job.pk, job.status, job.message))
+        finally:
+            connection.close()
+
+    def beat(self):
+        """ Tell other workers that the jobs of this one are still running. """
+        while True:
+            time.sleep(settings.SWIFT_JOB_HEARTBEAT)
+            with self.lock:
+                running = list(self.running)
+            if running:
+                jobs.heartbeat(running)
+
+    def handle(self, *args, **options):
+        self.running = set()
+        self.lock = threading.Lock()
+        threading.Thread(target=self.beat, daemon=True).start()
+        workers = [threading.Thread(target=self.work,
+                                    args=(options['poll_interval'], options['once']))
+                   for _ in range(options['concurrency'])]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for worker in workers:
+            while worker.is_alive():
+                worker.join(1)
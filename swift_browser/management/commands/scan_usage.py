@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from swift_browser import usage
+from swift_browser.listing import iter_listing
+from swift_browser.models import FolderUsage
+
+
+class Command(BaseCommand):
+    help = 'Compute the folder sizes shown in container listings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('containers', nargs='*',
+                            help='Containers to scan.')
+        parser.add_argument('--all', action='store_true',
+                            help='Scan every container in the account.')
+        parser.add_argument('--rescan', action='store_true',
+                            help='Rescan the containers scanned before.')
+
+    def handle(self, *args, **options):
+        containers = list(options['containers'])
+        if options['all']:
+            containers.extend(entry['name'] for entry in iter_listing())
+        if options['rescan']:
+            containers.extend(FolderUsage.objects.filter(prefix='')
+                              .values_list('container', flat=True))
+        if not containers:
+            raise CommandError('Name containers to scan, or use --all or --rescan.')
+
+        for container in sorted(set(containers)):
+            count = usage.scan(container, progress=lambda count: self.stdout.write(
+                '%s: %d objects' % (container, count), ending='\r'))
+            self.stdout.write('%s: scanned %d objects' % (container, count))
@@ -0,0 +1,133 @@
+"""
+Prometheus metrics for Swift calls and views.
+
+timed() wraps the swiftclient-style calls made through auth.call() and
+auth.swift_call(), recording their latency per operation, failures by HTTP
+status and the object data sent and received.  MetricsMiddleware records
+how long each view takes, rendering included.  register_stats() adds the
+stats() of a cache or pool as gauges.  /metrics exposes all of them.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to a directory shared by the
+workers: every worker then writes its values there and /metrics adds them
+up, whichever worker answers the scrape.  conf/metrics.py empties the
+directory when gunicorn starts.  Gauges from register_stats() are not
+written there: they describe the worker that answers the scrape.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter,
+                               Histogram, generate_latest, multiprocess)
+from prometheus_client.core import GaugeMetricFamily
+from swiftclient import client
+
+from . import tracing
+
+SWIFT_LATENCY = Histogram('swift_request_duration_seconds',
+                          'Latency of Swift calls', ['operation'])
+SWIFT_ERRORS = Counter('swift_request_errors',
+                       'Failed Swift calls by HTTP status', ['operation', 'status'])
+SWIFT_BYTES = Counter('swift_bytes',
+                      'Object data sent to and received from Swift', ['operation', 'direction'])
+VIEW_LATENCY = Histogram('django_view_duration_seconds',
+                         'Time spent in views, rendering included', ['view', 'method'])
+VIEW_RESPONSES = Counter('django_responses',
+                         'Responses by view and status', ['view', 'status'])
+
+_stats_collectors = []
+
+
+@contextmanager
+def observe(operation):
+    """ Time a Swift call and count it as failed if it raises. """
+    start = time.perf_counter()
+    try:
+        with tracing.span('swift.' + operation):
+            yield
+    except client.ClientException as exc:
+        SWIFT_ERRORS.labels(operation, str(exc.http_status or 'error')).inc()
+        raise
+    except Exception:
+        SWIFT_ERRORS.labels(operation, 'error').inc()
+        raise
+    finally:
+        SWIFT_LATENCY.labels(operation).observe(time.perf_counter() - start)
+
+
+def transferred(operation, direction, size):
+    if size:
+        SWIFT_BYTES.labels(operation, direction).inc(size)
+
+
+def payload_size(kwargs):
+    """ Bytes a call sends, when they can be told without reading the contents. """
+    if kwargs.get('content_length') is not None:
+        return kwargs['content_length']
+    contents = kwargs.get('contents')
+    if isinstance(contents, (bytes, str)):
+        return len(contents)
+    return getattr(contents, 'size', 0)
+
+
+def timed(func, *args, **kwargs):
+    """ Call a swiftclient.client style function, recording it under its name. """
+    operation = getattr(func, '__name__', 'unknown')
+    with observe(operation):
+        result = func(*args, **kwargs)
+    transferred(operation, 'sent', payload_size(kwargs))
+    if operation == 'get_object' and isinstance(result[1], bytes):
+        transferred(operation, 'received', len(result[1]))
+    return result
+
+
+class StatsCollector(object):
+    """ Reports each number in stats() as a gauge named prefix_<key>. """
+
+    def __init__(self, prefix, description, stats):
+        self.prefix = prefix
+        self.description = description
+        self.stats = stats
+
+    def collect(self):
+        for key, value in sorted(self.stats().items()):
+            yield GaugeMetricFamily('%s_%s' % (self.prefix, key),
+                                    '%s: %s' % (self.description, key.replace('_', ' ')),
+                                    value=value)
+
+
+def register_stats(prefix, description, stats):
+    collector = StatsCollector(prefix, description, stats)
+    _stats_collectors.append(collector)
+    REGISTRY.register(collector)
+
+
+def registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    collected = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collected)
+    for collector in _stats_collectors:
+        collected.register(collector)
+    return collected
+
+
+def render():
+    """ Return the metrics of every worker in the text exposition format, and its content type. """
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware(object):
+    """ Records the time taken by each view, labelled with its URL name. """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match is not None and match.url_name else 'unresolved'
+        VIEW_LATENCY.labels(view, request.method).observe(time.perf_counter() - start)
+        VIEW_RESPONSES.labels(view, str(response.status_code)).inc()
+        return response
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 08:52
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swift_browser', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexedContainer',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=256, unique=True)),
+                ('marker', models.CharField(blank=True, max_length=1024)),
+                ('complete', models.BooleanField(default=False)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IndexedObject',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=1024)),
+                ('reversed_name', models.CharField(max_length=1024)),
+                ('bytes', models.BigIntegerField(default=0)),
+                ('content_type', models.CharField(blank=True, max_length=256)),
+                ('last_modified', models.DateTimeField(blank=True, null=True)),
+                ('container', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='indexed_objects', to='swift_browser.IndexedContainer')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='indexedobject',
+            unique_together=set([('container', 'name')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='indexedobject',
+            index_together=set([('container', 'reversed_name'), ('container', 'bytes'), ('container', 'last_modified')]),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 08:54
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swift_browser', '0003_job_move'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FolderUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('container', models.CharField(max_length=256)),
+                ('prefix', models.CharField(max_length=1024)),
+                ('bytes', models.BigIntegerField(default=0)),
+                ('count', models.BigIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('delete_container', 'Delete container'), ('delete_folder', 'Delete folder'), ('upload', 'Upload'), ('move', 'Move'), ('scan_usage', 'Compute folder sizes')], max_length=32),
+        ),
+        migrations.AlterUniqueTogether(
+            name='folderusage',
+            unique_together=set([('container', 'prefix')]),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 09:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swift_browser', '0004_folder_usage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('delete_container', 'Delete container'), ('delete_folder', 'Delete folder'), ('upload', 'Upload'), ('bulk_upload', 'Bulk upload'), ('move', 'Move'), ('scan_usage', 'Compute folder sizes')], max_length=32),
+        ),
+    ]
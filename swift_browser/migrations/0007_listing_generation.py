@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 09:34
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swift_browser', '0006_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingGeneration',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(max_length=32)),
+                ('container', models.CharField(blank=True, max_length=256)),
+                ('generation', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='listinggeneration',
+            unique_together=set([('account', 'container')]),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Indexes PostgreSQL needs for the LIKE queries of search.py.
+
+Outside the C locale, a plain btree index cannot serve `name LIKE 'abc%'`,
+so the prefix and suffix filters of a search get indexes with
+varchar_pattern_ops.  Substring searches (`UPPER(name) LIKE UPPER('%abc%')`)
+get a trigram index when the pg_trgm extension can be installed; without it
+they keep scanning the container's rows.  Other databases are left alone.
+"""
+from __future__ import unicode_literals
+
+import logging
+
+from django.db import DatabaseError, migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+PATTERN_INDEXES = [
+    'CREATE INDEX swift_browser_indexedobject_name_like '
+    'ON swift_browser_indexedobject (container_id, name varchar_pattern_ops)',
+    'CREATE INDEX swift_browser_indexedobject_reversed_name_like '
+    'ON swift_browser_indexedobject (container_id, reversed_name varchar_pattern_ops)',
+]
+
+TRIGRAM_INDEX = ('CREATE INDEX swift_browser_indexedobject_name_trgm '
+                 'ON swift_browser_indexedobject USING gin (UPPER(name::text) gin_trgm_ops)')
+
+INDEX_NAMES = [
+    'swift_browser_indexedobject_name_like',
+    'swift_browser_indexedobject_reversed_name_like',
+    'swift_browser_indexedobject_name_trgm',
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in PATTERN_INDEXES:
+        schema_editor.execute(sql)
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            schema_editor.execute(TRIGRAM_INDEX)
+    except DatabaseError as exc:
+        logger.warning('No trigram index for substring searches: %s' % exc)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in INDEX_NAMES:
+        schema_editor.execute('DROP INDEX IF EXISTS %s' % name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swift_browser', '0007_listing_generation'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -1,3 +1,146 @@
+import json
+
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class Job(models.Model):
+    """ A long-running Swift operation executed by the run_jobs worker. """
+
+    DELETE_CONTAINER = 'delete_container'
+    DELETE_FOLDER = 'delete_folder'
+    UPLOAD = 'upload'
+    BULK_UPLOAD = 'bulk_upload'
+    MOVE = 'move'
+    SCAN_USAGE = 'scan_usage'
+    KIND_CHOICES = (
+        (DELETE_CONTAINER, 'Delete container'),
+        (DELETE_FOLDER, 'Delete folder'),
+        (UPLOAD, 'Upload'),
+        (BULK_UPLOAD, 'Bulk upload'),
+        (MOVE, 'Move'),
+        (SCAN_USAGE, 'Compute folder sizes'),
+    )
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                             related_name='swift_jobs')
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    arguments = models.TextField(default='{}')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES,
+                              default=QUEUED, db_index=True)
+    done = models.BigIntegerField(default=0)
+    total = models.BigIntegerField(null=True, blank=True)
+    message = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    # Updated by the worker while the job runs, see jobs.requeue_stale()
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Host holding the job's spooled files, '' if any worker can run it
+    node = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ['-created']
+
+    def __str__(self):
+        return '%s %s (%s)' % (self.get_kind_display(), self.arguments, self.status)
+
+    def get_arguments(self):
+        return json.loads(self.arguments)
+
+    def as_dict(self):
+        return {
+            'id': self.pk,
+            'kind': self.kind,
+            'arguments': self.get_arguments(),
+            'status': self.status,
+            'done': self.done,
+            'total': self.total,
+            'message': self.message,
+            'created': self.created.isoformat() if self.created else None,
+            'started': self.started.isoformat() if self.started else None,
+            'finished': self.finished.isoformat() if self.finished else None,
+        }
+
+
+class IndexedContainer(models.Model):
+    """ A container whose object names are kept in IndexedObject for searching. """
+
+    name = models.CharField(max_length=256, unique=True)
+    # Last name indexed by an unfinished index_containers run
+    marker = models.CharField(max_length=1024, blank=True)
+    complete = models.BooleanField(default=False)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class IndexedObject(models.Model):
+    """ One object of an indexed container.
+
+    reversed_name lets suffix searches such as '*.jpg' use an index. """
+
+    container = models.ForeignKey(IndexedContainer, on_delete=models.CASCADE,
+                                  related_name='indexed_objects')
+    name = models.CharField(max_length=1024)
+    reversed_name = models.CharField(max_length=1024)
+    bytes = models.BigIntegerField(default=0)
+    content_type = models.CharField(max_length=256, blank=True)
+    last_modified = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = (('container', 'name'),)
+        index_together = (
+            ('container', 'reversed_name'),
+            ('container', 'bytes'),
+            ('container', 'last_modified'),
+        )
+
+    def __str__(self):
+        return self.name
+
+
+class FolderUsage(models.Model):
+    """ Bytes and objects under one prefix of a container ('' for all of it). """
+
+    container = models.CharField(max_length=256)
+    prefix = models.CharField(max_length=1024)
+    bytes = models.BigIntegerField(default=0)
+    count = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = (('container', 'prefix'),)
+
+    def __str__(self):
+        return '/%s/%s' % (self.container, self.prefix)
+
+
+class ListingGeneration(models.Model):
+    """ Generation of the cached listings of a container ('' for the account).
+
+    Every worker checks it before using a cached listing, see listing_cache. """
+
+    # md5 of the storage URL
+    account = models.CharField(max_length=32)
+    container = models.CharField(max_length=256, blank=True)
+    generation = models.BigIntegerField()
+
+    class Meta:
+        unique_together = (('account', 'container'),)
+
+    def __str__(self):
+        return '%s/%s: %s' % (self.account, self.container, self.generation)
@@ -0,0 +1,157 @@
+"""
+Moving and renaming objects and pseudofolders.
+
+Swift has no rename, so each object is copied server-side with COPY and the
+source is deleted once the copy succeeded.  A folder is moved by paging its
+listing with markers and moving the objects of each page through a bounded
+pool of threads; SWIFT_MOVE_RATE caps the number of Swift requests per
+second so a large move does not swamp the proxy.  SLO manifests are copied
+as manifests, so their segments stay where they are.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from swiftclient import client
+
+from .auth import call
+from .listing import iter_pages
+from .segments import is_manifest
+
+logger = logging.getLogger(__name__)
+
+
+def server_copy(url, token, container, name, destination, manifest=False, http_conn=None):
+    """ COPY an object to '/container/object'. Follows the calling convention
+    of the swiftclient.client functions; unlike client.copy_object it can copy
+    an SLO manifest itself rather than the object it describes. """
+    parsed, conn = http_conn
+    path = '%s/%s/%s' % (parsed.path, client.quote(container), client.quote(name))
+    if manifest:
+        path += '?multipart-manifest=get'
+    headers = {
+        'X-Auth-Token': token,
+        'Destination': client.quote(destination),
+    }
+    conn.request('COPY', path, '', headers)
+    resp = conn.getresponse()
+    body = resp.read()
+    if resp.status < 200 or resp.status >= 300:
+        raise client.ClientException.from_response(resp, 'Object COPY failed', body)
+
+
+class Throttle(object):
+    """ Spaces out calls from any number of threads to at most rate per second. """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class MoveReport(object):
+
+    def __init__(self):
+        self.moved = 0
+        self.bytes = 0
+        self.failed = []
+
+    def __str__(self):
+        return '%d moved, %d failed' % (self.moved, len(self.failed))
+
+
+class Mover(object):
+    """ Moves one object, or every object under a folder when source ends with '/'.
+
+    failed in the report lists (name, reason) pairs; an object whose copy
+    succeeded but whose delete did not exists under both names.  progress, if
+    given, is called with the report after every page. """
+
+    def __init__(self, container, source, dest_container, destination,
+                 concurrency=None, retries=None, rate=None, progress=None):
+        if source.endswith('/') and not destination.endswith('/'):
+            destination += '/'
+        if container == dest_container and destination == source:
+            # The COPY would succeed and the DELETE then remove the only copy
+            raise ValueError('%s is already there' % source)
+        if source.endswith('/') and container == dest_container and destination.startswith(source):
+            raise ValueError('Cannot move %s into itself' % source)
+        self.container = container
+        self.source = source
+        self.dest_container = dest_container
+        self.destination = destination
+        self.concurrency = concurrency or settings.SWIFT_MOVE_CONCURRENCY
+        self.retries = settings.SWIFT_MOVE_RETRIES if retries is None else retries
+        self.throttle = Throttle(settings.SWIFT_MOVE_RATE if rate is None else rate)
+        self.progress = progress
+        self.report = MoveReport()
+
+    def target(self, name):
+        return self.destination + name[len(self.source):]
+
+    def _attempt(self, step, name, func, *args, **kwargs):
+        """ Call func, retrying errors that are not the client's fault. """
+        for attempt in range(self.retries + 1):
+            self.throttle.wait()
+            try:
+                return call(func, self.container, name, *args, **kwargs)
+            except client.ClientException as exc:
+                if exc.http_status == 404 and step == 'Delete':
+                    return
+                if attempt == self.retries or (exc.http_status and exc.http_status < 500):
+                    raise
+                logger.warning('%s of %s/%s failed, retrying: %s' % (step, self.container, name, exc))
+                time.sleep(min(2 ** attempt, 30))
+
+    def _move_one(self, entry):
+        name = entry['name']
+        destination = '/%s/%s' % (self.dest_container, self.target(name))
+        try:
+            self._attempt('Copy', name, server_copy, destination, manifest=is_manifest(entry))
+        except client.ClientException as exc:
+            logger.warning('Copying %s/%s failed: %s' % (self.container, name, exc))
+            return entry, 'copy failed: %s' % exc
+        try:
+            self._attempt('Delete', name, client.delete_object)
+        except client.ClientException as exc:
+            logger.warning('Deleting %s/%s after copying failed: %s' % (self.container, name, exc))
+            return entry, 'delete failed: %s' % exc
+        return entry, None
+
+    def _record(self, outcomes):
+        for entry, error in outcomes:
+            if error is None:
+                self.report.moved += 1
+                self.report.bytes += entry.get('bytes', 0)
+            else:
+                self.report.failed.append((entry['name'], error))
+
+    def move(self):
+        if not self.source.endswith('/'):
+            headers = call(client.head_object, self.container, self.source)
+            entry = {'name': self.source, 'bytes': int(headers.get('content-length', 0))}
+            if 'x-static-large-object' in headers:
+                entry['slo_etag'] = headers.get('etag')
+            self._record([self._move_one(entry)])
+            return self.report
+
+        logger.info('Moving /%s/%s to /%s/%s' % (self.container, self.source,
+                                                  self.dest_container, self.destination))
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for page in iter_pages(self.container, prefix=self.source):
+                self._record(executor.map(self._move_one, page))
+                if self.progress:
+                    self.progress(self.report)
+        return self.report
@@ -0,0 +1,207 @@
+"""
+Per-process pool of keep-alive connections to the Swift proxy.
+
+swiftclient's HTTPConnection wraps a requests Session, so reusing one across
+requests keeps the underlying TCP/TLS connection open.  Connections are kept
+per storage URL, bounded in number and evicted once they have been idle for
+too long.  A connection whose socket the proxy closed in the meantime is
+dropped when it is taken from the pool rather than failing the next call.
+The pool's counters are exported through /metrics as swift_pool_*.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from django.conf import settings
+from swiftclient import client
+from urllib3.util.connection import is_connection_dropped
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(client.ClientException):
+    """ Raised when no connection became available within the wait timeout. """
+
+    def __init__(self, msg):
+        super().__init__(msg, http_status=503, http_reason='Service Unavailable')
+
+
+class ConnectionPool(object):
+    """ Thread-safe pool of (parsed url, HTTPConnection) tuples keyed by storage URL. """
+
+    def __init__(self, max_size=10, idle_timeout=60, wait_timeout=30, insecure=False):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self.insecure = insecure
+        self._cond = threading.Condition()
+        self._idle = {}
+        self._in_use = {}
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+        self.dropped = 0
+
+    def _connect(self, storage_url):
+        return (urlparse(storage_url),
+                client.HTTPConnection(storage_url, insecure=self.insecure))
+
+    def _close(self, http_conn):
+        try:
+            http_conn[1].request_session.close()
+        except Exception:
+            logger.exception('Error closing Swift connection')
+
+    def _is_dropped(self, http_conn):
+        """ Tell whether the proxy closed a socket kept alive by the connection's session. """
+        for adapter in http_conn[1].request_session.adapters.values():
+            poolmanager = getattr(adapter, 'poolmanager', None)
+            if poolmanager is None:
+                continue
+            for key in poolmanager.pools.keys():
+                queue = getattr(poolmanager.pools.get(key), 'pool', None)
+                for conn in list(queue.queue if queue is not None else ()):
+                    # A socket that is readable while no request is pending was closed
+                    if getattr(conn, 'sock', None) is not None and is_connection_dropped(conn):
+                        return True
+        return False
+
+    def _evict(self, storage_url, now):
+        """ Drop idle connections that have not been used for idle_timeout seconds. """
+        idle = self._idle.get(storage_url, [])
+        fresh = [(conn, used) for conn, used in idle if now - used < self.idle_timeout]
+        for conn, used in idle:
+            if now - used >= self.idle_timeout:
+                self.evictions += 1
+                self._close(conn)
+        self._idle[storage_url] = fresh
+        return fresh
+
+    def acquire(self, storage_url):
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        with self._cond:
+            while True:
+                idle = self._evict(storage_url, time.monotonic())
+                while idle:
+                    http_conn, _used = idle.pop()
+                    if self._is_dropped(http_conn):
+                        self.dropped += 1
+                        self._close(http_conn)
+                        continue
+                    self._in_use[storage_url] = self._in_use.get(storage_url, 0) + 1
+                    self.hits += 1
+                    return http_conn
+                if self._in_use.get(storage_url, 0) < self.max_size:
+                    self._in_use[storage_url] = self._in_use.get(storage_url, 0) + 1
+                    self.misses += 1
+                    break
+                if not waited:
+                    waited = True
+                    self.waits += 1
+                    logger.info('Swift connection pool exhausted for %s, waiting: %s'
+                                % (storage_url, self._stats()))
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout('No Swift connection available for %s' % storage_url)
+                self._cond.wait(remaining)
+
+        try:
+            return self._connect(storage_url)
+        except Exception:
+            with self._cond:
+                self._in_use[storage_url] -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, storage_url, http_conn, discard=False):
+        with self._cond:
+            self._in_use[storage_url] -= 1
+            if discard:
+                self._close(http_conn)
+            else:
+                self._idle.setdefault(storage_url, []).append((http_conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, storage_url):
+        """ Borrow a connection for the duration of a with block.
+
+        HTTP errors reported by Swift leave the connection usable; anything
+        else (socket errors, timeouts) discards it. """
+        http_conn = self.acquire(storage_url)
+        try:
+            yield http_conn
+        except client.ClientException as exc:
+            self.release(storage_url, http_conn, discard=not exc.http_status)
+            raise
+        except BaseException:
+            self.release(storage_url, http_conn, discard=True)
+            raise
+        else:
+            self.release(storage_url, http_conn)
+
+    def clear(self):
+        with self._cond:
+            for idle in self._idle.values():
+                for http_conn, _used in idle:
+                    self._close(http_conn)
+            self._idle = {}
+
+    def _stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'waits': self.waits,
+            'evictions': self.evictions,
+            'dropped': self.dropped,
+            'idle': sum(len(idle) for idle in self._idle.values()),
+            'in_use': sum(self._in_use.values()),
+        }
+
+    def stats(self):
+        """ Counters used to size the pool: a high waits count means it is too small. """
+        with self._cond:
+            return self._stats()
+
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+def _named_pool(name, max_size):
+    if name not in _pools:
+        with _pool_lock:
+            if name not in _pools:
+                _pools[name] = ConnectionPool(max_size=max_size,
+                                              idle_timeout=settings.SWIFT_POOL_IDLE_TIMEOUT,
+                                              wait_timeout=settings.SWIFT_POOL_WAIT_TIMEOUT,
+                                              insecure=settings.SWIFT_SSL_INSECURE)
+    return _pools[name]
+
+
+def get_pool():
+    return _named_pool('default', settings.SWIFT_POOL_SIZE)
+
+
+def get_download_pool():
+    """ Pool for streamed downloads, which keep their connection until the
+    browser has read the whole object, so slow clients cannot starve the
+    short calls made through get_pool(). """
+    return _named_pool('download', settings.SWIFT_DOWNLOAD_POOL_SIZE)
+
+
+def connection(storage_url):
+    """ Shortcut for get_pool().connection(storage_url). """
+    return get_pool().connection(storage_url)
+
+
+metrics.register_stats('swift_pool', 'Swift connection pool of this process',
+                       lambda: get_pool().stats())
+metrics.register_stats('swift_download_pool', 'Swift connection pool of the streamed downloads',
+                       lambda: get_download_pool().stats())
@@ -0,0 +1,141 @@
+"""
+Resumable uploads driven by the browser.
+
+The browser slices a file into chunks and PUTs them, in parallel and in any
+order, as Swift segments; completing the upload writes an SLO manifest.  The
+state of an upload lives in a signed token handed to the browser, so a chunk
+request costs no database access and streams its body straight to Swift.
+Which chunks Swift already holds is read back from the segments listing,
+which is what lets a browser resume after a failure.
+"""
+import logging
+import math
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from swiftclient import client
+
+from . import capabilities, tempurl
+from .auth import call, token_cache
+from .deletion import Deleter
+from .listing import iter_listing
+from .segments import put_manifest, segments_container
+
+logger = logging.getLogger(__name__)
+
+SALT = 'swift_browser.resumable'
+
+
+class InvalidUpload(Exception):
+    pass
+
+
+def start(user, container, name, size, content_type=''):
+    chunk_size = max(settings.SWIFT_RESUMABLE_CHUNK_SIZE,
+                     int(math.ceil(float(size) / capabilities.max_manifest_segments())))
+    state = {
+        'user': user.pk,
+        'container': container,
+        'name': name,
+        'size': size,
+        'content_type': content_type,
+        'chunk_size': chunk_size,
+        'id': uuid.uuid4().hex,
+    }
+    state['token'] = signing.dumps(state, salt=SALT)
+    return state
+
+
+def load(user, token):
+    try:
+        state = signing.loads(token, salt=SALT, max_age=settings.SWIFT_RESUMABLE_MAX_AGE)
+    except signing.BadSignature:
+        raise InvalidUpload('Invalid or expired upload')
+    if state['user'] != user.pk:
+        raise InvalidUpload('Invalid or expired upload')
+    state['token'] = token
+    return state
+
+
+def chunk_count(state):
+    return max(1, int(math.ceil(float(state['size']) / state['chunk_size'])))
+
+
+def chunk_length(state, index):
+    return min(state['chunk_size'], state['size'] - index * state['chunk_size'])
+
+
+def _prefix(state):
+    return '%s/resumable/%s/' % (state['name'], state['id'])
+
+
+def _chunk_name(state, index):
+    return '%s%08d' % (_prefix(state), index)
+
+
+def uploaded_chunks(state):
+    """ Return {index: listing entry} for the chunks Swift already holds. """
+    chunks = {}
+    prefix = _prefix(state)
+    for entry in iter_listing(segments_container(state['container']), prefix=prefix):
+        index = int(entry['name'][len(prefix):])
+        if entry['bytes'] == chunk_length(state, index):
+            chunks[index] = entry
+    return chunks
+
+
+def chunk_urls(state):
+    """ TempURLs the browser PUTs chunks to when SWIFT_DATA_PATH is 'tempurl'.
+
+    Swift cannot check their size; complete() ignores chunks of the wrong size. """
+    storage_url, _token = token_cache.get()
+    return [tempurl.sign(storage_url, segments_container(state['container']),
+                         _chunk_name(state, index), method='PUT')
+            for index in range(chunk_count(state))]
+
+
+def describe(state):
+    """ What the browser needs to (re)start sending chunks. """
+    description = {
+        'upload': state['token'],
+        'chunk_size': state['chunk_size'],
+        'chunks': chunk_count(state),
+        'uploaded': sorted(uploaded_chunks(state)),
+    }
+    if tempurl.enabled():
+        description['chunk_urls'] = chunk_urls(state)
+    return description
+
+
+def prepare(state):
+    call(client.put_container, segments_container(state['container']))
+
+
+def put_chunk(state, index, body, length, md5=None):
+    """ Stream one chunk (body is file-like) into its segment. """
+    if index < 0 or index >= chunk_count(state) or length != chunk_length(state, index):
+        raise InvalidUpload('Chunk %d has the wrong size' % index)
+    return call(client.put_object, segments_container(state['container']),
+                name=_chunk_name(state, index), contents=body,
+                content_length=length, etag=md5)
+
+
+def complete(state):
+    chunks = uploaded_chunks(state)
+    missing = [index for index in range(chunk_count(state)) if index not in chunks]
+    if missing:
+        raise InvalidUpload('Missing chunks: %s' % missing[:10])
+    manifest = [{
+        'path': '/%s/%s' % (segments_container(state['container']), chunks[index]['name']),
+        'etag': chunks[index]['hash'],
+        'size_bytes': chunks[index]['bytes'],
+    } for index in range(chunk_count(state))]
+    logger.info("Completing resumable upload of /%s/%s in %d chunks"
+                % (state['container'], state['name'], len(manifest)))
+    return call(put_manifest, state['container'], state['name'], manifest,
+                content_type=state['content_type'] or None)
+
+
+def abort(state):
+    return Deleter(segments_container(state['container']), prefix=_prefix(state)).delete_objects()
@@ -0,0 +1,195 @@
+"""
+Search over the object names of a container.
+
+Swift can only list by prefix, so the names, sizes and dates of the objects
+in selected containers are copied to IndexedObject.  `manage.py
+index_containers` builds the index by walking the listing page by page,
+committing the marker with every page so an interrupted run can resume,
+and the views keep it current through record_put() and record_delete().
+Containers that were never indexed are left alone by both.
+"""
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .listing import iter_pages
+from .models import IndexedContainer, IndexedObject
+from .segments import is_manifest
+
+logger = logging.getLogger(__name__)
+
+GLOB_CHARACTERS = '*?['
+REGEX_SPECIAL = '.^$*+?()[]{}|\\'
+
+
+def _last_modified(value):
+    last_modified = parse_datetime(value or '')
+    if last_modified is not None and timezone.is_naive(last_modified):
+        last_modified = timezone.make_aware(last_modified, timezone.utc)
+    return last_modified
+
+
+def _row(indexed, entry):
+    is_manifest(entry)
+    return IndexedObject(container=indexed,
+                         name=entry['name'],
+                         reversed_name=entry['name'][::-1],
+                         bytes=entry.get('bytes', 0),
+                         content_type=entry.get('content_type', ''),
+                         last_modified=_last_modified(entry.get('last_modified')))
+
+
+def build(container, resume=False, progress=None):
+    """ (Re)index a container; with resume, continue an interrupted run. """
+    indexed, _created = IndexedContainer.objects.get_or_create(name=container)
+    if not (resume and indexed.marker):
+        indexed.indexed_objects.all().delete()
+        indexed.marker = ''
+    indexed.complete = False
+    indexed.save()
+
+    count = 0
+    previous = indexed.marker
+    for page in iter_pages(container, marker=indexed.marker or None):
+        with transaction.atomic():
+            # The write paths may have recorded some of these names already
+            names = indexed.indexed_objects.filter(name__gt=previous, name__lte=page[-1]['name'])
+            names.delete()
+            IndexedObject.objects.bulk_create([_row(indexed, entry) for entry in page])
+            indexed.marker = previous = page[-1]['name']
+            indexed.save(update_fields=['marker', 'updated'])
+        count += len(page)
+        if progress:
+            progress(count)
+
+    indexed.marker = ''
+    indexed.complete = True
+    indexed.save()
+    logger.info("Indexed %d objects of container %s" % (count, container))
+    return count
+
+
+def record_put(container, name, size, content_type=''):
+    indexed = IndexedContainer.objects.filter(name=container).first()
+    if indexed is None:
+        return
+    IndexedObject.objects.update_or_create(container=indexed, name=name, defaults={
+        'reversed_name': name[::-1],
+        'bytes': size,
+        'content_type': content_type or '',
+        'last_modified': timezone.now(),
+    })
+
+
+def record_delete(container, name=None, prefix=None):
+    """ Forget one object, every object under prefix, or the whole container. """
+    if name is None and prefix is None:
+        IndexedContainer.objects.filter(name=container).delete()
+        return
+    objects = IndexedObject.objects.filter(container__name=container)
+    if name is not None:
+        objects = objects.filter(name=name)
+    else:
+        objects = objects.filter(name__startswith=prefix)
+    objects.delete()
+
+
+def record_move(container, source, dest_container, destination, failed=()):
+    """ Rename the index entries of objects moved by move.Mover. """
+    if source.endswith('/'):
+        objects = IndexedObject.objects.filter(container__name=container, name__startswith=source)
+    else:
+        objects = IndexedObject.objects.filter(container__name=container, name=source)
+    target = IndexedContainer.objects.filter(name=dest_container).first()
+    if target is None:
+        objects.exclude(name__in=failed).delete()
+        return
+    failed = set(failed)
+    with transaction.atomic():
+        for row in objects.iterator():
+            if row.name in failed:
+                continue
+            name = destination + row.name[len(source):]
+            IndexedObject.objects.filter(container=target, name=name).delete()
+            row.container = target
+            row.name = name
+            row.reversed_name = name[::-1]
+            row.save()
+
+
+def glob_to_regex(pattern):
+    """ Translate a glob into a regex understood by both SQLite and PostgreSQL. """
+    regex = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '*':
+            regex.append('.*')
+        elif char == '?':
+            regex.append('.')
+        elif char == '[' and pattern.find(']', i + 2) > 0:
+            end = pattern.find(']', i + 2)
+            contents = pattern[i + 1:end].replace('\\', '\\\\')
+            if contents.startswith('!'):
+                contents = '^' + contents[1:]
+            regex.append('[%s]' % contents)
+            i = end
+        elif char in REGEX_SPECIAL:
+            regex.append('\\' + char)
+        else:
+            regex.append(char)
+        i += 1
+    return '^%s$' % ''.join(regex)
+
+
+def literal_prefix(pattern):
+    """ The part of a glob before its first wildcard, read as glob_to_regex() does. """
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char in '*?' or (char == '[' and pattern.find(']', i + 2) > 0):
+            break
+        i += 1
+    return pattern[:i]
+
+
+def _match_name(objects, prefix, query):
+    if not any(char in query for char in GLOB_CHARACTERS):
+        return objects.filter(name__startswith=prefix, name__icontains=query)
+
+    pattern = prefix + query
+    literal = literal_prefix(pattern)
+    if literal == pattern:
+        # Only an unclosed '[', which matches itself
+        return objects.filter(name=pattern)
+    if literal:
+        # A range of the (container, name) index, so that the regex is only
+        # run on the names that can match
+        objects = objects.filter(name__startswith=literal)
+    tail = pattern[len(literal) + 1:] if pattern[len(literal)] == '*' else None
+    if tail and not any(char in tail for char in GLOB_CHARACTERS):
+        # '<prefix>*<suffix>': the suffix is an indexed prefix of reversed_name
+        objects = objects.filter(reversed_name__startswith=tail[::-1])
+    return objects.filter(name__regex=glob_to_regex(pattern))
+
+
+def search(container, prefix='', query='', min_size=None, max_size=None,
+           modified_after=None, modified_before=None, limit=1000):
+    """ Indexed objects under prefix whose name contains query or, when it has
+    wildcards, matches it as a glob relative to prefix. """
+    objects = IndexedObject.objects.filter(container__name=container)
+    if query:
+        objects = _match_name(objects, prefix, query)
+    elif prefix:
+        objects = objects.filter(name__startswith=prefix)
+    if min_size is not None:
+        objects = objects.filter(bytes__gte=min_size)
+    if max_size is not None:
+        objects = objects.filter(bytes__lte=max_size)
+    if modified_after is not None:
+        objects = objects.filter(last_modified__gte=modified_after)
+    if modified_before is not None:
+        objects = objects.filter(last_modified__lt=modified_before)
+    return list(objects.order_by('name')[:limit])
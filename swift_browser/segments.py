@@ -0,0 +1,140 @@
+"""
+Static Large Object uploads.
+
+Files larger than segment_threshold() are split into segments that are
+PUT concurrently into '<container>_segments', then tied together by an SLO
+manifest stored under the requested name.  Segment names depend only on the
+object name, file size, segment size and an upload id, so retrying an upload
+with the same id skips the segments Swift already holds.  upload_id() gives
+every attempt at storing the same file the same id.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from swiftclient import client
+
+from . import capabilities
+from .auth import call
+from .listing import iter_listing
+
+logger = logging.getLogger(__name__)
+
+
+def segments_container(container):
+    return '%s_segments' % container
+
+
+def segment_threshold():
+    """ Size above which files are segmented: SWIFT_SEGMENT_THRESHOLD, or less
+    when the cluster's max_file_size is lower. """
+    return min(settings.SWIFT_SEGMENT_THRESHOLD, capabilities.max_file_size())
+
+
+def upload_id(container, name, size):
+    """ Id of the segments of an upload, stable across retries of the same file. """
+    return hashlib.md5(('%s/%s/%d' % (container, name, size)).encode('utf-8')).hexdigest()[:16]
+
+
+def put_manifest(url, token, container, name, segments, content_type=None, http_conn=None):
+    """ Write an SLO manifest. Follows the calling convention of swiftclient.client. """
+    return client.put_object(url, token, container, name=name,
+                             contents=json.dumps(segments),
+                             content_type=content_type,
+                             query_string='multipart-manifest=put',
+                             http_conn=http_conn)
+
+
+def is_manifest(entry):
+    """ Tell whether a listing entry is an SLO manifest, fixing up its size.
+
+    Newer Swift reports the total in 'bytes' and flags manifests with
+    'slo_etag'; older releases append ';swift_bytes=<total>' to content_type. """
+    content_type = entry.get('content_type', '')
+    if ';swift_bytes=' in content_type:
+        content_type, _sep, total = content_type.partition(';swift_bytes=')
+        entry['content_type'] = content_type
+        entry['bytes'] = int(total)
+        return True
+    return 'slo_etag' in entry
+
+
+class SegmentedUpload(object):
+
+    def __init__(self, container, name, path, upload_id, content_type=None, progress=None):
+        self.container = container
+        self.name = name
+        self.path = path
+        self.upload_id = upload_id
+        self.content_type = content_type
+        self.progress = progress
+        self.size = os.path.getsize(path)
+        self.segment_size = max(settings.SWIFT_SEGMENT_SIZE,
+                                int(math.ceil(float(self.size) / capabilities.max_manifest_segments())))
+        self.prefix = '%s/slo/%s/%d/%d/' % (name, upload_id, self.size, self.segment_size)
+        self.uploaded = 0
+        self._lock = threading.Lock()
+
+    def _segments(self):
+        count = max(1, int(math.ceil(float(self.size) / self.segment_size)))
+        for index in range(count):
+            offset = index * self.segment_size
+            yield index, offset, min(self.segment_size, self.size - offset)
+
+    def _md5(self, offset, length):
+        md5 = hashlib.md5()
+        with open(self.path, 'rb') as segment:
+            segment.seek(offset)
+            remaining = length
+            while remaining:
+                chunk = segment.read(min(remaining, 1024 * 1024))
+                md5.update(chunk)
+                remaining -= len(chunk)
+        return md5.hexdigest()
+
+    def _put_segment(self, segment, existing):
+        index, offset, length = segment
+        name = '%s%08d' % (self.prefix, index)
+        etag = self._md5(offset, length)
+        if existing.get(name) == (length, etag):
+            logger.info("Segment %s already uploaded" % name)
+        else:
+            for attempt in range(settings.SWIFT_SEGMENT_RETRIES + 1):
+                try:
+                    with open(self.path, 'rb') as contents:
+                        contents.seek(offset)
+                        call(client.put_object, segments_container(self.container),
+                             name=name, contents=contents, content_length=length, etag=etag)
+                    break
+                except client.ClientException as exc:
+                    if attempt == settings.SWIFT_SEGMENT_RETRIES:
+                        raise
+                    logger.warning("Segment %s failed, retrying: %s" % (name, exc))
+        with self._lock:
+            self.uploaded += length
+            if self.progress:
+                self.progress(self.uploaded, self.size)
+        return {
+            'path': '/%s/%s' % (segments_container(self.container), name),
+            'etag': etag,
+            'size_bytes': length,
+        }
+
+    def run(self):
+        call(client.put_container, segments_container(self.container))
+        existing = {}
+        for entry in iter_listing(segments_container(self.container), prefix=self.prefix):
+            existing[entry['name']] = (entry['bytes'], entry['hash'])
+
+        logger.info("Uploading /%s/%s as %d byte segments"
+                    % (self.container, self.name, self.segment_size))
+        with ThreadPoolExecutor(max_workers=settings.SWIFT_SEGMENT_CONCURRENCY) as executor:
+            manifest = list(executor.map(lambda segment: self._put_segment(segment, existing),
+                                         self._segments()))
+        return call(put_manifest, self.container, self.name, manifest,
+                    content_type=self.content_type)
@@ -0,0 +1,57 @@
+"""
+Session engines that keep the copy of the Swift token encrypted.
+
+Each module in this package is a SESSION_ENGINE wrapping the Django engine
+of the same name; project/settings.py picks one through SWIFT_SESSION_ENGINE.
+'cache' never touches the database, 'cached_db' only writes to it and
+'signed_cookies' keeps the whole session in the browser, which is why the
+token is encrypted with a key derived from SECRET_KEY wherever it is stored.
+"""
+import base64
+import hashlib
+
+from cryptography.fernet import Fernet, InvalidToken
+from django.conf import settings
+
+ENCRYPTED_KEYS = ('auth_token',)
+
+_fernet = None
+
+
+def fernet():
+    global _fernet
+    if _fernet is None:
+        digest = hashlib.sha256(('swift_browser.sessions' + settings.SECRET_KEY).encode()).digest()
+        _fernet = Fernet(base64.urlsafe_b64encode(digest))
+    return _fernet
+
+
+class EncryptedCredentials(object):
+    """ Encrypts the values of ENCRYPTED_KEYS on the way into the session. """
+
+    def __setitem__(self, key, value):
+        if key in ENCRYPTED_KEYS and value is not None:
+            value = fernet().encrypt(value.encode()).decode('ascii')
+        super().__setitem__(key, value)
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if key in ENCRYPTED_KEYS and value is not None:
+            value = self._decrypt(value)
+            if value is None:
+                raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def _decrypt(self, value):
+        # Values written before a SECRET_KEY change, or in plain text before
+        # this engine, read as missing and are replaced on the next Swift call
+        try:
+            return fernet().decrypt(value.encode('ascii')).decode()
+        except (InvalidToken, UnicodeEncodeError):
+            return None
@@ -0,0 +1,7 @@
+from django.contrib.sessions.backends import cache
+
+from . import EncryptedCredentials
+
+
+class SessionStore(EncryptedCredentials, cache.SessionStore):
+    pass
@@ -0,0 +1,7 @@
+from django.contrib.sessions.backends import cached_db
+
+from . import EncryptedCredentials
+
+
+class SessionStore(EncryptedCredentials, cached_db.SessionStore):
+    pass
@@ -0,0 +1,7 @@
+from django.contrib.sessions.backends import db
+
+from . import EncryptedCredentials
+
+
+class SessionStore(EncryptedCredentials, db.SessionStore):
+    pass
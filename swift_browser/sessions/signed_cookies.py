@@ -0,0 +1,7 @@
+from django.contrib.sessions.backends import signed_cookies
+
+from . import EncryptedCredentials
+
+
+class SessionStore(EncryptedCredentials, signed_cookies.SessionStore):
+    pass
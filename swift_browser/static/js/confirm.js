@@ -0,0 +1,14 @@
+/* Ask before following a link or submitting a form that has a data-confirm
+ * attribute.  The question is read as text, so names in it need no escaping
+ * beyond the HTML attribute's. */
+$(document).on('click', 'a[data-confirm]', function (event) {
+    if (!window.confirm($(this).attr('data-confirm'))) {
+        event.preventDefault();
+    }
+});
+
+$(document).on('submit', 'form[data-confirm]', function (event) {
+    if (!window.confirm($(this).attr('data-confirm'))) {
+        event.preventDefault();
+    }
+});
@@ -0,0 +1,152 @@
+/*
+ * Chunked, resumable uploads through the upload_api/ endpoints.  When the
+ * server hands out TempURLs for the chunks they are PUT directly to Swift.
+ *
+ * The upload token is kept in localStorage, keyed by destination and file,
+ * so choosing the same file again after a failure only sends the chunks
+ * Swift does not have yet.
+ */
+(function ($) {
+    'use strict';
+
+    var RETRIES = 5;
+
+    function csrfHeaders() {
+        return {'X-CSRFToken': $('input[name=csrfmiddlewaretoken]').val()};
+    }
+
+    function storageKey(fields, file) {
+        return 'resumable:' + [fields.container, fields.subdir, fields.object_name,
+                               file.size, file.lastModified].join(':');
+    }
+
+    function remember(key, token) {
+        try {
+            if (token) {
+                window.localStorage.setItem(key, token);
+            } else {
+                window.localStorage.removeItem(key);
+            }
+        } catch (e) {
+            // Private browsing: uploads still work, they just cannot resume
+        }
+    }
+
+    function recall(key) {
+        try {
+            return window.localStorage.getItem(key);
+        } catch (e) {
+            return null;
+        }
+    }
+
+    window.resumableUpload = function (urls, fields, file, parallel, onProgress) {
+        var deferred = $.Deferred();
+        var key = storageKey(fields, file);
+        var state = null;
+        var failed = false;
+
+        function init(token) {
+            var data = token ? {upload: token} : $.extend({
+                size: file.size,
+                content_type: file.type
+            }, fields);
+            return $.ajax({url: urls.init, method: 'POST', data: data, headers: csrfHeaders()})
+                .then(null, function (xhr) {
+                    // A stale or expired token: start over
+                    return token ? init(null) : $.Deferred().reject(xhr);
+                });
+        }
+
+        function fail(xhr) {
+            if (!failed) {
+                failed = true;
+                deferred.reject(xhr);
+            }
+        }
+
+        function complete() {
+            $.ajax({url: urls.complete, method: 'POST', data: {upload: state.upload},
+                    headers: csrfHeaders()})
+                .done(function (result) {
+                    remember(key, null);
+                    deferred.resolve(result);
+                })
+                .fail(fail);
+        }
+
+        init(recall(key)).done(function (result) {
+            var pending = [];
+            var active = 0;
+            var done = result.uploaded.length;
+            var i;
+
+            state = result;
+            remember(key, state.upload);
+            for (i = 0; i < state.chunks; i++) {
+                if (state.uploaded.indexOf(i) < 0) {
+                    pending.push(i);
+                }
+            }
+
+            function send(index, attempt) {
+                var start = index * state.chunk_size;
+                // With TempURLs chunks go straight to Swift, which must not
+                // see the CSRF token
+                var direct = !!state.chunk_urls;
+                $.ajax({
+                    url: direct ? state.chunk_urls[index] :
+                        urls.chunk + '?' + $.param({upload: state.upload, index: index}),
+                    method: 'PUT',
+                    data: file.slice(start, start + state.chunk_size),
+                    processData: false,
+                    contentType: 'application/octet-stream',
+                    headers: direct ? {} : csrfHeaders()
+                }).done(function () {
+                    active--;
+                    done++;
+                    onProgress(done, state.chunks);
+                    next();
+                }).fail(function (xhr) {
+                    if (attempt < RETRIES && xhr.status !== 400) {
+                        setTimeout(function () { send(index, attempt + 1); },
+                                   1000 * Math.pow(2, attempt));
+                    } else {
+                        fail(xhr);
+                    }
+                });
+            }
+
+            function next() {
+                if (failed) {
+                    return;
+                }
+                if (!pending.length) {
+                    if (!active) {
+                        complete();
+                    }
+                    return;
+                }
+                active++;
+                send(pending.shift(), 0);
+            }
+
+            onProgress(done, state.chunks);
+            for (i = 0; i < parallel; i++) {
+                next();
+            }
+        }).fail(fail);
+
+        var promise = deferred.promise();
+        promise.abort = function () {
+            failed = true;
+            remember(key, null);
+            if (state) {
+                $.ajax({url: urls.abort, method: 'POST', data: {upload: state.upload},
+                        headers: csrfHeaders()});
+            }
+            deferred.reject();
+        };
+        return promise;
+    };
+})(jQuery);
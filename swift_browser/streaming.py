@@ -0,0 +1,108 @@
+"""
+Streaming object downloads.
+
+The object body is read from Swift SWIFT_DOWNLOAD_CHUNK_SIZE bytes at a time
+while it is written to the browser, so memory use does not depend on the
+object size.  The pooled connection stays borrowed until the body has been
+consumed; a download the browser breaks off discards the connection instead
+of returning it to the pool with unread data on it.  Downloads have a pool of
+their own, SWIFT_DOWNLOAD_POOL_SIZE connections per storage URL, so that
+slow browsers do not hold up the other Swift calls.
+"""
+import logging
+
+from django.conf import settings
+from swiftclient import client
+
+from . import metrics, pool
+from .auth import credentials
+
+logger = logging.getLogger(__name__)
+
+# Request headers passed on to Swift, as (META key, header name)
+REQUEST_HEADERS = (
+    ('HTTP_RANGE', 'Range'),
+    ('HTTP_IF_RANGE', 'If-Range'),
+    ('HTTP_IF_MATCH', 'If-Match'),
+    ('HTTP_IF_NONE_MATCH', 'If-None-Match'),
+    ('HTTP_IF_MODIFIED_SINCE', 'If-Modified-Since'),
+)
+
+# Swift response headers passed on to the browser
+RESPONSE_HEADERS = (
+    ('content-length', 'Content-Length'),
+    ('content-range', 'Content-Range'),
+    ('accept-ranges', 'Accept-Ranges'),
+    ('etag', 'ETag'),
+    ('last-modified', 'Last-Modified'),
+    ('content-encoding', 'Content-Encoding'),
+)
+
+
+def request_headers(request):
+    return dict((name, request.META[key]) for key, name in REQUEST_HEADERS if key in request.META)
+
+
+def copy_headers(response, swift_headers):
+    """ Set the headers the browser needs to cache and resume a download. """
+    for key, name in RESPONSE_HEADERS:
+        if swift_headers.get(key):
+            response[name] = swift_headers[key]
+    return response
+
+
+class PooledBody(object):
+    """ Iterable object body that gives its connection back to the pool once closed. """
+
+    def __init__(self, storage_url, http_conn, body):
+        self.storage_url = storage_url
+        self.http_conn = http_conn
+        self.body = body
+        self.consumed = False
+
+    def __iter__(self):
+        for chunk in self.body:
+            metrics.transferred('get_object', 'received', len(chunk))
+            yield chunk
+        self.consumed = True
+
+    def close(self):
+        if self.http_conn is not None:
+            pool.get_download_pool().release(self.storage_url, self.http_conn, discard=not self.consumed)
+            self.http_conn = None
+
+
+def _get_object(storage_url, auth_token, container, name, headers):
+    http_conn = pool.get_download_pool().acquire(storage_url)
+    response = {}
+    try:
+        with metrics.observe('get_object'):
+            swift_headers, body = client.get_object(storage_url, auth_token, container, name,
+                                                    resp_chunk_size=settings.SWIFT_DOWNLOAD_CHUNK_SIZE,
+                                                    headers=headers,
+                                                    response_dict=response,
+                                                    http_conn=http_conn)
+    except client.ClientException as exc:
+        pool.get_download_pool().release(storage_url, http_conn, discard=not exc.http_status)
+        raise
+    except BaseException:
+        pool.get_download_pool().release(storage_url, http_conn, discard=True)
+        raise
+    return response['status'], swift_headers, PooledBody(storage_url, http_conn, body)
+
+
+def open_object(request, container, name, headers=None):
+    """ Start a GET of an object and return (status, headers, body).
+
+    body must be closed, which StreamingHttpResponse does once the response
+    is finished.  Conditional and range requests that Swift does not answer
+    with 200 or 206 raise ClientException like any other failure. """
+    storage_url, auth_token = credentials(request)
+    try:
+        return _get_object(storage_url, auth_token, container, name, headers)
+    except client.ClientException as exc:
+        if exc.http_status != 401:
+            raise
+    logger.info('Swift rejected auth token, re-authenticating')
+    storage_url, auth_token = credentials(request, stale_token=auth_token)
+    return _get_object(storage_url, auth_token, container, name, headers)
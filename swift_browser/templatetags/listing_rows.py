@@ -0,0 +1,130 @@
+"""
+Row markup of container.html, compiled to format strings.
+
+A listing page holds up to SWIFT_LISTING_MAX_PAGE_SIZE rows and rendering
+each one through the template engine costs far more than filling in a
+format string, so {% listing_rows %} produces them here.  Keep the markup
+in step with the rest of container.html.
+"""
+from django import template
+from django.template.base import render_value_in_context
+from django.template.defaultfilters import filesizeformat
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+FOLDER_ROW = '''
+            <tr>
+                <td class="hidden-phone"><span class="glyphicon glyphicon-folder-open"></span></td>
+                <td>
+                    <strong>
+                        <a href="{container_url}?container={container}&amp;subdir={quoted}">{display_name}</a>
+                    </strong>
+                </td>
+                <td class="hidden-phone"></td>
+                <td class="hidden-phone">{size}</td>
+                <td>
+                    <div class="btn-group pull-right">
+                        <button type="button" class="btn btn-default dropdown-toggle" data-toggle="dropdown" aria-haspopup="true" aria-expanded="false">
+                            Action <span class="caret"></span>
+                        </button>
+                        <ul class="dropdown-menu">
+                            <li>
+                                <a href="{move_url}?{query}&amp;source={quoted}">Move/Rename</a>
+                            </li>
+                            <li>
+                                <form method="POST" action="{delete_folder_url}" data-confirm="Delete {display_name} and everything in it?">
+                                    <input type="hidden" name="csrfmiddlewaretoken" value="{csrf_token}">
+                                    <input type="hidden" name="container" value="{container_name}">
+                                    <input type="hidden" name="subdir" value="{subdir}">
+                                    <input type="hidden" name="folder" value="{folder}">
+                                    <button type="submit" class="btn btn-link">Delete</button>
+                                </form>
+                            </li>
+                        </ul>
+                    </div>
+                </td>
+            </tr>'''
+
+MANIFEST_INPUT = '\n                                    <input type="hidden" name="manifest" value="1">'
+
+FOLDER_SIZE = '<span title="{count} objects">{bytes}</span>'
+
+OBJECT_ROW = '''
+            <tr>
+                <td class="hidden-phone"><i class="icon-file"></i></td>
+                <td><a href="{url}">{display_name}</a></td>
+                <td class="hidden-phone">{last_modified}</td>
+                <td class="hidden-phone">{bytes}</td>
+                <td>
+                    <div class="btn-group pull-right">
+                        <button type="button" class="btn btn-default dropdown-toggle" data-toggle="dropdown" aria-haspopup="true" aria-expanded="false">
+                            Action <span class="caret"></span>
+                        </button>
+                        <ul class="dropdown-menu">
+                            <li>
+                                <a href="{url}">Download</a>
+                            </li>
+                            <li>
+                                <a href="{move_url}?{query}&amp;source={quoted}">Move/Rename</a>
+                            </li>
+                            <li>
+                                <form method="POST" action="{delete_object_url}" data-confirm="Delete {display_name}?">
+                                    <input type="hidden" name="csrfmiddlewaretoken" value="{csrf_token}">
+                                    <input type="hidden" name="container" value="{container_name}">
+                                    <input type="hidden" name="subdir" value="{subdir}">
+                                    <input type="hidden" name="object_name" value="{name}">{manifest}
+                                    <button type="submit" class="btn btn-link">Delete</button>
+                                </form>
+                            </li>
+                        </ul>
+                    </div>
+                </td>
+            </tr>'''
+
+
+@register.simple_tag(takes_context=True)
+def listing_rows(context, subdirs, folder_objects):
+    """ Render the folder and object rows of a container listing. """
+    query = escape(context['query'])
+    container_url = reverse('container')
+    move_url = reverse('move')
+    delete_folder_url = reverse('delete_folder')
+    delete_object_url = reverse('delete_object')
+    csrf_token = escape(context.get('csrf_token', ''))
+    container_name = escape(context['container'])
+    subdir = escape(context['upload_subdir'])
+    html = []
+    for row in subdirs:
+        size = ''
+        if row.bytes is not None:
+            size = FOLDER_SIZE.format(count=row.count, bytes=filesizeformat(row.bytes))
+        html.append(FOLDER_ROW.format(container_url=container_url,
+                                      container=context['quoted_container'],
+                                      quoted=row.quoted,
+                                      display_name=escape(row.display_name),
+                                      size=size,
+                                      move_url=move_url,
+                                      delete_folder_url=delete_folder_url,
+                                      csrf_token=csrf_token,
+                                      container_name=container_name,
+                                      subdir=subdir,
+                                      folder=escape(row.subdir),
+                                      query=query))
+    for row in folder_objects:
+        html.append(OBJECT_ROW.format(url=escape(row.url),
+                                      display_name=escape(row.display_name),
+                                      last_modified=render_value_in_context(row.last_modified, context),
+                                      bytes=row.bytes,
+                                      move_url=move_url,
+                                      delete_object_url=delete_object_url,
+                                      csrf_token=csrf_token,
+                                      container_name=container_name,
+                                      subdir=subdir,
+                                      name=escape(row.name),
+                                      query=query,
+                                      quoted=row.quoted,
+                                      manifest=MANIFEST_INPUT if row.manifest else ''))
+    return mark_safe(''.join(html))
@@ -0,0 +1,96 @@
+"""
+Swift TempURLs, so browsers can GET and PUT object data directly.
+
+With SWIFT_DATA_PATH = 'tempurl' the container listing links to signed GET
+URLs and uploads PUT to a signed URL, so object data never passes through
+the Django workers.  URLs are signed with the account's
+X-Account-Meta-Temp-URL-Key, which is read once and cached for
+SWIFT_TEMPURL_KEY_TTL seconds; an account without a key is given one.
+Swift checks the signature against the unquoted object path, so names are
+only quoted when the URL is built.  A signature Swift rejects means the key
+changed: pass refresh=True to sign() to read it again.
+"""
+import hashlib
+import hmac
+import logging
+import threading
+import time
+import uuid
+from urllib.parse import quote, unquote, urlencode, urlparse
+
+from django.conf import settings
+from swiftclient import client
+
+from . import capabilities
+from .auth import call
+
+logger = logging.getLogger(__name__)
+
+DIGESTS = {
+    'sha1': hashlib.sha1,
+    'sha256': hashlib.sha256,
+}
+
+
+def enabled():
+    """ Whether TempURLs are configured, unless /info shows the middleware is missing. """
+    if settings.SWIFT_DATA_PATH != 'tempurl':
+        return False
+    return not capabilities.get_capabilities() or bool(capabilities.tempurl_methods())
+
+
+class KeyCache(object):
+    """ Cache of the account's TempURL key keyed by storage URL. """
+
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self):
+        headers = call(client.head_account)
+        key = headers.get('x-account-meta-temp-url-key')
+        if not key:
+            key = uuid.uuid4().hex
+            logger.info('Setting a TempURL key on the Swift account')
+            call(client.post_account, headers={'X-Account-Meta-Temp-URL-Key': key})
+            # Another worker may have set its own key at the same time: use
+            # whichever was stored last
+            key = call(client.head_account).get('x-account-meta-temp-url-key') or key
+        return key
+
+    def get(self, storage_url, refresh=False):
+        entry = self._keys.get(storage_url)
+        if entry is not None and not refresh and entry['expires'] > time.time():
+            return entry['key']
+        with self._lock:
+            entry = self._keys.get(storage_url)
+            if entry is not None and not refresh and entry['expires'] > time.time():
+                return entry['key']
+            key = self._fetch()
+            self._keys[storage_url] = {'key': key, 'expires': time.time() + self.ttl}
+            return key
+
+    def invalidate(self, storage_url=None):
+        with self._lock:
+            if storage_url is None:
+                self._keys = {}
+            else:
+                self._keys.pop(storage_url, None)
+
+
+key_cache = KeyCache(ttl=settings.SWIFT_TEMPURL_KEY_TTL)
+
+
+def sign(storage_url, container, name, method='GET', lifetime=None, filename=None, refresh=False):
+    """ Return a URL giving access to one object for lifetime seconds. """
+    path = '%s/%s/%s' % (unquote(urlparse(storage_url).path), container, name)
+    expires = int(time.time() + (lifetime or settings.SWIFT_TEMPURL_LIFETIME))
+    message = '%s\n%d\n%s' % (method, expires, path)
+    key = key_cache.get(storage_url, refresh=refresh)
+    signature = hmac.new(key.encode('utf-8'), message.encode('utf-8'),
+                         DIGESTS[settings.SWIFT_TEMPURL_DIGEST]).hexdigest()
+    query = [('temp_url_sig', signature), ('temp_url_expires', expires)]
+    if filename:
+        query.append(('filename', filename))
+    return '%s/%s/%s?%s' % (storage_url, quote(container), quote(name), urlencode(query))
@@ -1,3 +1,1048 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import os
+import random
+import socket
+import tarfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import TemplateSyntaxError, engines
+from django.template.loader import get_template
+from django.template.loaders import filesystem
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+from ldap3.core.exceptions import LDAPBindError, LDAPSocketOpenError
+from prometheus_client import REGISTRY
+from swiftclient import client
+
+from . import bulk, capabilities, fakeswift, jobs, ldapauth, pool, search, tempurl, usage, warmup
+from .auth import TokenCache, call, token_cache
+from .deletion import Deleter
+from .pool import ConnectionPool
+from .listing_cache import ListingCache, listing_cache
+from .models import FolderUsage, IndexedContainer, IndexedObject, Job
+
+
+def naive_listing(names, prefix='', delimiter=None, marker='', end_marker='', limit=10000, reverse=False):
+    """ What Swift lists, computed the slow and obvious way. """
+    out = []
+    seen = set()
+    for name in sorted(names, reverse=reverse):
+        if marker and (name >= marker if reverse else name <= marker):
+            continue
+        if end_marker and (name <= end_marker if reverse else name >= end_marker):
+            continue
+        if not name.startswith(prefix):
+            continue
+        if delimiter:
+            cut = name.find(delimiter, len(prefix))
+            if cut >= 0:
+                subdir = name[:cut + 1]
+                if subdir not in seen:
+                    seen.add(subdir)
+                    if not (marker and not reverse and subdir <= marker):
+                        out.append(subdir)
+                if len(out) >= limit:
+                    break
+                continue
+        out.append(name)
+        if len(out) >= limit:
+            break
+    return out
+
+
+class SortedNamesTest(TestCase):
+
+    def test_matches_naive_listing(self):
+        rng = random.Random(1)
+        for _ in range(3000):
+            names = set(''.join(rng.choice('ab/') for _ in range(rng.randint(1, 5)))
+                        for _ in range(rng.randint(0, 30)))
+            sorted_names = fakeswift.SortedNames()
+            for name in names:
+                sorted_names.add(name)
+            args = {
+                'prefix': rng.choice(['', 'a', 'a/', 'b/a']),
+                'delimiter': rng.choice([None, '/']),
+                'marker': rng.choice(['', 'a', 'a/', 'ab', 'b/']),
+                'end_marker': rng.choice(['', 'b', 'b/b']),
+                'limit': rng.choice([1, 2, 5, 100]),
+                'reverse': rng.random() < 0.5,
+            }
+            self.assertEqual(sorted_names.listing(**args), naive_listing(names, **args),
+                             '%s %s' % (sorted(names), args))
+
+
+class PoolTest(TestCase):
+
+    def serve_once(self, listener):
+        """ Answer one request with keep-alive, then hang up. """
+        conn, _address = listener.accept()
+        conn.recv(65536)
+        conn.sendall(b'HTTP/1.1 204 No Content\r\nConnection: keep-alive\r\n\r\n')
+        conn.close()
+
+    def test_closed_connection_is_dropped(self):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(2)
+        self.addCleanup(listener.close)
+        url = 'http://127.0.0.1:%d/v1/AUTH_test' % listener.getsockname()[1]
+        pool = ConnectionPool()
+
+        with pool.connection(url) as http_conn:
+            threading.Thread(target=self.serve_once, args=(listener,), daemon=True).start()
+            http_conn[1].request('HEAD', '/v1/AUTH_test').content
+        for _ in range(100):
+            if pool._is_dropped(http_conn):
+                break
+            threading.Event().wait(0.01)
+
+        with pool.connection(url) as fresh:
+            self.assertIsNot(fresh, http_conn)
+        self.assertEqual((pool.stats()['dropped'], pool.stats()['hits']), (1, 0))
+        with pool.connection(url) as again:
+            self.assertIs(again, fresh)
+
+
+class SearchTest(TestCase):
+
+    def setUp(self):
+        indexed = IndexedContainer.objects.create(name='c', complete=True)
+        for name in ('a/x.jpg', 'a/y.png', 'a/sub/z.jpg', 'a[1', 'b/x.jpg'):
+            IndexedObject.objects.create(container=indexed, name=name, reversed_name=name[::-1])
+
+    def names(self, prefix, query):
+        return [row.name for row in search.search('c', prefix=prefix, query=query)]
+
+    def test_literal_prefix(self):
+        self.assertEqual(search.literal_prefix('a/b*.jpg'), 'a/b')
+        self.assertEqual(search.literal_prefix('a/[xy].jpg'), 'a/')
+        self.assertEqual(search.literal_prefix('a[1'), 'a[1')
+
+    def test_globs(self):
+        self.assertEqual(self.names('a/', '*.jpg'), ['a/sub/z.jpg', 'a/x.jpg'])
+        self.assertEqual(self.names('a/', '?.*'), ['a/x.jpg', 'a/y.png'])
+        self.assertEqual(self.names('', '[ab]/x*'), ['a/x.jpg', 'b/x.jpg'])
+        self.assertEqual(self.names('', 'a[1'), ['a[1'])
+        self.assertEqual(self.names('a/', 'X'), ['a/x.jpg'])
+
+
+@override_settings(SWIFT_JOBS_PER_USER=2, SWIFT_JOB_STALE_AFTER=300, SWIFT_JOB_MAX_ATTEMPTS=2)
+class JobQueueTest(TestCase):
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+
+    def enqueue(self, user, kind=Job.SCAN_USAGE):
+        return jobs.enqueue(user, kind, container='c')
+
+    def test_per_user_limit(self):
+        queued = [self.enqueue(self.alice) for _ in range(3)]
+        other = self.enqueue(self.bob)
+        claimed = [jobs.claim_next() for _ in range(3)]
+        self.assertEqual([job.pk for job in claimed], [queued[0].pk, queued[1].pk, other.pk])
+        self.assertIsNone(jobs.claim_next())
+
+    def test_stale_job_queued_again(self):
+        job = self.enqueue(self.alice)
+        jobs.claim_next()
+        Job.objects.filter(pk=job.pk).update(heartbeat=timezone.now() - timedelta(seconds=301))
+        claimed = jobs.claim_next()
+        self.assertEqual((claimed.pk, claimed.attempts), (job.pk, 2))
+
+        jobs.heartbeat([job.pk])
+        self.assertIsNone(jobs.claim_next())
+        Job.objects.filter(pk=job.pk).update(heartbeat=timezone.now() - timedelta(seconds=301))
+        self.assertIsNone(jobs.claim_next())
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.FAILED)
+
+    def test_spooled_job_stays_on_its_host(self):
+        job = self.enqueue(self.alice, kind=Job.UPLOAD)
+        self.assertEqual(job.node, jobs.NODE)
+        Job.objects.filter(pk=job.pk).update(node='elsewhere')
+        self.assertIsNone(jobs.claim_next())
+
+        Job.objects.filter(pk=job.pk).update(status=Job.RUNNING, started=timezone.now() - timedelta(seconds=301))
+        jobs.requeue_stale()
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.FAILED)
+
+
+class SessionEngineTest(TestCase):
+
+    def engines(self):
+        for name in ('db', 'cached_db', 'cache', 'signed_cookies'):
+            yield (importlib.import_module('swift_browser.sessions.%s' % name).SessionStore,
+                   importlib.import_module('django.contrib.sessions.backends.%s' % name).SessionStore)
+
+    def test_token_stored_encrypted(self):
+        for store_class, plain_class in self.engines():
+            store = store_class()
+            store['auth_token'] = 'AUTH_tksecret'
+            store['storage_url'] = 'http://swift/v1/AUTH_test'
+            store.save()
+            loaded = store_class(store.session_key)
+            self.assertEqual(loaded['auth_token'], 'AUTH_tksecret')
+            self.assertEqual(loaded.get('storage_url'), 'http://swift/v1/AUTH_test')
+            raw = plain_class(store.session_key)
+            self.assertNotIn('secret', raw['auth_token'])
+            self.assertEqual(raw['storage_url'], 'http://swift/v1/AUTH_test')
+
+    def test_unreadable_token_is_missing(self):
+        for store_class, plain_class in self.engines():
+            raw = plain_class()
+            raw['auth_token'] = 'AUTH_tkplain'
+            raw.save()
+            loaded = store_class(raw.session_key)
+            self.assertIsNone(loaded.get('auth_token'))
+            with self.assertRaises(KeyError):
+                loaded['auth_token']
+
+
+@override_settings(LDAP_GROUP_MEMBER='cn=swift,ou=groups,dc=example', SWIFT_LDAP_CACHE='default',
+                   SWIFT_LDAP_CACHE_TTL=300, SWIFT_LDAP_STALE_TTL=3600)
+class LDAPCacheTest(TestCase):
+
+    ENTRY = {
+        'dn': 'uid=alice,ou=people,dc=example',
+        'attributes': {'uid': ['alice'], 'givenName': ['Alice'], 'sn': ['Smith'],
+                       'mail': ['alice@example.com']},
+    }
+
+    def setUp(self):
+        caches['default'].clear()
+        self.backend = ldapauth.CachingLDAPBackend()
+        # The directory itself is replaced at the bind and search functions
+        self.bind = self.patch('bind')
+        self.search_user = self.patch('search_user', return_value=self.ENTRY)
+        self.is_member = self.patch('is_member', return_value=True)
+
+    def patch(self, name, **kwargs):
+        patcher = mock.patch('swift_browser.ldapauth.' + name, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def login(self, password='secret'):
+        return self.backend.authenticate(None, username='alice', password=password)
+
+    def test_lookups_cached(self):
+        user = self.login()
+        self.assertEqual((user.username, user.first_name, user.email), ('alice', 'Alice', 'alice@example.com'))
+        self.assertEqual(self.login(), user)
+        self.assertEqual(self.bind.call_count, 2)
+        self.assertEqual((self.search_user.call_count, self.is_member.call_count), (1, 1))
+
+    def test_wrong_password(self):
+        self.bind.side_effect = LDAPBindError('invalidCredentials')
+        self.assertIsNone(self.login('wrong'))
+        self.search_user.assert_not_called()
+
+    def test_not_member(self):
+        self.is_member.return_value = False
+        self.assertIsNone(self.login())
+        self.assertIsNone(self.login())
+        self.assertEqual(self.is_member.call_count, 1)
+
+    def test_stale_results_during_outage(self):
+        self.login()
+        self.search_user.side_effect = LDAPSocketOpenError('directory down')
+        self.is_member.side_effect = LDAPSocketOpenError('directory down')
+        with self.settings(SWIFT_LDAP_CACHE_TTL=0):
+            self.assertEqual(self.login().username, 'alice')
+        caches['default'].clear()
+        self.assertIsNone(self.login())
+
+
+class WarmUpTest(TestCase):
+
+    def test_templates_compiled_once(self):
+        count = len([name for name in os.listdir(warmup.TEMPLATE_DIR) if name.endswith('.html')])
+        engine = engines.all()[0].engine
+        engine.template_loaders[0].reset()
+        with self.assertLogs('swift_browser.warmup', 'INFO') as logs:
+            warmup.warm_up()
+        self.assertIn('%d templates' % count, logs.output[-1])
+        with mock.patch.object(filesystem.Loader, 'get_contents') as read:
+            get_template('containers.html')
+        read.assert_not_called()
+
+    def test_broken_template_is_skipped(self):
+        def broken(name):
+            if name == 'job.html':
+                raise TemplateSyntaxError('broken')
+            return get_template(name)
+        with mock.patch('swift_browser.warmup.get_template', broken), \
+                self.assertLogs('swift_browser.warmup', 'INFO') as logs:
+            warmup.warm_up()
+        self.assertTrue(any('Could not compile job.html' in line for line in logs.output))
+        self.assertIn('Warmed up', logs.output[-1])
+
+
+class FakeSwiftTestCase(TestCase):
+    """ Runs the views against a fresh FakeSwift, served on a free local port. """
+
+    @classmethod
+    def setUpClass(cls):
+        _app, cls.server = fakeswift.serve(port=0)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.overrides = override_settings(
+            SWIFT_AUTH_URL='http://127.0.0.1:%d/auth/v1.0' % cls.server.server_address[1],
+            SWIFT_AUTH_USER='test:tester',
+            SWIFT_AUTH_KEY='testing',
+            SWIFT_AUTH_VERSION='1',
+            SWIFT_BACKGROUND_JOBS=False,
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+        )
+        cls.overrides.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.overrides.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.swift = fakeswift.FakeSwift()
+        self.server.set_app(self.swift)
+        token_cache._tokens.clear()
+        capabilities.invalidate()
+        tempurl.key_cache.invalidate()
+        caches['listings'].clear()
+        self.user = User.objects.create_user('tester')
+        self.client.force_login(self.user)
+        self.swift.put_container('c')
+
+    def names(self, container='c'):
+        return list(self.swift.containers[container].names.names)
+
+
+class ListingTest(FakeSwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for index in range(25):
+            self.swift.put_object('c', 'dir/%02d' % index, b'x')
+
+    def page(self, **params):
+        params.setdefault('container', 'c')
+        params.setdefault('subdir', 'dir/')
+        response = self.client.get('/view_container/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_pages(self):
+        first = self.page(limit=10)
+        self.assertEqual([row.name for row in first.context['folder_objects']],
+                         ['dir/%02d' % i for i in range(10)])
+        self.assertEqual(first.context['previous_marker'], '')
+        self.assertEqual(first.context['next_marker'], 'dir/09')
+
+        last = self.page(limit=10, marker='dir/19')
+        self.assertEqual([row.name for row in last.context['folder_objects']],
+                         ['dir/%02d' % i for i in range(20, 25)])
+        self.assertEqual(last.context['next_marker'], '')
+
+    def test_previous_page(self):
+        second = self.page(limit=10, end_marker='dir/20')
+        self.assertEqual([row.name for row in second.context['folder_objects']],
+                         ['dir/%02d' % i for i in range(10, 20)])
+        self.assertEqual(second.context['previous_marker'], 'dir/10')
+
+        first = self.page(limit=10, end_marker='dir/10')
+        self.assertEqual([row.name for row in first.context['folder_objects']],
+                         ['dir/%02d' % i for i in range(10)])
+        self.assertEqual(first.context['previous_marker'], '')
+        self.assertEqual(first.context['next_marker'], 'dir/09')
+
+    def test_exactly_one_page_left(self):
+        last = self.page(limit=10, marker='dir/14')
+        self.assertEqual(len(last.context['folder_objects']), 10)
+        self.assertEqual(last.context['next_marker'], '')
+
+    def test_write_through_another_worker(self):
+        self.page(limit=10)
+        # A cache and generations of its own, like another gunicorn worker's
+        other_worker = ListingCache('default', 30, 0)
+        other_worker.invalidate(token_cache.get()[0], 'c')
+        self.swift.put_object('c', 'dir/!', b'x')
+        listing_cache._generations.clear()
+        names = [row.name for row in self.page(limit=10).context['folder_objects']]
+        self.assertEqual(names[0], 'dir/!')
+
+    def test_metrics(self):
+        self.page(limit=10)
+        self.page(limit=10)
+        response = self.client.get('/metrics')
+        self.assertContains(response, 'swift_listing_cache_hits %.1f' % listing_cache.hits)
+        self.assertContains(response, 'swift_listing_cache_hit_ratio ')
+        self.assertContains(response, 'swift_listing_cache_entries ')
+        self.assertContains(response, 'swift_pool_dropped ')
+
+    def test_names_stay_text(self):
+        name = "dir/x');alert(1);('\"<b>"
+        self.swift.put_object('c', name, b'x')
+        self.swift.put_object('c', name + '/y', b'x')
+        response = self.page(limit=100)
+        self.assertNotContains(response, 'onclick=')
+        self.assertNotContains(response, 'onsubmit=')
+        self.assertNotContains(response, '<b>')
+        self.assertContains(response, 'data-confirm="Delete x&#39;);alert(1);(&#39;&quot;&lt;b&gt;?"')
+
+    def test_folders(self):
+        self.swift.put_object('c', 'top.txt', b'x')
+        response = self.page(subdir='')
+        self.assertEqual([row.subdir for row in response.context['subdirs']], ['dir/'])
+        self.assertEqual([row.name for row in response.context['folder_objects']], ['top.txt'])
+
+    def test_container_details(self):
+        self.swift.put_container('public')
+        self.swift.containers['public'].meta['x-container-read'] = '.r:*,.rlistings'
+        threads = set()
+        generations = listing_cache.generations
+        def record(account):
+            threads.add(threading.current_thread())
+            return generations(account)
+        with mock.patch.object(listing_cache, 'generations', record):
+            response = self.client.get('/')
+        self.assertEqual(threads, {threading.current_thread()})
+        self.assertEqual([(c['name'], c.get('public')) for c in response.context['containers']],
+                         [('c', False), ('public', True)])
+
+    def test_pool_exhausted(self):
+        with mock.patch('swift_browser.views.swift_call', side_effect=pool.PoolTimeout('busy')):
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 503)
+        self.assertContains(response, 'Swift is busy', status_code=503)
+        self.assertEqual(self.client.get('/').status_code, 200)
+
+    def test_account_listing_failed(self):
+        error = client.ClientException('boom', http_status=500)
+        with mock.patch('swift_browser.views.swift_call', side_effect=error):
+            response = self.client.get('/')
+        self.assertContains(response, 'Container listing failed.')
+        self.assertEqual(self.client.get('/').status_code, 200)
+
+
+class ObjectTest(FakeSwiftTestCase):
+
+    def test_upload(self):
+        response = self.client.post(
+            '/upload/?container=c&subdir=&object_name=hello.txt',
+            {'container': 'c', 'subdir': '', 'object_name': 'hello.txt',
+             'file': SimpleUploadedFile('hello.txt', b'hello world')})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.swift.containers['c'].objects['hello.txt']['data'], b'hello world')
+
+    def test_upload_target_mismatch(self):
+        self.swift.put_object('c', 'keep.txt', b'keep')
+        response = self.client.post(
+            '/upload/?container=c&subdir=&object_name=other.txt',
+            {'container': 'c', 'subdir': '', 'object_name': 'hello.txt',
+             'file': SimpleUploadedFile('hello.txt', b'hello world')}, follow=True)
+        self.assertIn('Upload failed.', [str(m) for m in response.context['messages']])
+        self.assertEqual(self.names(), ['keep.txt'])
+
+    def test_upload_invalid_form(self):
+        response = self.client.post(
+            '/upload/?container=c&subdir=&object_name=hello.txt',
+            {'container': 'c', 'subdir': '', 'object_name': '',
+             'file': SimpleUploadedFile('hello.txt', b'hello world')})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.names(), [])
+
+    def test_anonymous_upload(self):
+        self.client.logout()
+        response = self.client.post(
+            '/upload/?container=c&subdir=&object_name=pwned.txt',
+            {'container': 'c', 'subdir': '', 'object_name': 'pwned.txt',
+             'file': SimpleUploadedFile('pwned.txt', b'pwned')})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.names(), [])
+
+    def test_forged_upload(self):
+        browser = Client(enforce_csrf_checks=True)
+        browser.force_login(self.user)
+        response = browser.post(
+            '/upload/?container=c&subdir=&object_name=pwned.txt',
+            {'container': 'c', 'subdir': '', 'object_name': 'pwned.txt',
+             'csrfmiddlewaretoken': 'forged' * 11,
+             'file': SimpleUploadedFile('pwned.txt', b'pwned')},
+            HTTP_ORIGIN='http://evil.example')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.names(), [])
+
+    def test_same_origin_upload(self):
+        browser = Client(enforce_csrf_checks=True)
+        browser.force_login(self.user)
+        browser.get('/upload/', {'container': 'c'})
+        response = browser.post(
+            '/upload/?container=c&subdir=&object_name=hello.txt',
+            {'container': 'c', 'subdir': '', 'object_name': 'hello.txt',
+             'csrfmiddlewaretoken': browser.cookies['csrftoken'].value,
+             'file': SimpleUploadedFile('hello.txt', b'hello')},
+            HTTP_ORIGIN='http://testserver')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.names(), ['hello.txt'])
+
+    def test_delete(self):
+        self.swift.put_object('c', 'dir/a', b'a')
+        self.swift.put_object('c', 'dir/b', b'b')
+        response = self.client.get('/delete_object/', {'container': 'c', 'subdir': 'dir/', 'object_name': 'dir/a'})
+        self.assertEqual(response.status_code, 405)
+        self.client.post('/delete_object/', {'container': 'c', 'subdir': 'dir/', 'object_name': 'dir/a'})
+        self.assertEqual(self.names(), ['dir/b'])
+
+    def test_denied(self):
+        self.swift.put_object('c', 'a', b'a')
+        self.swift.key = 'rotated'
+        for url, data in [('/create_container/', {'container': 'd'}),
+                          ('/delete_object/', {'container': 'c', 'object_name': 'a'}),
+                          ('/delete_folder/', {'container': 'c', 'folder': 'dir/'}),
+                          ('/delete_container/', {'container': 'c'})]:
+            response = self.client.post(url, data, follow=True)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Access denied.', [str(m) for m in response.context['messages']])
+        self.assertEqual(self.names(), ['a'])
+
+    def test_delete_from_listing(self):
+        self.swift.put_object('c', 'a b', b'a')
+        browser = Client(enforce_csrf_checks=True)
+        browser.force_login(self.user)
+        listing = browser.get('/view_container/', {'container': 'c'})
+        self.assertContains(listing, '<input type="hidden" name="object_name" value="a b">')
+        response = browser.post('/delete_object/', {'container': 'c', 'subdir': '', 'object_name': 'a b'})
+        self.assertEqual(response.status_code, 403)
+        browser.post('/delete_object/', {'container': 'c', 'subdir': '', 'object_name': 'a b',
+                                         'csrfmiddlewaretoken': str(listing.context['csrf_token'])})
+        self.assertEqual(self.names(), [])
+
+    def test_delete_container(self):
+        self.swift.put_object('c', 'a', b'a')
+        response = self.client.get('/delete_container/', {'container': 'c'})
+        self.assertEqual(response.status_code, 405)
+        self.assertIn('c', self.swift.containers)
+
+        browser = Client(enforce_csrf_checks=True)
+        browser.force_login(self.user)
+        listing = browser.get('/')
+        self.assertContains(listing, '<input type="hidden" name="container" value="c">')
+        response = browser.post('/delete_container/', {'container': 'c'})
+        self.assertEqual(response.status_code, 403)
+        browser.post('/delete_container/', {'container': 'c',
+                                            'csrfmiddlewaretoken': str(listing.context['csrf_token'])})
+        self.assertNotIn('c', self.swift.containers)
+
+    def test_delete_folder(self):
+        for name in ('dir/a', 'dir/sub/b', 'dirt', 'other'):
+            self.swift.put_object('c', name, b'x')
+        response = self.client.get('/delete_folder/', {'container': 'c', 'subdir': '', 'folder': 'dir/'})
+        self.assertEqual(response.status_code, 405)
+        for folder in ('', ' ', 'dir'):
+            self.client.post('/delete_folder/', {'container': 'c', 'subdir': '', 'folder': folder})
+        self.assertEqual(self.names(), ['dir/a', 'dir/sub/b', 'dirt', 'other'])
+
+        self.client.post('/delete_folder/', {'container': 'c', 'subdir': '', 'folder': 'dir/'})
+        self.assertEqual(self.names(), ['dirt', 'other'])
+
+    def test_forged_delete_folder(self):
+        self.swift.put_object('c', 'dir/a', b'x')
+        browser = Client(enforce_csrf_checks=True)
+        browser.force_login(self.user)
+        response = browser.post('/delete_folder/', {'container': 'c', 'subdir': '', 'folder': 'dir/'})
+        self.assertEqual(response.status_code, 403)
+
+        listing = browser.get('/view_container/', {'container': 'c'})
+        self.assertContains(listing, 'name="csrfmiddlewaretoken" value="%s"' % listing.context['csrf_token'])
+        browser.post('/delete_folder/', {'container': 'c', 'subdir': '', 'folder': 'dir/',
+                                         'csrfmiddlewaretoken': str(listing.context['csrf_token'])})
+        self.assertEqual(self.names(), [])
+
+    def test_move(self):
+        self.swift.put_object('c', 'a', b'data')
+        self.client.post('/move/', {'container': 'c', 'subdir': '', 'source': 'a',
+                                    'dest_container': 'c', 'destination': 'b'})
+        self.assertEqual(self.names(), ['b'])
+        self.assertEqual(self.swift.containers['c'].objects['b']['data'], b'data')
+
+    def test_move_onto_itself(self):
+        self.swift.put_object('c', 'a', b'data')
+        for source in ('a', 'dir/'):
+            response = self.client.post('/move/', {'container': 'c', 'subdir': '', 'source': source,
+                                                   'dest_container': 'c', 'destination': source})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context['form'].errors)
+        self.assertEqual(self.names(), ['a'])
+
+    def test_move_folder(self):
+        for name in ('src/a', 'src/sub/b', 'other'):
+            self.swift.put_object('c', name, b'x')
+        self.client.post('/move/', {'container': 'c', 'subdir': '', 'source': 'src/',
+                                    'dest_container': 'c', 'destination': 'dst/'})
+        self.assertEqual(self.names(), ['dst/a', 'dst/sub/b', 'other'])
+
+
+@override_settings(SWIFT_CAPABILITIES_TTL=3600)
+class CapabilitiesTest(FakeSwiftTestCase):
+
+    def test_fetched_once_per_ttl(self):
+        self.swift.listing_limit = 10
+        with mock.patch('swift_browser.capabilities.client.get_capabilities',
+                        wraps=client.get_capabilities) as get_capabilities:
+            self.assertEqual(capabilities.container_listing_limit(), 10)
+            self.assertEqual(capabilities.bulk_delete_size(), 10000)
+            self.assertEqual(get_capabilities.call_count, 1)
+            self.swift.bulk = False
+            self.assertTrue(capabilities.bulk_upload())
+            capabilities.invalidate()
+            self.assertFalse(capabilities.bulk_upload())
+            self.assertEqual(capabilities.bulk_delete_size(), 0)
+            self.assertEqual(get_capabilities.call_count, 2)
+
+    def test_defaults_without_info(self):
+        error = client.ClientException('Not Found', http_status=404)
+        with mock.patch('swift_browser.capabilities.client.get_capabilities', side_effect=error):
+            self.assertEqual(capabilities.container_listing_limit(), capabilities.DEFAULT_LISTING_LIMIT)
+            self.assertEqual(capabilities.max_file_size(), capabilities.DEFAULT_MAX_FILE_SIZE)
+            self.assertEqual(capabilities.bulk_delete_size(), 0)
+            self.assertFalse(capabilities.slo())
+            self.assertEqual(capabilities.tempurl_methods(), [])
+        # A failed fetch is tried again after RETRY_AFTER, not after the TTL
+        self.assertAlmostEqual(capabilities._expires - time.time(), capabilities.RETRY_AFTER, delta=5)
+        self.assertEqual(self.client.get('/view_container/', {'container': 'c'}).status_code, 200)
+
+
+class ListingAPITest(FakeSwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.swift.listing_limit = 10
+        for index in range(25):
+            self.swift.put_object('c', 'dir/%02d' % index, b'x')
+        self.swift.put_object('c', 'top', b'x')
+
+    def lines(self, response):
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+
+    def test_objects_over_several_pages(self):
+        entries = self.lines(self.client.get('/api/objects/', {'container': 'c', 'prefix': 'dir/'}))
+        self.assertEqual([entry['name'] for entry in entries], ['dir/%02d' % i for i in range(25)])
+        self.assertEqual(entries[0]['bytes'], 1)
+
+    def test_delimiter_and_marker(self):
+        entries = self.lines(self.client.get('/api/objects/', {'container': 'c', 'delimiter': '/'}))
+        self.assertEqual([entry.get('subdir', entry.get('name')) for entry in entries], ['dir/', 'top'])
+        entries = self.lines(self.client.get('/api/objects/', {'container': 'c', 'marker': 'dir/23'}))
+        self.assertEqual([entry['name'] for entry in entries], ['dir/24', 'top'])
+
+    def test_containers(self):
+        self.swift.put_container('d')
+        entries = self.lines(self.client.get('/api/containers/'))
+        self.assertEqual([(entry['name'], entry['count']) for entry in entries], [('c', 26), ('d', 0)])
+
+    def test_errors(self):
+        self.assertEqual(self.client.get('/api/objects/').status_code, 400)
+        self.assertEqual(self.client.get('/api/objects/', {'container': 'missing'}).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/objects/', {'container': 'c'}).status_code, 302)
+
+    def test_error_while_streaming(self):
+        response = self.client.get('/api/objects/', {'container': 'c'})
+        content = iter(response.streaming_content)
+        self.assertEqual(len(next(content).splitlines()), 10)
+        self.swift.token = 'AUTH_tknew'
+        self.swift.key = 'rotated'
+        self.assertEqual(json.loads(next(content)), {'error': 'Swift request failed'})
+
+
+class BulkUploadTest(FakeSwiftTestCase):
+
+    def archive(self, members):
+        data = io.BytesIO()
+        with tarfile.open(fileobj=data, mode='w:gz') as tar:
+            for name, content in members:
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+        return data.getvalue()
+
+    def upload(self, files, extract=True):
+        data = {'container': 'c', 'subdir': 'up/', 'files': files}
+        if extract:
+            data['extract'] = 'on'
+        response = self.client.post('/bulk_upload/', data, follow=True)
+        return [str(message) for message in response.context['messages']]
+
+    def files(self):
+        return [SimpleUploadedFile('photos.tar.gz', self.archive([('a.txt', b'a'), ('sub/b.txt', b'bb')])),
+                SimpleUploadedFile('plain.txt', b'plain')]
+
+    def test_extract_archive(self):
+        with mock.patch('swift_browser.bulk.put_archive', wraps=bulk.put_archive) as put_archive:
+            self.assertEqual(self.upload(self.files()), ['3 files uploaded.'])
+        self.assertEqual(put_archive.call_count, 1)
+        self.assertEqual(self.names(), ['up/a.txt', 'up/plain.txt', 'up/sub/b.txt'])
+        self.assertEqual(self.swift.containers['c'].objects['up/sub/b.txt']['data'], b'bb')
+
+    def test_members_streamed_without_middleware(self):
+        self.swift.bulk = False
+        with mock.patch('swift_browser.bulk.put_archive') as put_archive:
+            self.assertEqual(self.upload(self.files()), ['3 files uploaded.'])
+        put_archive.assert_not_called()
+        self.assertEqual(self.names(), ['up/a.txt', 'up/plain.txt', 'up/sub/b.txt'])
+
+    def test_archive_kept_whole(self):
+        self.upload(self.files(), extract=False)
+        self.assertEqual(self.names(), ['up/photos.tar.gz', 'up/plain.txt'])
+
+    def test_invalid_archive(self):
+        self.swift.bulk = False
+        messages = self.upload([SimpleUploadedFile('broken.tar', b'not a tar file' * 100)])
+        self.assertEqual(messages, ['1 files could not be uploaded.'])
+        self.assertEqual(self.names(), [])
+
+
+class DeletionTest(FakeSwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.swift.listing_limit = 10
+        for index in range(25):
+            self.swift.put_object('c', 'dir/%02d' % index, b'x')
+        self.swift.put_object('c', 'keep', b'x')
+
+    def test_bulk_delete(self):
+        with mock.patch.object(Deleter, '_delete_one') as delete_one:
+            report = Deleter('c', prefix='dir/').delete_objects()
+        delete_one.assert_not_called()
+        self.assertEqual((report.deleted, report.failed), (25, []))
+        self.assertEqual(self.names(), ['keep'])
+
+    def test_concurrent_delete(self):
+        self.swift.bulk = False
+        report = Deleter('c').delete_container()
+        self.assertEqual((report.deleted, report.container_deleted), (26, True))
+        self.assertNotIn('c', self.swift.containers)
+
+    def test_container_conflict_is_retried(self):
+        conflicts = []
+        def flaky(func, *args, **kwargs):
+            if func is client.delete_container and not conflicts:
+                conflicts.append(args)
+                raise client.ClientException('Conflict', http_status=409)
+            return call(func, *args, **kwargs)
+        with mock.patch('swift_browser.deletion.call', flaky), \
+                mock.patch('swift_browser.deletion.time.sleep') as sleep:
+            report = Deleter('c').delete_container()
+        self.assertEqual((conflicts, report.container_deleted), ([('c',)], True))
+        sleep.assert_called_once_with(1)
+        self.assertNotIn('c', self.swift.containers)
+
+
+class UsageTest(FakeSwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.swift.put_object('c', 'a/x', b'xxx')
+        self.swift.put_object('c', 'a/b/y', b'yyyyy')
+        self.swift.put_object('c', 'z', b'z')
+
+    def sizes(self, container='c'):
+        return dict((row.prefix, (row.bytes, row.count))
+                    for row in FolderUsage.objects.filter(container=container))
+
+    def test_scan(self):
+        self.assertEqual(usage.scan('c'), 3)
+        self.assertEqual(self.sizes(), {'': (9, 3), 'a/': (8, 2), 'a/b/': (5, 1)})
+
+    def test_record(self):
+        usage.record_put('c', 'a/new', 1)
+        self.assertEqual(self.sizes(), {})
+
+        usage.scan('c')
+        usage.record_put('c', 'a/b/c/new', 10)
+        self.assertEqual(self.sizes(), {'': (19, 4), 'a/': (18, 3), 'a/b/': (15, 2), 'a/b/c/': (10, 1)})
+        usage.record_delete('c', prefix='a/b/')
+        self.assertEqual(self.sizes(), {'': (4, 2), 'a/': (3, 1)})
+        usage.record_delete('c', name='a/x', size=3)
+        self.assertEqual(self.sizes(), {'': (1, 1)})
+
+    def test_record_move(self):
+        usage.scan('c')
+        self.swift.put_container('d')
+        usage.scan('d')
+        usage.record_move('c', 'a/', 'd', 'moved/a/')
+        self.assertEqual(self.sizes(), {'': (1, 1)})
+        self.assertEqual(self.sizes('d'), {'': (8, 2), 'moved/': (8, 2), 'moved/a/': (8, 2), 'moved/a/b/': (5, 1)})
+
+    def test_delete_through_view(self):
+        usage.scan('c')
+        self.client.post('/delete_object/', {'container': 'c', 'subdir': 'a/', 'object_name': 'a/b/y'})
+        self.assertEqual(self.sizes(), {'': (4, 2), 'a/': (3, 1)})
+
+
+@override_settings(SWIFT_SEGMENT_THRESHOLD=1000, SWIFT_SEGMENT_SIZE=400, FILE_UPLOAD_MAX_MEMORY_SIZE=0)
+class SegmentedUploadTest(FakeSwiftTestCase):
+
+    def upload(self, data):
+        return self.client.post(
+            '/upload/?container=c&subdir=dir/&object_name=big.bin',
+            {'container': 'c', 'subdir': 'dir/', 'object_name': 'big.bin',
+             'file': SimpleUploadedFile('big.bin', data)})
+
+    def test_upload(self):
+        data = bytes(random.Random(1).getrandbits(8) for _ in range(2000))
+        self.assertEqual(self.upload(data).status_code, 302)
+        manifest = self.swift.containers['c'].objects['dir/big.bin']['manifest']
+        self.assertEqual([segment['size_bytes'] for segment in manifest], [400] * 5)
+        self.assertEqual(self.swift.segment_data(manifest), data)
+
+    def test_retry_reuses_segments(self):
+        data = bytes(random.Random(2).getrandbits(8) for _ in range(2000))
+        self.upload(data)
+        segments = self.names('c_segments')
+        self.swift.containers['c_segments'].delete(segments[2])
+        self.swift.containers['c'].delete('dir/big.bin')
+
+        with self.assertLogs('swift_browser.segments', 'INFO') as logs:
+            self.assertEqual(self.upload(data).status_code, 302)
+        self.assertEqual(len([line for line in logs.output if 'already uploaded' in line]), 4)
+        self.assertEqual(self.names('c_segments'), segments)
+        manifest = self.swift.containers['c'].objects['dir/big.bin']['manifest']
+        self.assertEqual(self.swift.segment_data(manifest), data)
+
+
+@override_settings(SWIFT_RESUMABLE_CHUNK_SIZE=400)
+class ResumableUploadTest(FakeSwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.data = bytes(random.Random(3).getrandbits(8) for _ in range(1000))
+
+    def init(self, **data):
+        response = self.client.post('/upload_api/init/', data)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def put_chunk(self, upload, index):
+        chunk = self.data[index * 400:(index + 1) * 400]
+        return self.client.put('/upload_api/chunk/?upload=%s&index=%d' % (upload, index),
+                               chunk, content_type='application/octet-stream')
+
+    def test_upload_and_resume(self):
+        upload = self.init(container='c', subdir='dir/', object_name='big.bin', size=1000)
+        self.assertEqual((upload['chunks'], upload['uploaded']), (3, []))
+        self.assertEqual(self.put_chunk(upload['upload'], 0).status_code, 200)
+        self.assertEqual(self.put_chunk(upload['upload'], 2).status_code, 200)
+
+        resumed = self.init(upload=upload['upload'])
+        self.assertEqual(resumed['uploaded'], [0, 2])
+        self.put_chunk(upload['upload'], 1)
+        response = self.client.post('/upload_api/complete/', {'upload': upload['upload']})
+        self.assertEqual(response.status_code, 200)
+        manifest = self.swift.containers['c'].objects['dir/big.bin']['manifest']
+        self.assertEqual(self.swift.segment_data(manifest), self.data)
+
+    def test_wrong_chunk(self):
+        upload = self.init(container='c', object_name='big.bin', size=1000)
+        response = self.client.put('/upload_api/chunk/?upload=%s&index=2' % upload['upload'],
+                                   b'x' * 400, content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 400)
+
+    def test_other_user(self):
+        upload = self.init(container='c', object_name='big.bin', size=1000)
+        self.client.force_login(User.objects.create_user('other'))
+        self.assertEqual(self.put_chunk(upload['upload'], 0).status_code, 400)
+        self.assertEqual(self.names('c_segments'), [])
+
+    def test_abort(self):
+        upload = self.init(container='c', object_name='big.bin', size=1000)
+        self.put_chunk(upload['upload'], 0)
+        response = self.client.post('/upload_api/abort/', {'upload': upload['upload']})
+        self.assertEqual(response.json(), {'deleted': 1})
+        self.assertEqual(self.names('c_segments'), [])
+        self.assertEqual(self.names(), [])
+
+
+@override_settings(SWIFT_DOWNLOAD_CHUNK_SIZE=1024)
+class DownloadTest(FakeSwiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.data = bytes(range(256)) * 20
+        self.swift.put_object('c', 'dir/a b.bin', self.data)
+
+    def download(self, **headers):
+        return self.client.get('/download/', {'container': 'c', 'object_name': 'dir/a b.bin'}, **headers)
+
+    def test_download(self):
+        idle = pool.get_download_pool().stats()['idle']
+        response = self.download()
+        self.assertEqual(response['Content-Disposition'], "attachment; filename*=UTF-8''a%20b.bin")
+        self.assertEqual(pool.get_download_pool().stats()['in_use'], 1)
+        self.assertEqual(pool.get_pool().stats()['in_use'], 0)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(pool.get_download_pool().stats()['in_use'], 0)
+        self.assertEqual(pool.get_download_pool().stats()['idle'], idle + 1)
+
+    def test_range(self):
+        response = self.download(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.data[10:20])
+        self.assertEqual(self.download(HTTP_RANGE='bytes=9999-').status_code, 416)
+
+    def test_broken_off(self):
+        idle = pool.get_download_pool().stats()['idle']
+        response = self.download()
+        next(iter(response.streaming_content))
+        response.close()
+        self.assertEqual(pool.get_download_pool().stats()['in_use'], 0)
+        self.assertEqual(pool.get_download_pool().stats()['idle'], idle)
+
+
+class MetricsTest(FakeSwiftTestCase):
+
+    def test_localhost_only_by_default(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 404)
+        with self.settings(SWIFT_METRICS_ALLOWED_IPS=['*']):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 200)
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_swift_calls_and_views(self):
+        listings = self.sample('swift_request_duration_seconds_count', operation='get_container')
+        views = self.sample('django_view_duration_seconds_count', view='container', method='GET')
+        responses = self.sample('django_responses_total', view='container', status='200')
+        self.client.get('/view_container/', {'container': 'c'})
+        self.assertEqual(self.sample('swift_request_duration_seconds_count', operation='get_container'),
+                         listings + 1)
+        self.assertEqual(self.sample('django_view_duration_seconds_count', view='container', method='GET'),
+                         views + 1)
+        self.assertEqual(self.sample('django_responses_total', view='container', status='200'),
+                         responses + 1)
+
+    def test_errors_and_bytes(self):
+        errors = self.sample('swift_request_errors_total', operation='delete_object', status='404')
+        self.client.post('/delete_object/', {'container': 'c', 'object_name': 'missing'})
+        self.assertEqual(self.sample('swift_request_errors_total', operation='delete_object', status='404'),
+                         errors + 1)
+
+        sent = self.sample('swift_bytes_total', operation='put_object', direction='sent')
+        received = self.sample('swift_bytes_total', operation='get_object', direction='received')
+        self.client.post('/upload/?container=c&subdir=&object_name=hello.txt',
+                         {'container': 'c', 'subdir': '', 'object_name': 'hello.txt',
+                          'file': SimpleUploadedFile('hello.txt', b'hello world')})
+        response = self.client.get('/download/', {'container': 'c', 'object_name': 'hello.txt'})
+        b''.join(response.streaming_content)
+        self.assertEqual(self.sample('swift_bytes_total', operation='put_object', direction='sent'), sent + 11)
+        self.assertEqual(self.sample('swift_bytes_total', operation='get_object', direction='received'),
+                         received + 11)
+
+
+@override_settings(SWIFT_TRACE_SAMPLE_RATE=1.0, DEBUG=False)
+class TracingTest(FakeSwiftTestCase):
+
+    def test_server_timing_for_staff_only(self):
+        response = self.client.get('/view_container/', {'container': 'c'})
+        self.assertNotIn('Server-Timing', response)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/view_container/', {'container': 'c'})
+        self.assertIn('template.container.html;dur=', response['Server-Timing'])
+
+
+class ReauthenticationTest(FakeSwiftTestCase):
+
+    def expire_token(self):
+        token_cache.get()
+        self.swift.token = 'AUTH_tknew'
+
+    def test_rewindable_body_is_sent_again(self):
+        self.expire_token()
+        contents = io.BytesIO(b'skip:data')
+        contents.read(5)
+        call(client.put_object, 'c', name='o', contents=contents, content_length=4)
+        self.assertEqual(self.swift.containers['c'].objects['o']['data'], b'data')
+
+    def test_stream_is_not_sent_again(self):
+        self.expire_token()
+        with self.assertRaises(client.ClientException) as raised:
+            call(client.put_object, 'c', name='o', contents=iter([b'da', b'ta']))
+        self.assertEqual(raised.exception.http_status, 401)
+        self.assertEqual(self.names(), [])
+        self.assertEqual(token_cache.get()[1], 'AUTH_tknew')
+
+
+class TokenCacheTest(FakeSwiftTestCase):
+
+    def entry(self, cache):
+        cache.get()
+        return list(cache._tokens.values())[0]
+
+    def test_expiry_from_auth(self):
+        self.swift.token_lifetime = 600
+        entry = self.entry(TokenCache(ttl=3600, refresh_margin=300))
+        self.assertAlmostEqual(entry['expires'] - time.time(), 600, delta=5)
+        self.assertAlmostEqual(entry['refresh'] - time.time(), 300, delta=5)
+
+    def test_ttl_is_upper_bound(self):
+        entry = self.entry(TokenCache(ttl=60, refresh_margin=10))
+        self.assertAlmostEqual(entry['expires'] - time.time(), 60, delta=5)
+
+    def test_short_lived_token(self):
+        self.swift.token_lifetime = 100
+        cache = TokenCache(ttl=3600, refresh_margin=300)
+        entry = self.entry(cache)
+        self.assertAlmostEqual(entry['refresh'] - time.time(), 50, delta=5)
+        self.swift.token = 'AUTH_tknew'
+        self.assertEqual(cache.get()[1], entry['token'])
+
+
+@override_settings(SWIFT_DATA_PATH='tempurl')
+class TempURLTest(FakeSwiftTestCase):
+
+    def storage_url(self):
+        return token_cache.get()[0]
+
+    def test_get(self):
+        for name in ('plain', 'with space', 'ünïcode/名前', '100%'):
+            self.swift.put_object('c', name, name.encode('utf-8'))
+            url = tempurl.sign(self.storage_url(), 'c', name)
+            with urllib.request.urlopen(url) as response:
+                self.assertEqual(response.read(), name.encode('utf-8'))
+
+    def test_put(self):
+        url = tempurl.sign(self.storage_url(), 'c', 'new file', method='PUT')
+        request = urllib.request.Request(url, data=b'uploaded', method='PUT')
+        urllib.request.urlopen(request).close()
+        self.assertEqual(self.swift.containers['c'].objects['new file']['data'], b'uploaded')
+
+    def test_wrong_method(self):
+        self.swift.put_object('c', 'o', b'x')
+        url = tempurl.sign(self.storage_url(), 'c', 'o', method='PUT')
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            urllib.request.urlopen(url)
+        self.assertEqual(raised.exception.code, 401)
+
+    def test_changed_key(self):
+        self.swift.put_object('c', 'o', b'x')
+        tempurl.sign(self.storage_url(), 'c', 'o')
+        self.swift.meta['temp-url-key'] = 'rotated'
+        url = tempurl.sign(self.storage_url(), 'c', 'o', refresh=True)
+        with urllib.request.urlopen(url) as response:
+            self.assertEqual(response.read(), b'x')
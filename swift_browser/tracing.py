@@ -0,0 +1,185 @@
+"""
+Per-request tracing of Swift calls, session access and template rendering.
+
+TracingMiddleware starts a trace for SWIFT_TRACE_SAMPLE_RATE of requests.
+While it is active, span() records how long each step took: every Swift
+call (through metrics.observe()), authentication, session load and save, and
+every template rendered through TracedTemplates.  Traced responses to staff
+users, or to anyone when DEBUG is on, carry a Server-Timing header, which
+browsers show in their network panel; it would tell others how the backend
+spends its time.  A request slower than SWIFT_TRACE_SLOW_MS is logged as one
+line of JSON.
+
+With SWIFT_PROFILE_DIR set, SWIFT_PROFILE_SAMPLE_RATE of traced requests also run
+under cProfile, and the profiles of the slow ones are written to that
+directory for `python -m pstats` or snakeviz.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+# Characters allowed in a Server-Timing metric name
+_NOT_TOKEN = re.compile(r"[^!#$%&'*+.^_`|~0-9A-Za-z-]")
+
+
+class Trace(object):
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def add(self, name, start, end):
+        self.spans.append((name, start - self.start, end - start))
+
+    def totals(self):
+        """ Return {name: (count, seconds)} in order of first use. """
+        totals = OrderedDict()
+        for name, _offset, duration in self.spans:
+            count, seconds = totals.get(name, (0, 0.0))
+            totals[name] = (count + 1, seconds + duration)
+        return totals
+
+
+def current():
+    return getattr(_local, 'trace', None)
+
+
+@contextmanager
+def activate(trace):
+    """ Record spans of this thread into trace, e.g. in a worker serving a request. """
+    previous = current()
+    _local.trace = trace
+    try:
+        yield
+    finally:
+        _local.trace = previous
+
+
+@contextmanager
+def span(name):
+    trace = current()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, start, time.perf_counter())
+
+
+def traced(name, func):
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def server_timing(trace, total):
+    entries = []
+    for name, (count, seconds) in trace.totals().items():
+        entry = '%s;dur=%.1f' % (_NOT_TOKEN.sub('_', name), seconds * 1000)
+        if count > 1:
+            entry += ';desc="%d calls"' % count
+        entries.append(entry)
+    entries.append('total;dur=%.1f' % (total * 1000))
+    return ', '.join(entries)
+
+
+class TracedTemplates(DjangoTemplates):
+    """ The Django template backend, recording a span for every render. """
+
+    def from_string(self, template_code):
+        return TracedTemplate(super().from_string(template_code), 'string')
+
+    def get_template(self, template_name):
+        return TracedTemplate(super().get_template(template_name), template_name)
+
+
+class TracedTemplate(object):
+
+    def __init__(self, template, name):
+        self.template = template
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(self.template, attr)
+
+    def render(self, context=None, request=None):
+        with span('template.' + self.name):
+            return self.template.render(context, request)
+
+
+class TracingMiddleware(object):
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.SWIFT_TRACE_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = None
+        if settings.SWIFT_PROFILE_DIR and random.random() < settings.SWIFT_PROFILE_SAMPLE_RATE:
+            profile = cProfile.Profile()
+        trace = Trace()
+        with activate(trace):
+            if profile is not None:
+                profile.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profile is not None:
+                    profile.disable()
+        total = time.perf_counter() - trace.start
+
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            response['Server-Timing'] = server_timing(trace, total)
+        if total * 1000 >= settings.SWIFT_TRACE_SLOW_MS:
+            self.log_slow(request, response, trace, total, profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        session = getattr(request, 'session', None)
+        if session is not None and current() is not None:
+            # Sessions load lazily on first access and are saved by SessionMiddleware
+            session.load = traced('session.load', session.load)
+            session.save = traced('session.save', session.save)
+
+    def log_slow(self, request, response, trace, total, profile):
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match is not None and match.url_name else 'unresolved'
+        record = OrderedDict([
+            ('event', 'slow_request'),
+            ('method', request.method),
+            ('path', request.path),
+            ('view', view),
+            ('status', response.status_code),
+            ('duration_ms', round(total * 1000, 1)),
+            ('spans', [OrderedDict([('name', name),
+                                    ('start_ms', round(offset * 1000, 1)),
+                                    ('duration_ms', round(duration * 1000, 1))])
+                       for name, offset, duration in sorted(trace.spans, key=lambda span: span[1])]),
+        ])
+        if profile is not None:
+            os.makedirs(settings.SWIFT_PROFILE_DIR, exist_ok=True)
+            path = os.path.join(settings.SWIFT_PROFILE_DIR, '%s-%s-%dms.prof' % (
+                time.strftime('%Y%m%d-%H%M%S'), view, total * 1000))
+            profile.dump_stats(path)
+            record['profile'] = path
+        logger.warning(json.dumps(record))
@@ -0,0 +1,174 @@
+"""
+Upload handler that streams multipart file data straight to Swift.
+
+Chunks are handed from the request thread to a background PUT through a
+bounded queue, so an upload never holds more than SWIFT_UPLOAD_QUEUE_CHUNKS
+chunks in memory and never touches local disk.  The MD5 of the data is
+computed on the fly and checked against the ETag returned by Swift.
+
+The target is taken from the query string (?container=&subdir=&object_name=)
+because the other form fields are not parsed yet when the file starts
+arriving.  Requests without it, and files large enough to need segmenting,
+fall through to the next handler.  So do uploads by anonymous users and
+posts from other sites: the login and CSRF checks only run once the body is
+parsed, so nothing may be written to Swift before then.  The view rejects
+the upload, and deletes what was streamed, if the form names another target.
+"""
+import hashlib
+import io
+import logging
+import queue
+import threading
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers, StopUpload
+from django.urls import reverse
+from swiftclient import client
+
+from . import metrics, pool
+from .auth import token_cache
+from .forms import UploadTargetForm
+from .segments import segment_threshold
+
+logger = logging.getLogger(__name__)
+
+_ABORT = object()
+
+
+class SwiftUploadedFile(UploadedFile):
+    """ Placeholder for a file whose data is already stored in Swift. """
+
+    stored_in_swift = True
+
+    def __init__(self, name, content_type, size, charset, etag, container, object_name):
+        super().__init__(io.BytesIO(), name, content_type, size, charset)
+        self.etag = etag
+        self.container = container
+        self.object_name = object_name
+
+
+class SwiftStreamingUploadHandler(FileUploadHandler):
+
+    chunk_size = 256 * 2 ** 10
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.active = False
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        if field_name != 'file' or self.request.path != reverse('upload'):
+            return
+        if not self.request.user.is_authenticated or not self._same_origin():
+            return
+        if int(self.request.META.get('CONTENT_LENGTH') or 0) > segment_threshold():
+            # Too large for a single object: let the view upload segments
+            return
+        target = UploadTargetForm(self.request.GET)
+        if not target.is_valid():
+            return
+
+        self.active = True
+        self.container = target.cleaned_data['container']
+        self.object_name = target.cleaned_data['subdir'] + target.cleaned_data['object_name']
+        self.md5 = hashlib.md5()
+        self.chunks = queue.Queue(maxsize=settings.SWIFT_UPLOAD_QUEUE_CHUNKS)
+        self.etag = None
+        self.error = None
+        self.sender = threading.Thread(target=self._send)
+        self.sender.daemon = True
+        self.sender.start()
+        logger.info("Streaming upload for /%s/%s" % (self.container, self.object_name))
+        raise StopFutureHandlers()
+
+    def _same_origin(self):
+        """ Whether the browser says the form was posted by a page of this site.
+
+        The CSRF token is in the body, after the file, but browsers send an
+        Origin header with every POST that pages on other sites cannot forge. """
+        if getattr(self.request, '_dont_enforce_csrf_checks', False):
+            return True
+        origin = self.request.META.get('HTTP_ORIGIN')
+        return bool(origin) and urlparse(origin).netloc == self.request.get_host()
+
+    def _body(self):
+        while True:
+            try:
+                chunk = self.chunks.get(timeout=settings.SWIFT_UPLOAD_STALL_TIMEOUT)
+            except queue.Empty:
+                raise IOError('Upload stalled')
+            if chunk is _ABORT:
+                raise IOError('Upload aborted')
+            if chunk is None:
+                return
+            yield chunk
+
+    def _send(self):
+        # Raising from the body generator breaks off the chunked PUT, so Swift
+        # never stores a truncated object.  There is no retry after a 401
+        # because a stream cannot be replayed.
+        try:
+            storage_url, auth_token = token_cache.get()
+            with pool.connection(storage_url) as http_conn:
+                self.etag = metrics.timed(client.put_object, storage_url, auth_token, self.container,
+                                          name=self.object_name,
+                                          contents=self._body(),
+                                          content_type=self.content_type,
+                                          http_conn=http_conn)
+        except Exception as exc:
+            self.error = exc
+
+    def _put(self, chunk):
+        while self.error is None:
+            try:
+                self.chunks.put(chunk, timeout=1)
+                return
+            except queue.Full:
+                continue
+        self.active = False
+        self._fail(self.error)
+
+    def _fail(self, error):
+        """ Abort the request; the view reports request.swift_upload_error. """
+        logger.error("Streaming upload of /%s/%s failed: %s" % (self.container, self.object_name, error))
+        self.request.swift_upload_error = str(error)
+        raise StopUpload(connection_reset=True)
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        self.md5.update(raw_data)
+        self._put(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self._put(None)
+        self.active = False
+        self.sender.join()
+        if self.error is not None:
+            self._fail(self.error)
+        if self.etag != self.md5.hexdigest():
+            storage_url, auth_token = token_cache.get()
+            with pool.connection(storage_url) as http_conn:
+                metrics.timed(client.delete_object, storage_url, auth_token, self.container,
+                              self.object_name, http_conn=http_conn)
+            self._fail('ETag mismatch: sent %s, Swift stored %s' % (self.md5.hexdigest(), self.etag))
+        metrics.transferred('put_object', 'sent', file_size)
+        return SwiftUploadedFile(self.file_name, self.content_type, file_size,
+                                 self.charset, self.etag, self.container, self.object_name)
+
+    def upload_complete(self):
+        # Still active here means the request body ended before the file did
+        if self.active:
+            self.active = False
+            while self.error is None and self.sender.is_alive():
+                try:
+                    self.chunks.put(_ABORT, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+            self.sender.join()
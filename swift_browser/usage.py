@@ -0,0 +1,121 @@
+"""
+Folder sizes ("du") for containers.
+
+Swift only reports totals per container, so scan() walks a container's
+listing page by page and stores the bytes and object count under every
+prefix in FolderUsage, one row per pseudofolder.  Uploads, deletes and
+moves made through the browser then adjust the rows of the affected prefix
+and its parents, so the listing can show folder sizes without walking the
+container again.  Changes made by other clients are picked up by the next
+scan.  Containers that were never scanned are left alone.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import F
+
+from .listing import iter_pages
+from .models import FolderUsage
+from .segments import is_manifest
+
+logger = logging.getLogger(__name__)
+
+
+def ancestors(name):
+    """ '' and every pseudofolder name lives under, e.g. '', 'a/', 'a/b/' for 'a/b/c'. """
+    return [''] + [name[:index + 1] for index, char in enumerate(name) if char == '/']
+
+
+def scanned(container):
+    return FolderUsage.objects.filter(container=container, prefix='').exists()
+
+
+def scan(container, progress=None):
+    """ Recompute the folder sizes of a container. """
+    totals = {'': [0, 0]}
+    count = 0
+    for page in iter_pages(container):
+        for entry in page:
+            is_manifest(entry)
+            for prefix in ancestors(entry['name']):
+                total = totals.setdefault(prefix, [0, 0])
+                total[0] += entry.get('bytes', 0)
+                total[1] += 1
+        count += len(page)
+        if progress:
+            progress(count)
+
+    rows = [FolderUsage(container=container, prefix=prefix, bytes=total[0], count=total[1])
+            for prefix, total in totals.items()]
+    with transaction.atomic():
+        FolderUsage.objects.filter(container=container).delete()
+        FolderUsage.objects.bulk_create(rows, batch_size=1000)
+    logger.info("Computed sizes of %d folders in container %s" % (len(rows), container))
+    return count
+
+
+def _add(container, prefixes, size, count):
+    for prefix in prefixes:
+        updated = (FolderUsage.objects.filter(container=container, prefix=prefix)
+                   .update(bytes=F('bytes') + size, count=F('count') + count))
+        if not updated and size >= 0 and count >= 0:
+            FolderUsage.objects.create(container=container, prefix=prefix, bytes=size, count=count)
+    if count < 0:
+        # Folders that became empty no longer exist in Swift
+        (FolderUsage.objects.filter(container=container, prefix__in=prefixes, count__lte=0)
+         .exclude(prefix='').delete())
+
+
+def record_put(container, name, size):
+    """ Count a new object. Overwriting an object counts it twice until the next scan. """
+    if scanned(container):
+        with transaction.atomic():
+            _add(container, ancestors(name), size, 1)
+
+
+def record_delete(container, name=None, prefix=None, size=0):
+    """ Forget one object of the given size, every object under prefix, or the whole container. """
+    if name is None and prefix is None:
+        FolderUsage.objects.filter(container=container).delete()
+        return
+    if not scanned(container):
+        return
+    with transaction.atomic():
+        if name is not None:
+            _add(container, ancestors(name), -size, -1)
+            return
+        folder = FolderUsage.objects.filter(container=container, prefix=prefix).first()
+        if folder is not None:
+            _add(container, ancestors(prefix)[:-1], -folder.bytes, -folder.count)
+            FolderUsage.objects.filter(container=container, prefix__startswith=prefix).delete()
+
+
+def record_move(container, source, dest_container, destination, size=0, failed=()):
+    """ Carry the sizes of objects moved by move.Mover over to their new names. """
+    if failed:
+        # Which objects moved is not worth tracking here: rescan both
+        record_delete(container)
+        record_delete(dest_container)
+        return
+    if not source.endswith('/'):
+        record_delete(container, name=source, size=size)
+        record_put(dest_container, destination, size)
+        return
+    if not scanned(container):
+        record_delete(dest_container)
+        return
+    with transaction.atomic():
+        rows = list(FolderUsage.objects.filter(container=container, prefix__startswith=source))
+        record_delete(container, prefix=source)
+        if not scanned(dest_container) or not rows:
+            return
+        for row in rows:
+            _add(dest_container, [destination + row.prefix[len(source):]], row.bytes, row.count)
+            if row.prefix == source:
+                _add(dest_container, ancestors(destination)[:-1], row.bytes, row.count)
+
+
+def folder_sizes(container, prefixes):
+    """ Return {prefix: FolderUsage} for those prefixes that have been scanned. """
+    rows = FolderUsage.objects.filter(container=container, prefix__in=list(prefixes))
+    return dict((row.prefix, row) for row in rows)
@@ -4,12 +4,28 @@ from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect, render
 from django.contrib import messages
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST, require_http_methods
+from django.shortcuts import get_object_or_404
 from django.urls import reverse
-from urllib.parse import urlparse
+from django.utils import timezone
+from django.utils.http import urlquote
 from swiftclient import client
+from functools import wraps
+import datetime
+import itertools
 import logging
-
-from .forms import CreateContainerForm, UploadFileForm, CreateFolderForm
+from urllib.parse import quote
+
+from .forms import CreateContainerForm, UploadFileForm, BulkUploadForm, CreateFolderForm, ResumableUploadForm, UploadTargetForm, SearchForm, MoveForm
+from .auth import call, credentials, swift_call
+from .deletion import Deleter
+from .move import Mover
+from .listing_cache import listing_cache
+from .models import IndexedContainer, Job
+from .segments import SegmentedUpload, segment_threshold, upload_id
+from .transform import ObjectRow, breadcrumbs, rows
+from . import bulk, capabilities, fanout, jobs, listing, metrics, pool, resumable, search, streaming, tempurl, usage
 
 logger = logging.getLogger(__name__)
 
@@ -23,42 +39,70 @@ def replace_hyphens(olddict):
         newdict[key] = value
     return newdict
 
+def listing_limit(request):
+    """ Page size requested through ?limit=, capped to what Swift returns in one
+    page less the extra entry that tells whether another page follows. """
+    max_limit = min(settings.SWIFT_LISTING_MAX_PAGE_SIZE, capabilities.container_listing_limit() - 1)
+    try:
+        limit = int(request.GET.get('limit', settings.SWIFT_LISTING_PAGE_SIZE))
+    except ValueError:
+        limit = settings.SWIFT_LISTING_PAGE_SIZE
+    return max(1, min(limit, max_limit))
+
+def is_public(headers):
+    """ Tell whether a container's read ACL allows anonymous access. """
+    read_acl = headers.get('x-container-read', '').split(',')
+    required_acl = ['.r:*', '.rlistings']
+    return bool([x for x in read_acl if x in required_acl])
+
+def add_container_details(storage_url, containers):
+    """ HEAD the listed containers concurrently to show which are public. """
+    if len(containers) > settings.SWIFT_CONTAINER_DETAILS_LIMIT:
+        return
+    # Read on this thread: the fan-out threads must not query the database
+    generations = listing_cache.generations(storage_url)
+    def head(container):
+        return listing_cache.get_or_fetch(
+                storage_url, container['name'], {'head': True},
+                lambda: call(client.head_container, container['name']),
+                generations=generations)
+    for container, headers in zip(containers, fanout.fan_out(head, containers)):
+        if not isinstance(headers, client.ClientException):
+            container['public'] = is_public(headers)
+
 @login_required
 def containers(request):
-    if 'auth_token' not in request.session.keys():
-        logger.info('No auth_token, attempting to authenticate')
-        try:
-            auth_version = settings.SWIFT_AUTH_VERSION or 1
-            conn = client.Connection(authurl=settings.SWIFT_AUTH_URL,
-                    user=settings.SWIFT_AUTH_USER,
-                    key=settings.SWIFT_AUTH_KEY,
-                    auth_version=auth_version,
-                    insecure=settings.SWIFT_SSL_INSECURE)
-            (storage_url, auth_token) = conn.get_auth()
-            logger.info('auth_token: %s' % auth_token)
-            logger.info('storage_url: %s' % storage_url)
-            request.session['storage_url'] = storage_url
-            request.session['auth_token'] = auth_token
-        except client.ClientException:
-            messages.add_message(request, messages.ERROR, "Login failed.")
-
-    auth_token = request.session['auth_token']
-    storage_url = request.session['storage_url']
-
     try:
-        http_conn = (urlparse(storage_url),
-                     client.HTTPConnection(storage_url, insecure=settings.SWIFT_SSL_INSECURE))
-        account_stat, containers = client.get_account(storage_url, auth_token, http_conn=http_conn)
-    except client.ClientException as exc:
-        if exc.http_status == 403:
-            account_stat = {}
-            containers = []
-            msg = 'Container listing failed.'
-            messages.add_message(request, messages.ERROR, msg)
-        else:
-            request.session.flush()
-            return redirect(settings.LOGIN_URL)
+        storage_url, _token = credentials(request)
+    except client.ClientException:
+        messages.add_message(request, messages.ERROR, "Login failed.")
+        return render(request, 'containers.html', {
+            'account_stat': {},
+            'containers': [],
+            'session': request.session,
+        })
 
+    try:
+        account_stat, containers = listing_cache.get_or_fetch(
+                storage_url, '', {},
+                lambda: swift_call(request, client.get_account))
+    except pool.PoolTimeout:
+        # Every connection is busy: the session is fine, try again later
+        messages.add_message(request, messages.ERROR, "Swift is busy, please try again.")
+        return render(request, 'containers.html', {
+            'account_stat': {},
+            'containers': [],
+            'session': request.session,
+        }, status=503)
+    except client.ClientException:
+        # The token belongs to the service account, not to this session:
+        # logging the user out would not help
+        account_stat = {}
+        containers = []
+        msg = 'Container listing failed.'
+        messages.add_message(request, messages.ERROR, msg)
+
+    add_container_details(storage_url, containers)
     account_stat = replace_hyphens(account_stat)
 
     return render(request,'containers.html', {
@@ -67,89 +111,163 @@ def containers(request):
         'session': request.session,
     })
 
+def object_url(storage_url, container):
+    """ Return a function giving the link to an object row: a TempURL, or the download view. """
+    if tempurl.enabled():
+        return lambda row: tempurl.sign(storage_url, container, row.name,
+                                        filename=row.name.split('/')[-1])
+    download = reverse('download') + '?container=%s&object_name=' % quote(container, safe='')
+    return lambda row: download + row.quoted
+
 @login_required
 def container(request, container=None):
-    auth_token = request.session['auth_token']
-    storage_url = request.session['storage_url']
-
     if 'container' not in request.GET.keys():
         return redirect(containers)
     container = request.GET['container']
     subdir = ''
     if 'subdir' in request.GET.keys():
         subdir = request.GET['subdir']
+    marker = request.GET.get('marker', '')
+    end_marker = request.GET.get('end_marker', '')
+
+    search_form = SearchForm(request.GET)
+    if search_form.is_valid() and search_form.has_filters():
+        return search_container(request, container, subdir, search_form)
 
     try:
-        http_conn = (urlparse(storage_url),
-                     client.HTTPConnection(storage_url, insecure=settings.SWIFT_SSL_INSECURE))
-        meta, objects = client.get_container(storage_url, auth_token,
-                                             container, delimiter='/',
-                                             prefix=subdir,
-                                             http_conn=http_conn)
-        subdirs = list()
-        folder_objects = list()
-        for folder_object in objects:
-            if 'subdir' in folder_object.keys():
-                if folder_object['subdir'].startswith(subdir):
-                    subdirs.append({
-                            'display_name': folder_object['subdir'][len(subdir):],
-                            'subdir': folder_object['subdir'],
-                        })
-                else:
-                    subdirs.append({
-                            'display_name': folder_object['subdir'],
-                            'subdir': folder_object['subdir'],
-                        })
-            else:
-                if folder_object['name'].startswith(subdir):
-                    folder_object['display_name'] = folder_object['name'][len(subdir):]
-                else:
-                    folder_object['display_name'] = folder_object['name']
-                folder_objects.append(folder_object)
-    
+        storage_url, _token = credentials(request)
+        limit = listing_limit(request)
+        # One entry more than the page shows tells whether another page follows
+        if end_marker and not marker:
+            # Previous page: list backwards from the first entry of the page
+            # we came from, then restore the natural order.
+            meta, objects = listing_cache.get_or_fetch(
+                    storage_url, container,
+                    {'prefix': subdir, 'end_marker': end_marker, 'limit': limit + 1},
+                    lambda: swift_call(request, client.get_container,
+                                       container, delimiter='/',
+                                       prefix=subdir, marker=end_marker,
+                                       limit=limit + 1, query_string='reverse=on'))
+            has_previous = len(objects) > limit
+            objects = objects[:limit][::-1]
+            has_next = True
+        else:
+            meta, objects = listing_cache.get_or_fetch(
+                    storage_url, container,
+                    {'prefix': subdir, 'marker': marker, 'limit': limit + 1},
+                    lambda: swift_call(request, client.get_container,
+                                       container, delimiter='/',
+                                       prefix=subdir, marker=marker,
+                                       limit=limit + 1))
+            has_previous = bool(marker)
+            has_next = len(objects) > limit
+            objects = objects[:limit]
+
+        previous_marker = ''
+        next_marker = ''
+        if objects:
+            previous_marker = objects[0].get('name', objects[0].get('subdir'))
+            next_marker = objects[-1].get('name', objects[-1].get('subdir'))
+
+        download = object_url(storage_url, container)
+        subdirs, folder_objects = rows(objects, subdir, url=download)
+
+        sizes = usage.folder_sizes(container, [row.subdir for row in subdirs])
+        for row in subdirs:
+            if row.subdir in sizes:
+                row.bytes = sizes[row.subdir].bytes
+                row.count = sizes[row.subdir].count
+
         account = storage_url.split('/')[-1]
-        path = list()
-        if subdir:
-            current_path = ''
-            for path_element in subdir.split('/'):
-                if path_element:
-                    current_path += "%s/" % (path_element)
-                    path.append({ 'subdir': current_path, 'path_element': path_element })
+        path = breadcrumbs(subdir)
     
-        read_acl = meta.get('x-container-read', '').split(',')
-        public = False
-        required_acl = ['.r:*', '.rlistings']
-        if [x for x in read_acl if x in required_acl]:
-            public = True
-
         return render(request, "container.html", {
             'container': container,
             'subdirs': subdirs,
             'upload_subdir': subdir,
             'folder_objects': folder_objects,
             'account': account,
-            'public': public,
+            'public': is_public(meta),
             'session': request.session,
             'path': path,
+            'limit': limit,
+            'previous_marker': previous_marker if has_previous else '',
+            'next_marker': next_marker if has_next else '',
+            'search_form': search_form,
+            'usage_scanned': usage.scanned(container),
+            'quoted_container': quote(container, safe=''),
+            'query': 'container=%s&subdir=%s' % (quote(container, safe=''), quote(subdir, safe='')),
             })
 
     except client.ClientException:
         messages.add_message(request, messages.ERROR, "Access denied.")
         return redirect(containers)
 
+def search_container(request, container, subdir, form):
+    """ Answer the search box of the container page from the name index. """
+    try:
+        storage_url, _token = credentials(request)
+        limit = listing_limit(request)
+    except client.ClientException:
+        messages.add_message(request, messages.ERROR, "Access denied.")
+        return redirect(containers)
+
+    indexed = IndexedContainer.objects.filter(name=container).first()
+    results = []
+    if indexed is None:
+        messages.add_message(request, messages.ERROR, "This container is not indexed for searching.")
+    else:
+        if not indexed.complete:
+            messages.add_message(request, messages.INFO, "The search index of this container is still being built.")
+        modified_after = form.cleaned_data['modified_after']
+        if modified_after:
+            modified_after = timezone.make_aware(
+                    datetime.datetime.combine(modified_after, datetime.time.min))
+        modified_before = form.cleaned_data['modified_before']
+        if modified_before:
+            modified_before = timezone.make_aware(
+                    datetime.datetime.combine(modified_before + datetime.timedelta(days=1), datetime.time.min))
+        results = search.search(container, prefix=subdir,
+                                query=form.cleaned_data['q'],
+                                min_size=form.cleaned_data['min_size'],
+                                max_size=form.cleaned_data['max_size'],
+                                modified_after=modified_after,
+                                modified_before=modified_before,
+                                limit=limit)
+
+    download = object_url(storage_url, container)
+    folder_objects = list()
+    for result in results:
+        row = ObjectRow(result.name, result.name[len(subdir):], result.bytes,
+                        result.last_modified, result.content_type)
+        row.url = download(row)
+        folder_objects.append(row)
+
+    path = breadcrumbs(subdir)
+
+    return render(request, "container.html", {
+        'container': container,
+        'subdirs': [],
+        'upload_subdir': subdir,
+        'folder_objects': folder_objects,
+        'account': storage_url.split('/')[-1],
+        'session': request.session,
+        'path': path,
+        'search_form': form,
+        'searching': True,
+        'quoted_container': quote(container, safe=''),
+        'query': 'container=%s&subdir=%s' % (quote(container, safe=''), quote(subdir, safe='')),
+        })
+
 @login_required
 def create_container(request):
-    auth_token = request.session['auth_token']
-    storage_url = request.session['storage_url']
-
     if request.method == 'POST':
         form = CreateContainerForm(request.POST)
         if form.is_valid():
             container = form.cleaned_data['container']
             try:
-                http_conn = (urlparse(storage_url),
-                             client.HTTPConnection(storage_url, insecure=settings.SWIFT_SSL_INSECURE))
-                client.put_container(storage_url, auth_token, container, http_conn=http_conn)
+                swift_call(request, client.put_container, container)
+                listing_cache.invalidate(credentials(request)[0], container)
                 messages.add_message(request, messages.INFO, "Container created.")
             except client.ClientException:
                 messages.add_message(request, messages.ERROR, "Access denied.")
@@ -162,27 +280,30 @@ def create_container(request):
 
 
 @login_required
+@require_POST
 def delete_container(request):
-    auth_token = request.session['auth_token']
-    storage_url = request.session['storage_url']
-
-    container = ''
-    if 'container' in request.GET.keys():
-        container = request.GET['container']
-    else:
+    container = request.POST.get('container', '')
+    if not container:
         return redirect(containers)
 
+    if settings.SWIFT_BACKGROUND_JOBS:
+        job = jobs.enqueue(request.user, Job.DELETE_CONTAINER, container=container)
+        messages.add_message(request, messages.INFO, "Container deletion queued.")
+        return redirect(reverse('job') + '?id=%s' % job.pk)
+
+    logger.info("Deleting container %s" % (container))
     try:
-        http_conn = (urlparse(storage_url),
-                     client.HTTPConnection(storage_url, insecure=settings.SWIFT_SSL_INSECURE))
-        _m, objects = client.get_container(storage_url, auth_token, container, http_conn=http_conn)
-        for obj in objects:
-            logger.info("Deleting object %s in container %s" % (obj['name'], container))
-            client.delete_object(storage_url, auth_token,
-                                 container, obj['name'], http_conn=http_conn)
-        logger.info("Deleting container %s" % (container))
-        client.delete_container(storage_url, auth_token, container, http_conn=http_conn)
-        messages.add_message(request, messages.INFO, "Container deleted.")
+        storage_url, _ = credentials(request)
+        report = Deleter(container).delete_container()
+        listing_cache.invalidate(storage_url, container)
+        logger.info("Deleting container %s: %s" % (container, report))
+        if report.container_deleted:
+            search.record_delete(container)
+            usage.record_delete(container)
+            messages.add_message(request, messages.INFO, "Container deleted.")
+        else:
+            msg = "%d objects could not be deleted." % len(report.failed)
+            messages.add_message(request, messages.ERROR, msg)
     except client.ClientException:
         messages.add_message(request, messages.ERROR, "Access denied.")
 
@@ -190,9 +311,6 @@ def delete_container(request):
 
 @login_required
 def upload(request):
-    auth_token = request.session['auth_token']
-    storage_url = request.session['storage_url']
-
     if request.method == 'POST':
         form = UploadFileForm(request.POST, request.FILES)
         if form.is_valid():
@@ -201,19 +319,67 @@ def upload(request):
             subdir = form.cleaned_data['subdir']
             upload_file = request.FILES['file']
             logger.info("File upload for /%s/%s%s" % (container, subdir, object_name))
-            try:
-                http_conn = (urlparse(storage_url),
-                             client.HTTPConnection(storage_url, insecure=settings.SWIFT_SSL_INSECURE))
-                client.put_object(storage_url, auth_token,
-                        container,
-                        name=subdir + object_name,
-                        contents=upload_file,
-                        http_conn=http_conn)
-                messages.add_message(request, messages.INFO, "File uploaded.")
-            except client.ClientException:
-                messages.add_message(request, messages.ERROR, "Access denied.")
+            if getattr(upload_file, 'stored_in_swift', False):
+                # Already streamed to Swift by SwiftStreamingUploadHandler
+                try:
+                    if (upload_file.container, upload_file.object_name) != (container, subdir + object_name):
+                        # The query string named another target than the form
+                        logger.warning("Upload target mismatch: streamed /%s/%s" % (
+                            upload_file.container, upload_file.object_name))
+                        swift_call(request, client.delete_object,
+                                   upload_file.container, upload_file.object_name)
+                        messages.add_message(request, messages.ERROR, "Upload failed.")
+                    else:
+                        listing_cache.invalidate(credentials(request)[0], container)
+                        search.record_put(container, subdir + object_name,
+                                          upload_file.size, upload_file.content_type)
+                        usage.record_put(container, subdir + object_name, upload_file.size)
+                        messages.add_message(request, messages.INFO, "File uploaded.")
+                except client.ClientException:
+                    messages.add_message(request, messages.ERROR, "Access denied.")
+            elif settings.SWIFT_BACKGROUND_JOBS and upload_file.size > settings.SWIFT_JOB_UPLOAD_THRESHOLD:
+                job = jobs.enqueue(request.user, Job.UPLOAD,
+                                   container=container,
+                                   name=subdir + object_name,
+                                   path=jobs.spool(upload_file))
+                messages.add_message(request, messages.INFO, "Upload queued.")
+                return redirect(reverse('job') + '?id=%s' % job.pk)
+            else:
+                try:
+                    storage_url, _ = credentials(request)
+                    if (upload_file.size > segment_threshold()
+                            and hasattr(upload_file, 'temporary_file_path')):
+                        SegmentedUpload(container, subdir + object_name,
+                                        upload_file.temporary_file_path(),
+                                        upload_id=upload_id(container, subdir + object_name, upload_file.size),
+                                        content_type=upload_file.content_type).run()
+                    else:
+                        swift_call(request, client.put_object,
+                                container,
+                                name=subdir + object_name,
+                                contents=upload_file)
+                    listing_cache.invalidate(storage_url, container)
+                    search.record_put(container, subdir + object_name,
+                                      upload_file.size, upload_file.content_type)
+                    usage.record_put(container, subdir + object_name, upload_file.size)
+                    messages.add_message(request, messages.INFO, "File uploaded.")
+                except client.ClientException:
+                    messages.add_message(request, messages.ERROR, "Access denied.")
 
             return redirect(reverse('container') + '?container=%s&subdir=%s' % (container, subdir))
+
+        streamed = request.FILES.get('file')
+        if getattr(streamed, 'stored_in_swift', False):
+            # Streamed to the target of the query string, which the form rejects
+            try:
+                swift_call(request, client.delete_object, streamed.container, streamed.object_name)
+            except client.ClientException:
+                logger.error("Could not delete /%s/%s" % (streamed.container, streamed.object_name))
+            messages.add_message(request, messages.ERROR, "Upload failed.")
+        elif hasattr(request, 'swift_upload_error'):
+            messages.add_message(request, messages.ERROR, "Upload failed.")
+        container = request.POST.get('container', request.GET.get('container', ''))
+        subdir = request.POST.get('subdir', request.GET.get('subdir', ''))
     else:
         container = ''
         subdir = ''
@@ -221,58 +387,102 @@ def upload(request):
             container = request.GET['container']
         if 'subdir' in request.GET.keys():
             subdir = request.GET['subdir']
-    
-        path = list()
-        if subdir:
-            current_path = ''
-            for path_element in subdir.split('/'):
-                if path_element:
-                    current_path += "%s/" % (path_element)
-                    path.append({ 'subdir': current_path, 'path_element': path_element })
 
         form = UploadFileForm(initial={
                 'container': container,
                 'subdir': subdir,
             })
 
-        return render(request, 'upload_file.html', {
-                'form': form,
-                'path': path,
+    path = breadcrumbs(subdir)
+
+    return render(request, 'upload_file.html', {
+            'form': form,
+            'path': path,
+            'container': container,
+            'subdir': subdir,
+            'resumable_threshold': settings.SWIFT_RESUMABLE_THRESHOLD,
+            'resumable_parallel': settings.SWIFT_RESUMABLE_PARALLEL,
+            'tempurl': tempurl.enabled(),
+        })
+
+@login_required
+def bulk_upload(request):
+    if request.method == 'POST':
+        form = BulkUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            container = form.cleaned_data['container']
+            subdir = form.cleaned_data['subdir']
+            extract = form.cleaned_data['extract']
+            files = request.FILES.getlist('files')
+            logger.info("Bulk upload of %d files to /%s/%s" % (len(files), container, subdir))
+            if settings.SWIFT_BACKGROUND_JOBS and sum(f.size for f in files) > settings.SWIFT_JOB_UPLOAD_THRESHOLD:
+                job = jobs.enqueue(request.user, Job.BULK_UPLOAD,
+                                   container=container, prefix=subdir, extract=extract,
+                                   files=[[jobs.spool(f), f.name] for f in files])
+                messages.add_message(request, messages.INFO, "Upload queued.")
+                return redirect(reverse('job') + '?id=%s' % job.pk)
+
+            try:
+                storage_url, _ = credentials(request)
+                report = bulk.upload(container, subdir, ((f.name, f, f.size) for f in files),
+                                     extract=extract)
+                listing_cache.invalidate(storage_url, container)
+                if report.failed:
+                    msg = "%d files could not be uploaded." % len(report.failed)
+                    messages.add_message(request, messages.ERROR, msg)
+                if report.uploaded:
+                    messages.add_message(request, messages.INFO, "%d files uploaded." % report.uploaded)
+            except client.ClientException:
+                messages.add_message(request, messages.ERROR, "Access denied.")
+
+            return redirect(reverse('container') + '?container=%s&subdir=%s' % (container, subdir))
+        container = request.POST.get('container', '')
+        subdir = request.POST.get('subdir', '')
+    else:
+        container = request.GET.get('container', '')
+        subdir = request.GET.get('subdir', '')
+        form = BulkUploadForm(initial={
                 'container': container,
                 'subdir': subdir,
             })
 
+    path = breadcrumbs(subdir)
+
+    return render(request, 'bulk_upload.html', {
+            'form': form,
+            'path': path,
+            'container': container,
+            'subdir': subdir,
+        })
+
 @login_required
+@require_POST
 def delete_object(request):
-    auth_token = request.session['auth_token']
-    storage_url = request.session['storage_url']
+    container = request.POST.get('container', '')
+    subdir = request.POST.get('subdir', '')
+    object_name = request.POST.get('object_name', '')
 
-    container = ''
-    subdir = ''
-    object_name = ''
-
-    if 'container' in request.GET.keys():
-        container = request.GET['container']
-    else:
+    if not container:
         return redirect(containers)
 
-    if 'subdir' in request.GET.keys():
-        subdir = request.GET['subdir']
-    else:
-        return redirect(reverse('container') + '?container=%s' % (container))
-
-    if 'object_name' in request.GET.keys():
-        object_name = request.GET['object_name']
-    else:
+    if not object_name:
         return redirect(reverse('container') + '?container=%s&subdir=%s' % (container, subdir))
 
+    # Deleting an SLO manifest through the middleware removes its segments too
+    query_string = None
+    if request.POST.get('manifest'):
+        query_string = 'multipart-manifest=delete'
+
     logger.info("Delete File /%s/%s%s" % (container, subdir, object_name))
     try:
-        http_conn = (urlparse(storage_url),
-                     client.HTTPConnection(storage_url, insecure=settings.SWIFT_SSL_INSECURE))
-        client.delete_object(storage_url, auth_token,
-                container, object_name,
-                http_conn=http_conn)
+        size = 0
+        if usage.scanned(container):
+            size = int(swift_call(request, client.head_object, container, object_name).get('content-length', 0))
+        swift_call(request, client.delete_object,
+                container, object_name, query_string=query_string)
+        listing_cache.invalidate(credentials(request)[0], container)
+        search.record_delete(container, name=object_name)
+        usage.record_delete(container, name=object_name, size=size)
         messages.add_message(request, messages.INFO, "File deleted.")
     except client.ClientException:
         messages.add_message(request, messages.ERROR, "Access denied.")
@@ -281,9 +491,6 @@ def delete_object(request):
 
 @login_required
 def create_folder(request):
-    auth_token = request.session['auth_token']
-    storage_url = request.session['storage_url']
-
     if request.method == 'POST':
         form = CreateFolderForm(request.POST)
         if form.is_valid():
@@ -295,15 +502,15 @@ def create_folder(request):
             try:
                 object_name = subdir + folder_name + '/'
                 logger.info("Creating folder %s" % (object_name))
-                http_conn = (urlparse(storage_url),
-                             client.HTTPConnection(storage_url, insecure=settings.SWIFT_SSL_INSECURE))
-                client.put_object(storage_url, auth_token,
+                swift_call(request, client.put_object,
                         container,
                         name=object_name,
                         contents=None,
-                        content_type='application/directory',
-                        http_conn=http_conn)
+                        content_type='application/directory')
+                search.record_put(container, object_name, 0, 'application/directory')
+                usage.record_put(container, object_name, 0)
                 messages.add_message(request, messages.INFO, "Folder created.")
+                listing_cache.invalidate(credentials(request)[0], container)
             except client.ClientException:
                 messages.add_message(request, messages.ERROR, "Access denied.")
                 return redirect(reverse('container') + '?container=%s&subdir=%s/' % (container, subdir))
@@ -321,13 +528,7 @@ def create_folder(request):
         if 'subdir' in request.GET.keys():
             subdir = request.GET['subdir']
     
-        path = list()
-        if subdir:
-            current_path = ''
-            for path_element in subdir.split('/'):
-                if path_element:
-                    current_path += "%s/" % (path_element)
-                    path.append({ 'subdir': current_path, 'path_element': path_element })
+        path = breadcrumbs(subdir)
 
         form = CreateFolderForm(initial={
                 'container': container,
@@ -341,4 +542,304 @@ def create_folder(request):
                 'path': path,
             })
 
+@login_required
+@require_POST
+def delete_folder(request):
+    container = request.POST.get('container', '')
+    subdir = request.POST.get('subdir', '')
+    folder = request.POST.get('folder', '')
+
+    if not container:
+        return redirect(containers)
+
+    # An empty prefix would delete every object in the container
+    if not folder.strip() or not folder.endswith('/'):
+        messages.add_message(request, messages.ERROR, "No folder to delete.")
+        return redirect(reverse('container') + '?container=%s&subdir=%s' % (container, subdir))
+
+    if settings.SWIFT_BACKGROUND_JOBS:
+        job = jobs.enqueue(request.user, Job.DELETE_FOLDER, container=container, prefix=folder)
+        messages.add_message(request, messages.INFO, "Folder deletion queued.")
+        return redirect(reverse('job') + '?id=%s' % job.pk)
+
+    logger.info("Delete Folder /%s/%s" % (container, folder))
+    try:
+        storage_url, _ = credentials(request)
+        report = Deleter(container, prefix=folder).delete_objects()
+        listing_cache.invalidate(storage_url, container)
+        search.record_delete(container, prefix=folder)
+        usage.record_delete(container, prefix=folder)
+        if report.failed:
+            msg = "%d objects could not be deleted." % len(report.failed)
+            messages.add_message(request, messages.ERROR, msg)
+        else:
+            messages.add_message(request, messages.INFO, "Folder deleted.")
+    except client.ClientException:
+        messages.add_message(request, messages.ERROR, "Access denied.")
+
+    return redirect(reverse('container') + '?container=%s&subdir=%s' % (container, subdir))
+
+@login_required
+@require_http_methods(['GET', 'HEAD'])
+def download(request):
+    container = request.GET.get('container', '')
+    object_name = request.GET.get('object_name', '')
+    if not container or not object_name:
+        raise Http404('No such object')
+
+    try:
+        status, headers, body = streaming.open_object(request, container, object_name,
+                                                      streaming.request_headers(request))
+    except client.ClientException as exc:
+        if exc.http_status == 404:
+            raise Http404('No such object')
+        if exc.http_status in (304, 412, 416):
+            # Not modified, precondition failed or unsatisfiable range
+            response = HttpResponse(status=exc.http_status)
+            return streaming.copy_headers(response, exc.http_response_headers or {})
+        messages.add_message(request, messages.ERROR, "Access denied.")
+        return redirect(reverse('container') + '?container=%s' % (container))
+
+    response = StreamingHttpResponse(body, status=status,
+                                     content_type=headers.get('content-type', 'application/octet-stream'))
+    streaming.copy_headers(response, headers)
+    response['Content-Disposition'] = "attachment; filename*=UTF-8''%s" % urlquote(object_name.split('/')[-1])
+    return response
+
+@login_required
+@require_POST
+def upload_url(request):
+    """ Sign a PUT so the browser can upload straight to Swift, and invalidate
+    the listing once the browser reports the upload as done. """
+    if not tempurl.enabled():
+        raise Http404('TempURL uploads are disabled')
+    form = UploadTargetForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'error': form.errors}, status=400)
+    container = form.cleaned_data['container']
+    name = form.cleaned_data['subdir'] + form.cleaned_data['object_name']
+    try:
+        storage_url, _token = credentials(request)
+        if request.POST.get('done'):
+            headers = swift_call(request, client.head_object, container, name)
+            search.record_put(container, name, int(headers.get('content-length', 0)),
+                              headers.get('content-type', ''))
+            usage.record_put(container, name, int(headers.get('content-length', 0)))
+            listing_cache.invalidate(storage_url, container)
+            return JsonResponse({})
+        logger.info("TempURL upload for /%s/%s" % (container, name))
+        # The browser asks again with refresh=1 when Swift rejected the signature
+        url = tempurl.sign(storage_url, container, name, method='PUT',
+                           refresh=bool(request.POST.get('refresh')))
+        return JsonResponse({'url': url})
+    except client.ClientException as exc:
+        logger.error("Signing upload failed: %s" % exc)
+        return JsonResponse({'error': 'Swift request failed'}, status=502)
+
+@login_required
+def move(request):
+    if request.method == 'POST':
+        form = MoveForm(request.POST)
+        if form.is_valid():
+            container = form.cleaned_data['container']
+            subdir = form.cleaned_data['subdir']
+            source = form.cleaned_data['source']
+            dest_container = form.cleaned_data['dest_container']
+            destination = form.cleaned_data['destination']
+            try:
+                mover = Mover(container, source, dest_container, destination)
+            except ValueError as exc:
+                form.add_error('destination', str(exc))
+            else:
+                if settings.SWIFT_BACKGROUND_JOBS and source.endswith('/'):
+                    job = jobs.enqueue(request.user, Job.MOVE, container=container, source=source,
+                                       dest_container=dest_container, destination=destination)
+                    messages.add_message(request, messages.INFO, "Move queued.")
+                    return redirect(reverse('job') + '?id=%s' % job.pk)
+
+                logger.info("Move /%s/%s to /%s/%s" % (container, source, dest_container, destination))
+                try:
+                    credentials(request)
+                    report = mover.move()
+                    failed = [name for name, _error in report.failed]
+                    search.record_move(container, source, dest_container, mover.destination, failed=failed)
+                    usage.record_move(container, source, dest_container, mover.destination,
+                                      size=report.bytes, failed=failed)
+                    if report.failed:
+                        msg = "%d objects could not be moved." % len(report.failed)
+                        messages.add_message(request, messages.ERROR, msg)
+                    else:
+                        messages.add_message(request, messages.INFO, "Moved.")
+                except client.ClientException:
+                    messages.add_message(request, messages.ERROR, "Access denied.")
+                storage_url = credentials(request)[0]
+                listing_cache.invalidate(storage_url, container)
+                listing_cache.invalidate(storage_url, dest_container)
+
+                return redirect(reverse('container') + '?container=%s&subdir=%s' % (container, subdir))
+        container = request.POST.get('container', '')
+        subdir = request.POST.get('subdir', '')
+    else:
+        container = request.GET.get('container', '')
+        subdir = request.GET.get('subdir', '')
+        source = request.GET.get('source', '')
+        if not container or not source:
+            return redirect(containers)
+        form = MoveForm(initial={
+                'container': container,
+                'subdir': subdir,
+                'source': source,
+                'dest_container': container,
+                'destination': source,
+            })
+
+    path = breadcrumbs(subdir)
+
+    return render(request, 'move.html', {
+            'form': form,
+            'container': container,
+            'subdir': subdir,
+            'path': path,
+        })
+
+@login_required
+@require_POST
+def scan_usage(request):
+    container = request.POST.get('container', '')
+    subdir = request.POST.get('subdir', '')
+    if not container:
+        return redirect(containers)
+
+    if settings.SWIFT_BACKGROUND_JOBS:
+        job = jobs.enqueue(request.user, Job.SCAN_USAGE, container=container)
+        messages.add_message(request, messages.INFO, "Folder size computation queued.")
+        return redirect(reverse('job') + '?id=%s' % job.pk)
+
+    try:
+        credentials(request)
+        usage.scan(container)
+        messages.add_message(request, messages.INFO, "Folder sizes computed.")
+    except client.ClientException:
+        messages.add_message(request, messages.ERROR, "Access denied.")
+
+    return redirect(reverse('container') + '?container=%s&subdir=%s' % (container, subdir))
+
+def get_job(request):
+    try:
+        job_id = int(request.GET.get('id', ''))
+    except ValueError:
+        raise Http404('No such job')
+    return get_object_or_404(Job, pk=job_id, user=request.user)
+
+@login_required
+def job(request):
+    return render(request, 'job.html', {'job': get_job(request)})
+
+@login_required
+def job_progress(request):
+    return JsonResponse(get_job(request).as_dict())
+
+def prometheus_metrics(request):
+    """ Metrics of all workers for Prometheus to scrape. """
+    allowed = settings.SWIFT_METRICS_ALLOWED_IPS
+    if '*' not in allowed and request.META.get('REMOTE_ADDR') not in allowed:
+        raise Http404('Not found')
+    body, content_type = metrics.render()
+    return HttpResponse(body, content_type=content_type)
+
+def stream_listing(request, container=None):
+    """ Stream a listing as NDJSON, fetching one Swift page at a time.
+
+    The first page is fetched before answering, so a missing container or a
+    Swift error still gets a proper status code. """
+    pages = listing.iter_pages(container,
+                               prefix=request.GET.get('prefix') or None,
+                               delimiter=request.GET.get('delimiter') or None,
+                               marker=request.GET.get('marker') or None)
+    try:
+        first = next(pages, [])
+    except client.ClientException as exc:
+        if exc.http_status == 404:
+            return JsonResponse({'error': 'No such container'}, status=404)
+        logger.error("Listing failed: %s" % exc)
+        return JsonResponse({'error': 'Swift request failed'}, status=502)
+    return StreamingHttpResponse(listing.ndjson(itertools.chain([first], pages)),
+                                 content_type='application/x-ndjson')
+
+@login_required
+@require_http_methods(['GET'])
+def api_containers(request):
+    return stream_listing(request)
+
+@login_required
+@require_http_methods(['GET'])
+def api_objects(request):
+    if not request.GET.get('container'):
+        return JsonResponse({'error': 'container is required'}, status=400)
+    return stream_listing(request, request.GET['container'])
+
+def resumable_api(view):
+    """ Report resumable upload API errors as JSON. """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except resumable.InvalidUpload as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+        except client.ClientException as exc:
+            logger.error("Resumable upload failed: %s" % exc)
+            return JsonResponse({'error': 'Swift request failed'}, status=502)
+    return wrapper
 
+@login_required
+@require_POST
+@resumable_api
+def upload_init(request):
+    if request.POST.get('upload'):
+        state = resumable.load(request.user, request.POST['upload'])
+    else:
+        form = ResumableUploadForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({'error': form.errors}, status=400)
+        state = resumable.start(request.user,
+                                form.cleaned_data['container'],
+                                form.cleaned_data['subdir'] + form.cleaned_data['object_name'],
+                                form.cleaned_data['size'],
+                                form.cleaned_data['content_type'])
+        resumable.prepare(state)
+        logger.info("Resumable upload for /%s/%s" % (state['container'], state['name']))
+    return JsonResponse(resumable.describe(state))
+
+@login_required
+@require_http_methods(['PUT'])
+@resumable_api
+def upload_chunk(request):
+    state = resumable.load(request.user, request.GET.get('upload', ''))
+    try:
+        index = int(request.GET.get('index', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        raise resumable.InvalidUpload('Invalid chunk')
+    etag = resumable.put_chunk(state, index, request, length,
+                               md5=request.META.get('HTTP_X_CHUNK_MD5'))
+    return JsonResponse({'index': index, 'etag': etag})
+
+@login_required
+@require_POST
+@resumable_api
+def upload_complete(request):
+    state = resumable.load(request.user, request.POST.get('upload', ''))
+    storage_url, _ = credentials(request)
+    etag = resumable.complete(state)
+    listing_cache.invalidate(storage_url, state['container'])
+    search.record_put(state['container'], state['name'], state['size'], state['content_type'])
+    usage.record_put(state['container'], state['name'], state['size'])
+    return JsonResponse({'etag': etag})
+
+@login_required
+@require_POST
+@resumable_api
+def upload_abort(request):
+    state = resumable.load(request.user, request.POST.get('upload', ''))
+    report = resumable.abort(state)
+    return JsonResponse({'deleted': report.deleted})
@@ -0,0 +1,38 @@
+"""
+Work a new worker would otherwise do while serving its first requests.
+
+wsgi.py calls warm_up() once the application is loaded, which is when
+WhiteNoiseMiddleware indexes STATIC_ROOT.  It loads the static files
+manifest, imports the views through the URLconf and compiles the app's
+templates, which the cached template loader then keeps when DEBUG is off.
+"""
+import logging
+import os
+import time
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+
+
+def warm_up():
+    start = time.perf_counter()
+    manifest = getattr(staticfiles_storage, 'hashed_files', {})
+    get_resolver().reverse_dict
+    templates = 0
+    for name in sorted(os.listdir(TEMPLATE_DIR)):
+        if not name.endswith('.html'):
+            continue
+        try:
+            get_template(name)
+        except (TemplateDoesNotExist, TemplateSyntaxError) as exc:
+            logger.warning('Could not compile %s: %s' % (name, exc))
+            continue
+        templates += 1
+    logger.info('Warmed up in %.0f ms: %d static files in the manifest, %d templates'
+                % ((time.perf_counter() - start) * 1000, len(manifest), templates))